@@ -5,13 +5,37 @@ Desktop Application built with tkinter
 """
 
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext, filedialog
+from tkinter import ttk, messagebox, scrolledtext, filedialog, simpledialog
+import argparse
+import bisect
+import contextlib
+import cProfile
+import hashlib
+import io
+import itertools
+import concurrent.futures
+import csv
+import difflib
 import json
+import logging
+import logging.handlers
+import math
 import os
+import queue
+import re
+import tempfile
 import webbrowser
+import zlib
 import threading
-from datetime import datetime
+import time
+import traceback
+import tracemalloc
+from array import array
+from collections import Counter, OrderedDict, deque, namedtuple
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Optional
 import sys
 
 try:
@@ -19,11 +43,204 @@ try:
 except ImportError:
     genai = None
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# Module start, for --self-test startup timing
+STARTED = time.perf_counter()
+
+# Filename in this module's code objects. Not __file__, which points into
+# DorkNexus.pyz when the app runs from the precompiled bundle.
+_SOURCE = (lambda: None).__code__.co_filename
+
 # Configuration
 APP_NAME = "DorkNexus"
 VERSION = "2.0.0"
 VAULT_FILE = "nexus_vault.json"
 CONFIG_FILE = "dorknexus_config.json"
+USAGE_FILE = "dorknexus_usage.json"
+PROFILE_DIR = "profiles"
+STALL_THRESHOLD_MS = 250
+VAULT_PAGE_SIZE = 100
+VAULT_FIELDS = ['id', 'dork', 'tags', 'notes', 'timestamp']
+VAULT_IMPORT_CHUNK = 500
+VAULT_LOAD_PAGE = 250
+VAULT_LOAD_AHEAD = 8
+
+# Defaults for settings persisted in CONFIG_FILE
+DEFAULT_CONFIG = {
+    'api_key': '',
+    'terminal_max_lines': 5000,
+    'terminal_log_enabled': False,
+    'terminal_log_file': 'terminal.log',
+    'terminal_log_max_bytes': 5 * 1024 * 1024,
+    'terminal_log_backups': 3,
+    'batch_workers': 4,
+    'batch_input_token_budget': 6000,
+    'batch_output_token_budget': 6000,
+    'batch_max_items': 40,
+    'ai_requests_per_minute': 30,
+    'response_cache_size': 256,
+    'response_cache_ttl': 3600,
+    'near_match_cache': True,
+    'near_match_threshold': 0.75,
+    'usage_file': USAGE_FILE,
+    'usage_history_days': 30,
+    'daily_token_budget': 0,
+    'session_token_budget': 0,
+    'max_prompt_tokens': 8000,
+    # Overrides for MODEL_TIERS / OPERATION_PROFILES, e.g. {"strong": ["gemini-2.5-pro"]}
+    'model_tiers': {},
+    'operation_profiles': {},
+    'chat_history_tokens': 4000,
+    'chat_keep_turns': 2,
+    'context_cache': True,
+    'context_cache_ttl': 3600,
+    'context_cache_min_tokens': 4096,
+    'ground_templates': True,
+    'speculative_prefetch': False,
+    'prefetch_idle_ms': 1500,
+    'prefetch_reserve': 5,
+    'vault_lazy_notes': False,
+    'save_delay_ms': 500,
+    'vault_file': VAULT_FILE,
+    'vault_shared': False,
+    'vault_poll_ms': 2000
+}
+
+PIVOT_ENGINES = ['Shodan', 'Censys', 'Hunter.io', 'ZoomEye']
+
+# Candidate models per tier, in order of preference
+MODEL_TIERS = {
+    'fast': ['gemini-2.0-flash-lite', 'gemini-2.0-flash'],
+    'balanced': ['gemini-2.0-flash', 'gemini-2.0-flash-lite'],
+    'strong': ['gemini-2.5-pro', 'gemini-2.0-flash']
+}
+
+# Model tier and generation settings per AI operation (see gemini_call)
+OPERATION_PROFILES = {
+    'AI/request': {'tier': 'balanced', 'timeout': 60},
+    'AI/generate': {'tier': 'balanced', 'temperature': 0.4, 'max_output_tokens': 1024, 'timeout': 30},
+    'AI/analyze': {'tier': 'balanced', 'temperature': 0.3, 'max_output_tokens': 1024, 'timeout': 30},
+    'Pivot/translate': {'tier': 'fast', 'temperature': 0.2, 'max_output_tokens': 256, 'timeout': 15,
+                        'latency_sensitive': True},
+    'Terminal/search': {'tier': 'fast', 'temperature': 0.7, 'max_output_tokens': 512, 'timeout': 20,
+                        'latency_sensitive': True},
+    'Terminal/batch analyze': {'tier': 'balanced', 'temperature': 0.3, 'max_output_tokens': 8192, 'timeout': 90},
+    'Terminal/batch generate': {'tier': 'balanced', 'temperature': 0.4, 'max_output_tokens': 8192, 'timeout': 90},
+    'Research/research': {'tier': 'strong', 'temperature': 0.7, 'max_output_tokens': 2048, 'timeout': 90},
+    'Chat/summarize': {'tier': 'fast', 'temperature': 0.2, 'max_output_tokens': 512, 'timeout': 30}
+}
+
+# Models whose thinking tokens count against max_output_tokens; requests to
+# them get this much extra room so the answer is not cut off
+THINKING_MODELS = ('gemini-2.5',)
+THINKING_TOKENS = 8192
+
+
+def is_thinking_model(model_name):
+    return model_name.startswith(THINKING_MODELS)
+
+
+def response_text(response):
+    """A response's text, or None if it has none (blocked, or cut off before any text)"""
+    try:
+        return response.text or None
+    except Exception:
+        return None
+
+
+def is_transient_error(error):
+    """Whether a failed call says the model is unhealthy (timeout, 429 or 5xx)
+
+    Other errors, such as a bad key or request, would fail the same way on
+    every model and say nothing about this one.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        return code == 429 or code >= 500
+    return type(error).__name__ in (
+        'DeadlineExceeded', 'ServiceUnavailable', 'ResourceExhausted', 'InternalServerError',
+        'TooManyRequests', 'Timeout', 'ReadTimeout', 'ConnectTimeout'
+    )
+
+SUMMARIZE_PROMPT = """Summarize this conversation for your own later reference.
+Keep every dork, finding, decision and constraint the user gave; drop
+pleasantries and repetition. Be concise."""
+
+# Response schema for structured (JSON mode) AI results
+DORK_RESULT_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'dork': {'type': 'STRING'},
+        'explanation': {'type': 'STRING'},
+        'risk': {'type': 'STRING'},
+        'score': {'type': 'INTEGER'},
+        'issues': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+        'suggestions': {'type': 'ARRAY', 'items': {'type': 'STRING'}}
+    },
+    'required': ['dork', 'explanation', 'risk', 'score', 'issues']
+}
+
+DORK_BATCH_SCHEMA = {
+    'type': 'ARRAY',
+    'items': {
+        'type': 'OBJECT',
+        'properties': dict(DORK_RESULT_SCHEMA['properties'], index={'type': 'INTEGER'}),
+        'required': ['index'] + DORK_RESULT_SCHEMA['required']
+    }
+}
+
+GENERATE_PROMPT = """You are an expert Google Dork generator.
+Generate a precise Google Dork query for the user objective.
+Fill in: dork (the query only), explanation, risk (Low/Medium/High),
+score (expected effectiveness 0-100), issues (caveats, may be empty)."""
+
+ANALYZE_PROMPT = """You are a Google Dork analysis expert.
+Analyze the given dork. Fill in: dork (an optimized version),
+explanation, risk (Low/Medium/High), score (effectiveness 0-100),
+issues (potential problems) and suggestions (optimizations)."""
+
+
+def generate_request(objective):
+    """Opening AI Constructor request for an objective (GENERATE_PROMPT goes in the prefix)"""
+    return f"User objective: {objective}"
+
+
+def research_request(topic):
+    """Opening Research Hub request for a topic"""
+    return f"Provide detailed information about: {topic}\nFocus on security research and OSINT context."
+
+# Prompts for packing many dorks into one request
+BATCH_PROMPTS = {
+    'analyze': {
+        'system': """You are a Google Dork analysis expert.
+        Analyze every dork in the JSON array below. Respond with a JSON array
+        holding one object per input with: index (copied from the input),
+        dork (an optimized version), explanation, risk (Low/Medium/High),
+        score (effectiveness 0-100), issues and suggestions.""",
+        'field': 'dork',
+        'output_tokens': 160
+    },
+    'generate': {
+        'system': """You are an expert Google Dork generator.
+        Generate one precise Google Dork query for every objective in the JSON
+        array below. Respond with a JSON array holding one object per input with:
+        index (copied from the input), dork (the query only), explanation,
+        risk (Low/Medium/High), score (expected effectiveness 0-100), issues.""",
+        'field': 'objective',
+        'output_tokens': 120
+    }
+}
 
 # Color Scheme (Dark Theme)
 COLORS = {
@@ -44,26 +261,2822 @@ COLORS = {
     'amber': '#f59e0b'
 }
 
+class Profiler:
+    """Opt-in cProfile/tracemalloc capture for the main loop and worker jobs"""
+
+    def __init__(self, output_dir=PROFILE_DIR):
+        self.output_dir = Path(output_dir)
+        self.enabled = False
+        self._main_profile = None
+
+    def start(self):
+        """Start profiling the calling (main) thread and tracing allocations"""
+        if self.enabled:
+            return
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+        self._main_profile = cProfile.Profile()
+        self._main_profile.enable()
+        self.enabled = True
+
+    def stop(self):
+        """Stop profiling and dump everything captured so far"""
+        if not self.enabled:
+            return []
+        paths = self.dump()
+        self._main_profile.disable()
+        self._main_profile = None
+        tracemalloc.stop()
+        self.enabled = False
+        return paths
+
+    def dump(self):
+        """Write the main loop profile and a tracemalloc snapshot to disk"""
+        if not self.enabled:
+            return []
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        paths = []
+
+        self._main_profile.disable()
+        try:
+            paths.append(self._dump_profile(self._main_profile, f"mainloop-{stamp}"))
+        finally:
+            self._main_profile.enable()
+
+        snapshot = tracemalloc.take_snapshot()
+        snapshot_path = self.output_dir / f"memory-{stamp}.tracemalloc"
+        snapshot.dump(str(snapshot_path))
+        paths.append(snapshot_path)
+
+        summary_path = self.output_dir / f"memory-{stamp}.txt"
+        with open(summary_path, 'w') as f:
+            for stat in snapshot.statistics('lineno')[:50]:
+                f.write(f"{stat}\n")
+        paths.append(summary_path)
+        return paths
+
+    def wrap(self, func, name):
+        """Return func wrapped to run under its own profile while profiling is on"""
+        def runner(*args, **kwargs):
+            if not self.enabled:
+                return func(*args, **kwargs)
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler already owns this interpreter (Python 3.12+)
+                return func(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+                self._dump_profile(profile, f"job-{name}-{stamp}")
+        return runner
+
+    def _dump_profile(self, profile, basename):
+        path = self.output_dir / f"{basename}.prof"
+        profile.dump_stats(str(path))
+        return path
+
+
+class StallWatchdog:
+    """Measures Tk heartbeat lag and records main-thread stalls
+
+    A heartbeat is scheduled with root.after(); the delay between when it
+    was due and when it actually ran is the event loop lag. A watcher thread
+    samples the main thread's stack while a stall is in progress so each
+    stall can be attributed to the callback that caused it.
+    """
+
+    def __init__(self, root, threshold_ms=STALL_THRESHOLD_MS, log_path=None, interval_ms=50,
+                 history=600, worst_count=10):
+        self.root = root
+        self.threshold = threshold_ms / 1000
+        self.interval_ms = interval_ms
+        self.log_path = Path(log_path) if log_path else None
+        self.log_traces = False
+        self.running = False
+        self.lag_samples = deque(maxlen=history)
+        self.max_lag = 0.0
+        self.stall_count = 0
+        self.worst_stalls = []
+        self.worst_count = worst_count
+        self._generation = 0
+        self._main_ident = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._stall_callback = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the heartbeat on the Tk loop and the watcher thread"""
+        if self.running:
+            return
+        self.running = True
+        self._generation += 1
+        self._last_beat = time.perf_counter()
+        self.root.after(self.interval_ms, self._beat, self._generation, self._last_beat)
+        threading.Thread(
+            target=self._watch, args=(self._generation,), daemon=True, name="stall-watchdog"
+        ).start()
+
+    def stop(self):
+        """Stop watching; the heartbeat stops on its next tick"""
+        self.running = False
+
+    def snapshot(self):
+        """Return responsiveness metrics as a JSON-serializable dict"""
+        samples = sorted(self.lag_samples)
+        with self._lock:
+            worst = list(self.worst_stalls)
+
+        def percentile(p):
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(len(samples) * p))] * 1000
+
+        return {
+            'interval_ms': self.interval_ms,
+            'stall_threshold_ms': round(self.threshold * 1000),
+            'samples': len(samples),
+            'lag_last_ms': round(self.lag_samples[-1] * 1000, 1) if samples else 0.0,
+            'lag_avg_ms': round(sum(samples) / len(samples) * 1000, 1) if samples else 0.0,
+            'lag_p95_ms': round(percentile(0.95), 1),
+            'lag_max_ms': round(self.max_lag * 1000, 1),
+            'stall_count': self.stall_count,
+            'worst_stalls': [
+                {'lag_ms': round(lag * 1000), 'callback': callback, 'at': at}
+                for lag, callback, at in worst
+            ]
+        }
+
+    def _alive(self, generation):
+        return self.running and generation == self._generation
+
+    def _beat(self, generation, scheduled):
+        now = time.perf_counter()
+        lag = max(0.0, now - scheduled - self.interval_ms / 1000)
+        self._last_beat = now
+        self.lag_samples.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+        if lag >= self.threshold:
+            self._record_stall(lag)
+        if self._alive(generation):
+            self.root.after(self.interval_ms, self._beat, generation, now)
+
+    def _record_stall(self, lag):
+        callback = self._stall_callback or 'unknown'
+        self._stall_callback = None
+        self.stall_count += 1
+        with self._lock:
+            self.worst_stalls.append((lag, callback, datetime.now().isoformat(timespec='seconds')))
+            self.worst_stalls.sort(key=lambda s: s[0], reverse=True)
+            del self.worst_stalls[self.worst_count:]
+
+    def _watch(self, generation):
+        interval = self.interval_ms / 1000
+        reported = False
+        while self._alive(generation):
+            time.sleep(interval)
+            blocked = time.perf_counter() - self._last_beat - interval
+            if blocked < self.threshold:
+                reported = False
+            elif not reported:
+                # Sample once per stall, while the main thread is still stuck in it
+                reported = True
+                frame = sys._current_frames().get(self._main_ident)
+                if frame is not None:
+                    self._stall_callback = describe_callback(frame)
+                    if self.log_traces:
+                        self._log_stall(blocked, frame)
+
+    def _log_stall(self, blocked, frame):
+        stack = ''.join(traceback.format_stack(frame))
+        entry = (f"[{datetime.now().isoformat(timespec='milliseconds')}] "
+                 f"Main thread blocked for {blocked * 1000:.0f} ms in {self._stall_callback}\n"
+                 f"{stack}\n")
+        if self.log_path:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.log_path, 'a') as f:
+                f.write(entry)
+        else:
+            print(entry, file=sys.stderr)
+
+
+class TerminalBuffer:
+    """Bounded, batched writer for the Nexus Terminal text widget
+
+    write() may be called from any thread. Pending text is coalesced and
+    inserted once per frame on the Tk thread, and once the widget holds more
+    than max_lines (plus 10% slack) the oldest lines are trimmed in a single
+    delete. The full history can optionally be spilled to a rotating log.
+    """
+
+    FRAME_MS = 16
+
+    def __init__(self, root, widget, max_lines=5000, log_path=None,
+                 log_max_bytes=5 * 1024 * 1024, log_backups=3):
+        self.root = root
+        self.widget = widget
+        self.max_lines = max(100, int(max_lines))
+        self.line_count = int(widget.index('end-1c').split('.')[0])
+        self._pending = []
+        self._scheduled = False
+        self._lock = threading.Lock()
+
+        self.log = None
+        if log_path:
+            handler = logging.handlers.RotatingFileHandler(
+                log_path, maxBytes=log_max_bytes, backupCount=log_backups, encoding='utf-8'
+            )
+            handler.terminator = ''
+            self.log = logging.getLogger(f"{APP_NAME}.terminal")
+            self.log.setLevel(logging.INFO)
+            self.log.propagate = False
+            self.log.addHandler(handler)
+
+    def write(self, text):
+        """Queue text for the next frame"""
+        if self.log:
+            self.log.info(text)
+        with self._lock:
+            self._pending.append(text)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self.root.after(self.FRAME_MS, self._flush)
+
+    def clear(self):
+        """Remove everything from the widget (the spill log is kept)"""
+        with self._lock:
+            self._pending.clear()
+        self.widget.delete('1.0', tk.END)
+        self.line_count = 1
+
+    def close(self):
+        """Close the spill log, if any"""
+        if self.log:
+            for handler in list(self.log.handlers):
+                handler.close()
+                self.log.removeHandler(handler)
+            self.log = None
+
+    def _flush(self):
+        with self._lock:
+            chunk = ''.join(self._pending)
+            self._pending.clear()
+            self._scheduled = False
+        if not chunk:
+            return
+
+        follow = self.widget.yview()[1] >= 0.999
+        self.widget.insert('end', chunk)
+        self.line_count += chunk.count('\n')
+
+        if self.line_count > self.max_lines + self.max_lines // 10:
+            excess = self.line_count - self.max_lines
+            self.widget.delete('1.0', f'{excess + 1}.0')
+            self.line_count -= excess
+
+        if follow:
+            self.widget.see('end')
+
+
+class RateLimiter:
+    """Token bucket shared by every AI request
+
+    Foreground requests wait for a token. Background (speculative) requests
+    only proceed while more than `reserve` tokens remain, so prefetching
+    never eats into the budget the user is about to need.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = max(1, int(per_minute))
+        self.rate = self.capacity / 60.0
+        self.tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def try_acquire(self, reserve=0):
+        """Take a token only if more than reserve would remain; never blocks"""
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1 + reserve:
+                self.tokens -= 1
+                return True
+            return False
+
+    def snapshot(self):
+        with self._lock:
+            self._refill()
+            return {'per_minute': self.capacity, 'available': round(self.tokens, 1)}
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of AI responses with a time-to-live"""
+
+    def __init__(self, max_entries=256, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.monotonic() - entry[0] <= self.ttl
+
+    def snapshot(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class PromptCache:
+    """Near-match cache of AI answers to free-text prompts
+
+    Prompts are compared as TF-IDF weighted word vectors (lowercased,
+    punctuation and common function words dropped, plurals folded), so an
+    answer cached for "find exposed .env files" is found again for "find
+    exposed env files on sites". get returns the best entry whose cosine
+    similarity reaches threshold. Entries expire like ResponseCache entries.
+    """
+
+    STOPWORDS = frozenset(
+        'a an and any are as at be by for from i in into is it me my of on or show some that the '
+        'this to want with'.split()
+    )
+
+    def __init__(self, max_entries=256, ttl=3600, threshold=0.75):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def terms(cls, text):
+        words = Counter()
+        for word in re.findall(r'[a-z0-9]+', text.lower()):
+            if word in cls.STOPWORDS:
+                continue
+            if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+                word = word[:-1]
+            words[word] += 1
+        return words
+
+    def get(self, kind, prompt):
+        """Best cached (score, prompt, value) for a similar prompt of this kind, or None"""
+        terms = self.terms(prompt)
+        if not terms:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            for key in [key for key, entry in self._entries.items() if now - entry[0] > self.ttl]:
+                del self._entries[key]
+            candidates = [(key, entry) for key, entry in self._entries.items() if key[0] == kind]
+
+            df = Counter()
+            for _, entry in candidates:
+                df.update(entry[3].keys())
+            n = len(candidates)
+
+            def weights(counts):
+                return {t: c * (math.log((n + 1) / (df[t] + 1)) + 1) for t, c in counts.items()}
+
+            query = weights(terms)
+            query_norm = math.sqrt(sum(w * w for w in query.values()))
+            best = None
+            for key, entry in candidates:
+                other = weights(entry[3])
+                dot = sum(w * other.get(t, 0) for t, w in query.items())
+                score = dot / (query_norm * math.sqrt(sum(w * w for w in other.values())))
+                if score >= self.threshold and (best is None or score > best[0]):
+                    best = (score, key, entry)
+
+            if best is None:
+                self.misses += 1
+                return None
+            score, key, entry = best
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return min(score, 1.0), entry[1], entry[2]
+
+    def put(self, kind, prompt, value):
+        terms = self.terms(prompt)
+        if not terms:
+            return
+        key = (kind, tuple(sorted(terms.items())))
+        with self._lock:
+            self._entries[key] = (time.monotonic(), prompt, value, terms)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def snapshot(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class PrefetchSkipped(Exception):
+    """Raised when a background request is dropped to preserve the rate budget"""
+
+
+class ModelRouter:
+    """Pick the model for an AI operation from its profile and observed health
+
+    Each operation's profile names a tier of candidate models plus
+    generation settings. route() orders the tier's models: ones cooling
+    down after errors go last, then ones whose average latency is over
+    half the profile's timeout; latency-sensitive operations try the
+    fastest observed model first, the rest keep the tier's preference.
+    Consecutive transient failures (see is_transient_error) back a model
+    off for 15 s, doubling up to 5 min.
+    """
+
+    ALPHA = 0.3
+
+    def __init__(self, tiers=None, profiles=None):
+        self.tiers = {**MODEL_TIERS, **(tiers or {})}
+        self.profiles = {
+            name: {**OPERATION_PROFILES.get(name, OPERATION_PROFILES['AI/request']), **profile}
+            for name, profile in {**OPERATION_PROFILES, **(profiles or {})}.items()
+        }
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def profile(self, operation):
+        return self.profiles.get(operation, self.profiles['AI/request'])
+
+    def generation_config(self, operation):
+        profile = self.profile(operation)
+        return {key: profile[key] for key in ('temperature', 'max_output_tokens') if key in profile}
+
+    def route(self, operation):
+        """Models to try for operation, best first"""
+        profile = self.profile(operation)
+        models = self.tiers.get(profile['tier']) or self.tiers['balanced']
+        now = time.monotonic()
+        with self._lock:
+            def rank(indexed):
+                index, model = indexed
+                stats = self.stats.get(model)
+                if stats is None:
+                    return (False, False, 0.0, index)
+                latency = stats['latency'] or 0.0
+                return (
+                    stats['cooldown_until'] > now,
+                    latency > profile['timeout'] / 2,
+                    latency if profile.get('latency_sensitive') else 0.0,
+                    index
+                )
+            return [model for _, model in sorted(enumerate(models), key=rank)]
+
+    def record(self, model, seconds, ok, backoff=True):
+        """Count a request; a failure with backoff puts the model into cooldown"""
+        with self._lock:
+            stats = self.stats.setdefault(model, {
+                'requests': 0, 'errors': 0, 'failures_in_row': 0, 'latency': None, 'cooldown_until': 0.0
+            })
+            stats['requests'] += 1
+            if ok:
+                previous = stats['latency']
+                stats['latency'] = seconds if previous is None else previous + self.ALPHA * (seconds - previous)
+                stats['failures_in_row'] = 0
+                stats['cooldown_until'] = 0.0
+            elif not backoff:
+                stats['errors'] += 1
+            else:
+                stats['errors'] += 1
+                stats['failures_in_row'] += 1
+                backoff = min(300, 15 * 2 ** (stats['failures_in_row'] - 1))
+                stats['cooldown_until'] = time.monotonic() + backoff
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                model: {
+                    'requests': stats['requests'],
+                    'errors': stats['errors'],
+                    'avg_latency_ms': round(stats['latency'] * 1000) if stats['latency'] is not None else None,
+                    'cooling_down': stats['cooldown_until'] > now
+                }
+                for model, stats in self.stats.items()
+            }
+
+
+class ChatSession:
+    """Bounded conversation history for follow-up AI requests
+
+    Each turn is a (question, answer) pair sent back to the model as chat
+    contents, so a follow-up only adds the new question. Once the history
+    passes max_tokens, all but the newest keep_turns are folded into a
+    running summary, written by summarize(transcript) or condensed
+    locally if that fails. clear() bumps `generation`; a request started
+    before it passes the generation it read to add(), so its answer does
+    not re-seed the new conversation.
+    """
+
+    def __init__(self, max_tokens=4000, keep_turns=2):
+        self.max_tokens = max_tokens
+        self.keep_turns = keep_turns
+        self.turns = []
+        self.summary = ''
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self.turns or self.summary)
+
+    def __len__(self):
+        return len(self.turns)
+
+    def contents(self):
+        """History as Gemini chat contents: the summary first, then recent turns"""
+        with self._lock:
+            contents = []
+            if self.summary:
+                contents.append({'role': 'user', 'parts': [f"Summary of our conversation so far:\n{self.summary}"]})
+                contents.append({'role': 'model', 'parts': ["Understood."]})
+            for question, answer in self.turns:
+                contents.append({'role': 'user', 'parts': [question]})
+                contents.append({'role': 'model', 'parts': [answer]})
+            return contents
+
+    def tokens(self):
+        with self._lock:
+            return estimate_tokens(self.summary) + sum(
+                estimate_tokens(question) + estimate_tokens(answer) for question, answer in self.turns
+            )
+
+    def add(self, question, answer, generation=None):
+        """Append a turn unless the session was cleared since generation; returns True if added"""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self.turns.append((question, answer))
+            return True
+
+    def compact(self, summarize=None):
+        """Fold old turns into the summary while over max_tokens; returns True if it did"""
+        if self.tokens() <= self.max_tokens:
+            return False
+        with self._lock:
+            if len(self.turns) <= self.keep_turns:
+                return False
+            old = self.turns[:len(self.turns) - self.keep_turns]
+            self.turns = self.turns[len(old):]
+            previous = self.summary
+            generation = self.generation
+
+        transcript = "\n\n".join(
+            ([f"Earlier summary:\n{previous}"] if previous else [])
+            + [f"User: {question}\nAssistant: {answer}" for question, answer in old]
+        )
+        summary = None
+        if summarize is not None:
+            try:
+                summary = summarize(transcript)
+            except Exception as e:
+                print(f"Error summarizing chat history: {e}")
+        if not summary:
+            summary = "\n".join(
+                ([previous] if previous else [])
+                + [f"User: {question[:300]}\nAssistant: {answer[:300]}" for question, answer in old]
+            )[-self.max_tokens * 2:]
+        with self._lock:
+            if self.generation == generation:
+                self.summary = summary.strip()
+        return True
+
+    def clear(self):
+        with self._lock:
+            self.turns = []
+            self.summary = ''
+            self.generation += 1
+
+
+class ContextCache:
+    """Provider-side caching of stable prompt prefixes, with a local stand-in
+
+    prepare(model, (name, text)) returns the model to call with the prefix
+    (a system prompt plus any grounding) already applied. A prefix large
+    enough for Gemini context caching (min_tokens) is uploaded once per
+    model and content as cached content, reused until shortly before its
+    TTL runs out and then re-created, so requests only pay for their own
+    contents. Smaller prefixes, or any failure to create a cache, use the
+    local stand-in: the prefix is sent inline as the system instruction.
+    Only one thread uploads a given prefix; requests that arrive while it
+    is in flight send it inline instead of waiting. Pass `create` to
+    replace the provider call (e.g. in tests).
+    """
+
+    MARGIN = 60
+    RETRY_AFTER = 600
+
+    def __init__(self, enabled=True, ttl=3600, min_tokens=4096, create=None):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.create = create or self.create_cached_model
+        self.created = 0
+        self.reused = 0
+        self.inline = 0
+        self.errors = 0
+        self._entries = {}
+        self._failed = {}
+        self._creating = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model_name, prefix):
+        name, text = prefix
+        return (model_name, name, zlib.crc32(text.encode('utf-8')))
+
+    def create_cached_model(self, model_name, name, text):
+        if genai is None or getattr(genai, 'caching', None) is None:
+            raise RuntimeError("context caching is not available in this google-generativeai version")
+        cache = genai.caching.CachedContent.create(
+            model=f"models/{model_name}",
+            display_name=f"{APP_NAME.lower()}-{name}",
+            system_instruction=text,
+            ttl=timedelta(seconds=self.ttl)
+        )
+        return genai.GenerativeModel.from_cached_content(cached_content=cache)
+
+    @staticmethod
+    def local_model(model_name, text):
+        return genai.GenerativeModel(model_name, system_instruction=text)
+
+    def prepare(self, model_name, prefix):
+        """Model for a request with this prefix; returns (model, served_from_cache)"""
+        name, text = prefix
+        key = self.key(model_name, prefix)
+        now = time.monotonic()
+        if self.enabled and estimate_tokens(text) >= self.min_tokens:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] > now:
+                    self.reused += 1
+                    return entry[0], True
+                create = key not in self._creating and self._failed.get(key, 0) <= now
+                if create:
+                    self._creating.add(key)
+            if create:
+                # The upload is a network call, so it runs outside the lock
+                try:
+                    model = self.create(model_name, name, text)
+                except Exception as e:
+                    print(f"Context cache for {name} on {model_name} unavailable, sending it inline: {e}")
+                    with self._lock:
+                        self.errors += 1
+                        self._failed[key] = now + self.RETRY_AFTER
+                else:
+                    with self._lock:
+                        self._entries[key] = (model, now + max(self.ttl - self.MARGIN, self.ttl / 2))
+                        self.created += 1
+                    return model, True
+                finally:
+                    with self._lock:
+                        self._creating.discard(key)
+        with self._lock:
+            self.inline += 1
+        return self.local_model(model_name, text), False
+
+    def invalidate(self, model_name, prefix):
+        """Forget a cache the provider no longer has; the next request re-creates it"""
+        with self._lock:
+            self._entries.pop(self.key(model_name, prefix), None)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'cached_prefixes': len(self._entries),
+                'created': self.created,
+                'reused': self.reused,
+                'inline': self.inline,
+                'errors': self.errors
+            }
+
+
+class BudgetExceeded(Exception):
+    """Raised when a request would go over the daily or session token budget"""
+
+
+class UsageLedger:
+    """Token accounting per AI operation, with daily and session budgets
+
+    reserve() runs before sending and holds the most a request can use
+    (its input plus the output limit) against the budgets, so concurrent
+    requests cannot all pass before any of them is counted: foreground
+    requests are rejected once a budget would be spent, and background ones
+    are already dropped at `background_share` of it. record() then adds the
+    request's real input and output tokens under its operation
+    ("Tab/operation") for today and for this session and settles the
+    reservation; release() drops one whose request failed. A budget of 0
+    is unlimited. Only the last `history_days` days are kept.
+    """
+
+    background_share = 0.8
+
+    def __init__(self, daily_budget=0, session_budget=0, history_days=30):
+        self.daily_budget = daily_budget
+        self.session_budget = session_budget
+        self.history_days = history_days
+        self.days = {}
+        self.session = {}
+        self.reserved = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def today():
+        return datetime.now().strftime('%Y-%m-%d')
+
+    @staticmethod
+    def total(table):
+        return sum(entry['input_tokens'] + entry['output_tokens'] for entry in table.values())
+
+    def load(self, data):
+        with self._lock:
+            self.days = {day: dict(table) for day, table in data.get('days', {}).items()}
+
+    def to_dict(self):
+        with self._lock:
+            return {'days': {day: {op: dict(entry) for op, entry in table.items()}
+                             for day, table in self.days.items()}}
+
+    def reserve(self, tokens, background=False):
+        """Hold up to `tokens` against the budgets; raise if that would break one
+
+        Returns the amount held, to pass to record() or release().
+        """
+        with self._lock:
+            used = [
+                ('Daily', self.daily_budget, self.total(self.days.get(self.today(), {}))),
+                ('Session', self.session_budget, self.total(self.session))
+            ]
+            for name, budget, spent in used:
+                if not budget:
+                    continue
+                spent += self.reserved
+                if background and spent + tokens > budget * self.background_share:
+                    raise PrefetchSkipped()
+                if spent >= budget or spent + tokens > budget:
+                    raise BudgetExceeded(
+                        f"{name} AI token budget reached ({spent:,} of {budget:,} tokens used or in "
+                        f"flight, this request may need {tokens:,}). Raise {name.lower()}_token_budget "
+                        f"in {CONFIG_FILE} to continue."
+                    )
+            self.reserved += tokens
+        return tokens
+
+    def release(self, reserved):
+        with self._lock:
+            self.reserved -= reserved
+
+    def record(self, operation, input_tokens, output_tokens, estimated=False, truncated=False, cached_tokens=0,
+               reserved=0):
+        with self._lock:
+            self.reserved -= reserved
+            today = self.today()
+            for table in (self.days.setdefault(today, {}), self.session):
+                entry = table.setdefault(operation, {
+                    'requests': 0, 'input_tokens': 0, 'output_tokens': 0, 'estimated': 0, 'truncated': 0
+                })
+                entry['requests'] += 1
+                entry['input_tokens'] += input_tokens
+                entry['output_tokens'] += output_tokens
+                entry['estimated'] += estimated
+                entry['truncated'] += truncated
+                entry['cached_tokens'] = entry.get('cached_tokens', 0) + cached_tokens
+            for day in sorted(self.days)[:-self.history_days]:
+                del self.days[day]
+
+    def snapshot(self):
+        with self._lock:
+            today = self.days.get(self.today(), {})
+            return {
+                'today_tokens': self.total(today),
+                'session_tokens': self.total(self.session),
+                'daily_budget': self.daily_budget,
+                'session_budget': self.session_budget,
+                'today': {op: dict(entry) for op, entry in today.items()},
+                'session': {op: dict(entry) for op, entry in self.session.items()}
+            }
+
+
+class UlidGenerator:
+    """Monotonic ULIDs: 48-bit millisecond timestamp + 80 random bits, Crockford base32
+
+    Ids sort by creation time and stay unique even when several are made in
+    the same millisecond (the random part is incremented instead).
+    """
+
+    ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+    def __init__(self):
+        self._last_ms = -1
+        self._last_random = 0
+        self._lock = threading.Lock()
+
+    def new(self):
+        with self._lock:
+            ms = int(time.time() * 1000)
+            if ms <= self._last_ms:
+                ms = self._last_ms
+                random_part = self._last_random + 1
+                if random_part >= 1 << 80:
+                    ms += 1
+                    random_part = int.from_bytes(os.urandom(10), 'big')
+            else:
+                random_part = int.from_bytes(os.urandom(10), 'big')
+            self._last_ms, self._last_random = ms, random_part
+
+        value = (ms << 80) | random_part
+        chars = []
+        for _ in range(26):
+            chars.append(self.ALPHABET[value & 31])
+            value >>= 5
+        return ''.join(reversed(chars))
+
+
+new_ulid = UlidGenerator().new
+
+
+# A single dork term such as -inurl:"admin panel"; op is None for bare words
+DorkTerm = namedtuple('DorkTerm', 'op value negated quoted')
+
+DORK_TOKEN_RE = re.compile(r"""
+    \s*
+    (?:
+        (?P<paren>[()])
+      | (?P<pipe>\|)
+      | (?P<negated>-(?=\S))?
+        (?:(?P<op>[A-Za-z_]+):(?!//))?
+        (?:"(?P<quoted>[^"]*)"? | (?P<bare>[^\s()|"]*))
+    )
+""", re.VERBOSE)
+
+
+def tokenize_dork(query):
+    """Split a dork into DorkTerms plus 'OR', '(' and ')' tokens ('|' is read as OR)"""
+    tokens = []
+    pos, n = 0, len(query)
+    while pos < n:
+        match = DORK_TOKEN_RE.match(query, pos)
+        pos = match.end()
+        paren, pipe, negated, op, quoted, bare = match.group(
+            'paren', 'pipe', 'negated', 'op', 'quoted', 'bare'
+        )
+        if paren:
+            tokens.append(paren)
+        elif pipe:
+            tokens.append('OR')
+        elif bare == 'OR' and not (negated or op):
+            tokens.append('OR')
+        elif bare or op or quoted is not None:
+            tokens.append(DorkTerm(
+                op.lower() if op else None,
+                quoted if quoted is not None else bare,
+                bool(negated),
+                quoted is not None
+            ))
+        elif negated:
+            tokens.append(DorkTerm(None, '-', False, False))
+    return tokens
+
+
+def parse_dork(query):
+    """Parse a dork into a list of AND-ed units
+
+    A unit is a DorkTerm, ('or', [units]) for an OR chain, or
+    ('group', [units]) for a parenthesized sub-query.
+    """
+    def sequence(tokens, i):
+        units = []
+        pending_or = False
+        while i < len(tokens):
+            token = tokens[i]
+            if token == ')':
+                return units, i + 1
+            if token == 'OR':
+                pending_or = bool(units)
+                i += 1
+                continue
+            if token == '(':
+                inner, i = sequence(tokens, i + 1)
+                unit = ('group', inner)
+            else:
+                unit = token
+                i += 1
+            if pending_or:
+                previous = units[-1]
+                if not isinstance(previous, DorkTerm) and previous[0] == 'or':
+                    previous[1].append(unit)
+                else:
+                    units[-1] = ('or', [previous, unit])
+                pending_or = False
+            else:
+                units.append(unit)
+        return units, i
+
+    tokens = tokenize_dork(query)
+    units = []
+    i = 0
+    while i < len(tokens):
+        parsed, i = sequence(tokens, i)
+        units.extend(parsed)
+    return units
+
+
+def canonical_dork(query):
+    """Normalize a dork so queries that differ only in whitespace, case,
+    redundant quoting or term order compare equal"""
+    def term(t):
+        value = t.value.lower()
+        if t.quoted and (' ' in value or not value):
+            value = f'"{value}"'
+        return f"{'-' if t.negated else ''}{t.op + ':' if t.op else ''}{value}"
+
+    def unit(u):
+        if isinstance(u, DorkTerm):
+            return term(u)
+        kind, children = u
+        if kind == 'or':
+            alternatives = sorted({unit(c) for c in children})
+            return ' OR '.join(alternatives)
+        if len(children) == 1:
+            return unit(children[0])
+        return f"({units(children)})"
+
+    def units(items):
+        return ' '.join(sorted({unit(u) for u in items}))
+
+    return units(parse_dork(query))
+
+
+def dork_hash(query):
+    """Content hash of a dork's canonical form"""
+    return hashlib.sha1(canonical_dork(query).encode('utf-8')).hexdigest()
+
+
+DORK_OPERATORS = (
+    'site', 'filetype', 'ext', 'intitle', 'allintitle', 'inurl', 'allinurl',
+    'intext', 'allintext', 'inanchor', 'allinanchor', 'cache', 'related',
+    'info', 'link', 'before', 'after', 'define', 'source', 'location'
+)
+
+DORK_FILETYPES = (
+    'pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'odt', 'ods', 'odp', 'rtf',
+    'txt', 'csv', 'log', 'sql', 'db', 'mdb', 'env', 'conf', 'cfg', 'ini', 'xml',
+    'json', 'yml', 'yaml', 'bak', 'old', 'pem', 'key', 'ppk', 'ovpn', 'php', 'asp',
+    'aspx', 'jsp', 'cgi', 'pl', 'py', 'sh', 'bat', 'ps1', 'java', 'js', 'c', 'cpp',
+    'cs', 'rb', 'go', 'html', 'htm', 'swf',
+    'kml', 'kmz', 'gpx', 'tex', 'ps', 'wpd', 'dwf', 'zip', 'tar', 'gz', 'rar'
+)
+
+
+def format_term(term):
+    """Render a DorkTerm back to query syntax"""
+    value = f'"{term.value}"' if term.quoted else term.value
+    return f"{'-' if term.negated else ''}{term.op + ':' if term.op else ''}{value}"
+
+
+def lint_dork(query):
+    """Rule-based offline check of a dork
+
+    Catches mechanical problems (quoting, parentheses, unknown operators,
+    file type typos, contradictions, empty builder fields) instantly and
+    without an API call. Returns a DorkResult with a 0-100 score, issues
+    and suggested fixes.
+    """
+    issues, suggestions = [], []
+    penalty = 0
+
+    def flag(points, issue, suggestion=None):
+        nonlocal penalty
+        penalty += points
+        issues.append(issue)
+        if suggestion and suggestion not in suggestions:
+            suggestions.append(suggestion)
+
+    query = query.strip()
+    if not query:
+        return DorkResult(explanation="Nothing to check yet", score=0, issues=["Empty query"])
+
+    if query.count('"') % 2:
+        flag(25, 'Unbalanced quote: a " is never closed', 'Close the quoted phrase')
+
+    depth = 0
+    for part in query.split('"')[::2]:
+        for ch in part:
+            depth += {'(': 1, ')': -1}.get(ch, 0)
+            if depth < 0:
+                break
+        if depth < 0:
+            break
+    if depth < 0:
+        flag(20, "Unbalanced parentheses: ')' without a matching '('", "Remove the stray ')'")
+    elif depth > 0:
+        flag(20, "Unbalanced parentheses: '(' is never closed", "Add the missing ')'")
+
+    tokens = tokenize_dork(query)
+    terms = [t for t in tokens if isinstance(t, DorkTerm)]
+    for previous, token in zip([None] + tokens, tokens + [None]):
+        if token == 'OR' and previous in (None, '(', 'OR') or previous == 'OR' and token in (None, ')'):
+            flag(15, "OR has nothing on one side", "Remove the dangling OR")
+            break
+
+    for term in terms:
+        if term.op is None:
+            if term.value == '-' and not term.quoted:
+                flag(10, "Dangling '-' excludes nothing", "Attach '-' to the term to exclude, e.g. -site:example.com")
+            elif term.value == 'or' and not term.quoted:
+                flag(10, "Lowercase 'or' is searched as a word", "Write OR in capitals")
+            continue
+
+        if term.op not in DORK_OPERATORS:
+            close = difflib.get_close_matches(term.op, DORK_OPERATORS, n=1, cutoff=0.75)
+            if close:
+                flag(20, f"Unknown operator '{term.op}:'", f"Did you mean '{close[0]}:'?")
+            else:
+                flag(15, f"Unsupported operator '{term.op}:' is searched as plain text")
+            continue
+
+        value = term.value.strip()
+        nested = re.match(r'([A-Za-z_]+):', value)
+        if not value:
+            flag(25, f"'{term.op}:' has no value (empty builder field?)", f"Fill in or remove {term.op}:")
+        elif nested and nested.group(1).lower() in DORK_OPERATORS:
+            flag(20, f"Repeated operator '{term.op}:{nested.group(1)}:'", f"Use a single {term.op}:")
+        elif term.op == 'site' and ('://' in value or '/' in value.strip('/')):
+            domain = value.split('://')[-1].split('/')[0]
+            flag(10, "site: takes a domain, not a URL", f"Use site:{domain}")
+        elif term.op in ('filetype', 'ext'):
+            ext = value.lower().lstrip('.')
+            if value.startswith('.'):
+                flag(5, f"{term.op}: expects the extension without a dot", f"Use {term.op}:{ext}")
+            if ext and ext not in DORK_FILETYPES:
+                # Prefer swapped letters (pfd -> pdf) over other near misses
+                close = [t for t in DORK_FILETYPES if sorted(t) == sorted(ext)]
+                close = close or difflib.get_close_matches(ext, DORK_FILETYPES, n=1, cutoff=0.6)
+                if close:
+                    flag(15, f"Unknown file type '{ext}'", f"Did you mean {term.op}:{close[0]}?")
+                else:
+                    flag(5, f"Uncommon file type '{ext}'; Google indexes only some types")
+
+    required = {(t.op, t.value.lower()) for t in terms if not t.negated}
+    for term in terms:
+        if term.negated and (term.op, term.value.lower()) in required:
+            flag(30, f"'{format_term(term)[1:]}' is both required and excluded", "Drop one of the two terms")
+
+    top_level = [u for u in parse_dork(query) if isinstance(u, DorkTerm) and not u.negated]
+    for op in ('site', 'filetype', 'ext'):
+        values = {t.value.lower() for t in top_level if t.op == op and t.value}
+        if len(values) > 1:
+            flag(25, f"{len(values)} {op}: terms are ANDed, so no page can match",
+                 f"Join them with OR: ({' OR '.join(f'{op}:{v}' for v in sorted(values))})")
+
+    repeated = [t for t, n in Counter((t.op, t.value.lower(), t.negated) for t in terms).items() if n > 1]
+    if repeated:
+        flag(5, f"{len(repeated)} term(s) appear more than once", "Remove the duplicates")
+
+    if terms and all(t.negated for t in terms):
+        flag(30, "Only exclusions: there is nothing to search for", "Add at least one positive term")
+
+    words = sum(len(t.value.split()) or 1 for t in terms)
+    if words > 32:
+        flag(10, f"{words} words: Google ignores everything past 32", "Shorten the query")
+
+    if terms and not any(t.op for t in terms):
+        flag(5, "No operators: this is a plain keyword search", "Narrow it with site:, filetype: or intitle:")
+
+    explanation = (f"Offline check found {len(issues)} issue(s)" if issues
+                   else "Offline check found no mechanical problems")
+    return DorkResult(dork=query, explanation=explanation, score=max(0, 100 - penalty),
+                      issues=issues, suggestions=suggestions)
+
+
+OPERATOR_ORDER = ('site', 'filetype', 'ext', 'inurl', 'allinurl', 'intitle', 'allintitle',
+                  'intext', 'allintext')
+
+
+def optimize_dork(query):
+    """Rewrite a dork into a minimal canonical form
+
+    Applies only rewrites that keep the set of matching pages: drops empty
+    operators and duplicates, terms implied by a longer term of the same
+    kind, OR chains absorbed by a required term and redundant parentheses,
+    groups OR chains explicitly and orders terms site, filetype, inurl,
+    intitle, intext, other operators, words, exclusions. Returns
+    (optimized query, list of rewrites explained).
+    """
+    changes = []
+
+    def note(change):
+        if change not in changes:
+            changes.append(change)
+
+    def identity(unit):
+        if isinstance(unit, DorkTerm):
+            return (unit.op, unit.value.lower(), unit.quoted, unit.negated)
+        kind, children = unit
+        ids = frozenset(map(identity, children))
+        return (kind, ids) if kind == 'or' else (kind, tuple(sorted(ids, key=repr)))
+
+    def render(unit, nested=False):
+        if isinstance(unit, DorkTerm):
+            return format_term(unit)
+        kind, children = unit
+        if kind == 'or':
+            text = ' OR '.join(render(c, nested=True) for c in children)
+            return f"({text})" if nested else text
+        return f"({' '.join(render(c, nested=True) for c in children)})"
+
+    def clean_term(term):
+        if term.op is None and term.value == '-' and not term.quoted:
+            note("Removed a dangling '-'")
+            return None
+        if term.op and not term.value.strip() and not term.quoted:
+            note(f"Removed empty '{term.op}:'")
+            return None
+        if term.op in ('filetype', 'ext') and term.value.startswith('.'):
+            note(f"Dropped the dot in {term.op}:{term.value}")
+            return term._replace(value=term.value.lstrip('.'))
+        return term
+
+    def simplify(units, in_or=False):
+        out = []
+        for unit in units:
+            if isinstance(unit, DorkTerm):
+                unit = clean_term(unit)
+                if unit is not None:
+                    out.append(unit)
+                continue
+            kind, children = unit
+            children = simplify(children, in_or=(kind == 'or'))
+            if kind == 'group' and (not in_or or len(children) == 1):
+                lone_or = len(children) == 1 and not isinstance(children[0], DorkTerm) and not in_or
+                if children and not lone_or:
+                    note("Removed redundant parentheses")
+                out.extend(children)
+                continue
+            if kind == 'or':
+                flat = []
+                for child in children:
+                    is_or = not isinstance(child, DorkTerm) and child[0] == 'or'
+                    flat.extend(child[1] if is_or else [child])
+                unique = {}
+                for child in flat:
+                    if identity(child) in unique:
+                        note(f"Removed duplicate alternative {render(child, nested=True)} from an OR")
+                    else:
+                        unique[identity(child)] = child
+                children = list(unique.values())
+                if len(children) == 1:
+                    out.extend(simplify(children, in_or))
+                    continue
+            if children:
+                out.append((kind, children))
+        return out
+
+    if any(op.lower() != op and op.lower() in DORK_OPERATORS
+           for op in re.findall(r'(?<![\w"])-?([A-Za-z_]+):', query)):
+        note("Lowercased operators")
+
+    units = simplify(parse_dork(query))
+
+    # Duplicate AND-ed units
+    unique = {}
+    for unit in units:
+        if identity(unit) in unique:
+            note(f"Removed duplicate term {render(unit, nested=True)}")
+        else:
+            unique[identity(unit)] = unit
+    units = list(unique.values())
+
+    # A OR chain with an alternative that is already required adds nothing
+    # (a required "word" also requires the bare word)
+    required = set()
+    for unit in units:
+        if isinstance(unit, DorkTerm) and not unit.negated:
+            required.update({identity(unit), identity(unit._replace(quoted=False))})
+    kept = []
+    for unit in units:
+        if not isinstance(unit, DorkTerm) and unit[0] == 'or' and required & set(map(identity, unit[1])):
+            note(f"Dropped {render(unit, nested=True)}: one alternative is already required")
+        else:
+            kept.append(unit)
+    units = kept
+
+    # Same-kind terms where one implies the other; of the same text, the
+    # quoted (exact) form is the stricter
+    def contains(op, longer, shorter):
+        if op in ('inurl', 'allinurl'):
+            return shorter in longer
+        return re.search(rf'(?<!\w){re.escape(shorter)}(?!\w)', longer) is not None
+
+    terms = [u for u in units if isinstance(u, DorkTerm) and u.op in OPERATOR_ORDER[3:] + (None,)]
+    redundant = set()
+    for a in terms:
+        for b in terms:
+            if a is b or a.op != b.op or a.negated != b.negated or id(b) in redundant:
+                continue
+            short, long_ = a.value.lower(), b.value.lower()
+            if not short or not contains(a.op, long_, short):
+                continue
+            if short == long_ and not (b.quoted and not a.quoted):
+                continue
+            if a.negated:
+                redundant.add(id(b))
+                note(f"Dropped {format_term(b)}: already excluded by {format_term(a)}")
+            else:
+                redundant.add(id(a))
+                note(f"Dropped {format_term(a)}: implied by {format_term(b)}")
+                break
+    units = [u for u in units if id(u) not in redundant]
+
+    # Canonical order
+    def rank(unit):
+        if isinstance(unit, DorkTerm):
+            if unit.op in OPERATOR_ORDER:
+                group = OPERATOR_ORDER.index(unit.op)
+            else:
+                group = len(OPERATOR_ORDER) + (0 if unit.op else 1)
+            return (unit.negated, group)
+        # OR chains and groups sort with their leading kind of term
+        return (False, min(rank(child)[1] for child in unit[1]))
+
+    ordered = sorted(units, key=rank)
+    if ordered != units:
+        note("Reordered terms: site, filetype, inurl, intitle, intext, other operators, words, exclusions")
+
+    optimized = ' '.join(render(u, nested=len(ordered) > 1) for u in ordered)
+    if optimized != ' '.join(query.split()) and not changes:
+        note("Normalized spacing and OR grouping")
+    return optimized, changes
+
+
+def split_tags(tags):
+    """Tuple of interned tags from a comma-separated string or an iterable"""
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    tags = (str(tag).strip() for tag in tags or ())
+    return tuple(sys.intern(tag) for tag in tags if tag)
+
+
+def merge_tags(*tag_strings):
+    """Union comma-separated tag strings (or tag tuples), keeping first spelling and order"""
+    seen = {}
+    for tags in tag_strings:
+        for tag in split_tags(tags):
+            if tag and tag.lower() not in seen:
+                seen[tag.lower()] = tag
+    return ', '.join(seen.values())
+
+
+def merge_notes(*notes):
+    """Union note strings, dropping empties and exact repeats"""
+    parts = []
+    for note in notes:
+        for part in (note or '').split(' | '):
+            part = part.strip()
+            if part and part not in parts:
+                parts.append(part)
+    return ' | '.join(parts)
+
+
+class NotesSource:
+    """Reads lazily loaded vault notes back from the vault file
+
+    Offsets point at the opening quote of a JSON string. The file is ASCII
+    (json's default output), so character and byte offsets agree. `lock`
+    is held while a save swaps the file and re-points deferred notes, so a
+    read never sees an offset from the wrong version of the file.
+    """
+
+    lock = threading.RLock()
+
+    def __init__(self, path):
+        self.path = path
+
+    def read(self, offset):
+        with self.lock, open(self.path, 'rb') as f:
+            f.seek(offset)
+            text = ''
+            while True:
+                chunk = f.read(4096)
+                text += chunk.decode('ascii')
+                try:
+                    return json.decoder.scanstring(text, 1)[0]
+                except json.JSONDecodeError:
+                    if not chunk:
+                        raise
+
+
+class VaultRecord:
+    """One vault entry
+
+    Slotted with interned tags and a float timestamp so that 100k+ records
+    stay small; to_dict/from_dict convert to and from the JSON shape on
+    disk. A timestamp string the float can't reproduce (one with a UTC
+    offset, or not ISO at all) is kept and written back as read. Notes can
+    be deferred to the vault file (see NotesSource) and are then read back
+    on access.
+    """
+
+    __slots__ = ('id', 'dork', '_tags', '_timestamp', '_timestamp_text', '_notes', '_notes_at', '_source')
+
+    def __init__(self, id, dork, tags=(), notes='', timestamp=None, timestamp_text=None):
+        self.id = id
+        self.dork = dork
+        self.tags = tags
+        self.notes = notes
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self._timestamp_text = timestamp_text
+
+    @classmethod
+    def from_dict(cls, data):
+        timestamp = data.get('timestamp')
+        text = None
+        if isinstance(timestamp, str):
+            text = timestamp
+            try:
+                parsed = datetime.fromisoformat(timestamp)
+            except ValueError:
+                # Kept as written; dated now for sorting
+                timestamp = None
+            else:
+                timestamp = parsed.timestamp()
+                if parsed.tzinfo is None and parsed.isoformat() == text:
+                    text = None
+        elif not isinstance(timestamp, (int, float)):
+            timestamp = None
+        return cls(
+            id=str(data.get('id') or new_ulid()),
+            dork=str(data.get('dork') or '').strip(),
+            tags=data.get('tags'),
+            notes=str(data.get('notes') or ''),
+            timestamp=timestamp,
+            timestamp_text=text
+        )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'dork': self.dork,
+            'tags': self.tag_text,
+            'notes': self.notes,
+            'timestamp': self.timestamp_text
+        }
+
+    @property
+    def tags(self):
+        return self._tags
+
+    @tags.setter
+    def tags(self, value):
+        self._tags = split_tags(value)
+
+    @property
+    def tag_text(self):
+        return ', '.join(self._tags)
+
+    @property
+    def timestamp(self):
+        return self._timestamp
+
+    @timestamp.setter
+    def timestamp(self, value):
+        self._timestamp = value
+        self._timestamp_text = None
+
+    @property
+    def timestamp_text(self):
+        if self._timestamp_text is not None:
+            return self._timestamp_text
+        return datetime.fromtimestamp(self._timestamp).isoformat()
+
+    def copy_timestamp(self, other):
+        """Take other's timestamp, along with the text it was read from"""
+        self._timestamp = other._timestamp
+        self._timestamp_text = other._timestamp_text
+
+    @property
+    def notes(self):
+        notes = self._notes
+        if notes is not None:
+            return notes
+        with NotesSource.lock:
+            if self._notes is None:
+                return self._source.read(self._notes_at)
+            return self._notes
+
+    @notes.setter
+    def notes(self, value):
+        if getattr(self, '_source', None) is None:
+            self._notes = value or ''
+            self._notes_at = -1
+            self._source = None
+            return
+        with NotesSource.lock:
+            self._notes = value or ''
+            self._notes_at = -1
+            self._source = None
+
+    @property
+    def notes_deferred(self):
+        return self._notes is None
+
+    def defer_notes(self, source, offset):
+        """Drop the notes text; it will be read from source at offset"""
+        self._source = source
+        self._notes_at = offset
+        self._notes = None
+
+    def locate_notes(self, source, offset):
+        """Remember where the notes sit on disk, keeping the text until release_notes"""
+        self._source = source
+        self._notes_at = offset
+
+    def release_notes(self):
+        """Defer notes whose file offset is already known"""
+        if self._source is not None and self._notes_at >= 0:
+            self._notes = None
+
+
+class Template:
+    """A gallery template"""
+
+    __slots__ = ('name', 'category', 'query')
+
+    def __init__(self, name, category, query):
+        self.name = name
+        self.category = sys.intern(category)
+        self.query = query
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['category'], data['query'])
+
+    def to_dict(self):
+        return {'name': self.name, 'category': self.category, 'query': self.query}
+
+
+class VaultSearchIndex:
+    """Incrementally maintained inverted index over vault dorks, tags and notes
+
+    Every record is reduced to a token set: operator terms (filetype:sql),
+    the words inside them (sql), tag:<name> tokens and words from tags and
+    notes. Query terms with an operator match tokens by prefix; bare words
+    match any token containing them. Matches are cached per term so each
+    keystroke only narrows the previous keystroke's candidates.
+    """
+
+    WORD_RE = re.compile(r'[a-z0-9]+')
+
+    def __init__(self):
+        self.postings = {}
+        self._tokens = {}
+        self._order = {}
+        self._next_order = 0
+        self._prev_order = -1
+        self._sorted_vocab = []
+        self._term_cache = OrderedDict()
+        self.version = 0
+
+    def record_tokens(self, item):
+        tokens = set()
+        for term in tokenize_dork(item.dork):
+            if not isinstance(term, DorkTerm):
+                continue
+            value = term.value.lower()
+            if term.op:
+                tokens.add(f"{term.op}:{value}")
+            if value and ' ' not in value:
+                tokens.add(value)
+            tokens.update(self.WORD_RE.findall(value))
+        for tag in item.tags:
+            tag = tag.lower()
+            tokens.add(f"tag:{tag}")
+            tokens.update(self.WORD_RE.findall(tag))
+        tokens.update(self.WORD_RE.findall(item.notes.lower()))
+        return tokens
+
+    def add(self, item, bulk=False, older=False, tokens=None):
+        """Index item as the newest record, or (older=True) as the oldest
+
+        tokens, if given, are the item's record_tokens computed beforehand.
+        """
+        item_id = item.id
+        if item_id in self._tokens:
+            self.remove(item_id)
+        if tokens is None:
+            tokens = self.record_tokens(item)
+        self._tokens[item_id] = tokens
+        if older:
+            self._order[item_id] = self._prev_order
+            self._prev_order -= 1
+        else:
+            self._order[item_id] = self._next_order
+            self._next_order += 1
+        for token in tokens:
+            ids = self.postings.get(token)
+            if ids is None:
+                self.postings[token] = ids = set()
+                if self._sorted_vocab is not None:
+                    if bulk:
+                        self._sorted_vocab = None
+                    else:
+                        bisect.insort(self._sorted_vocab, token)
+            ids.add(item_id)
+        self._changed()
+
+    def update(self, item):
+        """Re-index a record whose text changed, keeping its position"""
+        order = self._order.get(item.id)
+        self.add(item)
+        if order is not None:
+            self._order[item.id] = order
+
+    def remove(self, item_id):
+        tokens = self._tokens.pop(item_id, None)
+        if tokens is None:
+            return
+        self._order.pop(item_id, None)
+        for token in tokens:
+            ids = self.postings[token]
+            ids.discard(item_id)
+            if not ids:
+                del self.postings[token]
+                if self._sorted_vocab is not None:
+                    i = bisect.bisect_left(self._sorted_vocab, token)
+                    del self._sorted_vocab[i]
+        self._changed()
+
+    def clear(self):
+        self.__init__()
+
+    def search(self, query):
+        """Return the set of matching ids (unordered)"""
+        include = []
+        exclude = set()
+        for term in tokenize_dork(query):
+            if not isinstance(term, DorkTerm):
+                continue
+            value = term.value.lower()
+            # Half-typed terms ("admin -", "inurl:") would match nothing
+            # and flash the list empty; ignore them until they have a value
+            if not (value.strip() if term.op else self.WORD_RE.search(value)):
+                continue
+            if term.op:
+                keys = [f"{term.op}:{value}"]
+            else:
+                keys = self.WORD_RE.findall(value) if ' ' in value else [value]
+            for key in keys:
+                if not key:
+                    continue
+                matches = self._term_matches(key, prefix_only=bool(term.op) or len(key) < 3)
+                if term.negated:
+                    exclude |= matches
+                else:
+                    include.append(matches)
+
+        if include:
+            include.sort(key=len)
+            result = include[0]
+            for matches in include[1:]:
+                result = result & matches
+                if not result:
+                    break
+        else:
+            result = self._tokens.keys()
+        if exclude:
+            result = result - exclude
+        # May be a cached set or a keys view; callers must not mutate it
+        return result
+
+    def newest_first(self, ids):
+        """Order a (small) id set newest first"""
+        return sorted(ids, key=self._order.__getitem__, reverse=True)
+
+    def _term_matches(self, key, prefix_only):
+        cache_key = (key, prefix_only)
+        cached = self._term_cache.get(cache_key)
+        if cached is not None:
+            self._term_cache.move_to_end(cache_key)
+            return cached[1]
+
+        if prefix_only:
+            vocab = self._vocab()
+            start = bisect.bisect_left(vocab, key)
+            end = bisect.bisect_left(vocab, key + '\uffff')
+            tokens = vocab[start:end]
+        else:
+            # Narrow from a cached shorter term when the user is still typing
+            candidates = self.postings.keys()
+            for (other, other_prefix), (other_tokens, _) in reversed(self._term_cache.items()):
+                if not other_prefix and other in key:
+                    candidates = other_tokens
+                    break
+            tokens = [t for t in candidates if key in t]
+
+        ids = set()
+        total = len(self._tokens)
+        for token in tokens:
+            ids |= self.postings[token]
+            if len(ids) == total:
+                break
+        self._term_cache[cache_key] = (tokens, ids)
+        if len(self._term_cache) > 64:
+            self._term_cache.popitem(last=False)
+        return ids
+
+    def _vocab(self):
+        if self._sorted_vocab is None:
+            self._sorted_vocab = sorted(self.postings)
+        return self._sorted_vocab
+
+    def _changed(self):
+        self.version += 1
+        self._term_cache.clear()
+
+
+class SimilarityIndex:
+    """MinHash/LSH index answering "dorks similar to this one"
+
+    A dork is reduced to a feature set (operator terms, words and
+    character 3-grams of values) summarized by a 32-slot
+    one-permutation MinHash signature. Signatures are cut into 16 bands of
+    2 slots; entries sharing a band with the query are candidates, ranked by
+    the fraction of equal slots (an estimate of Jaccard similarity). The
+    best few are rescored exactly, since the estimate runs high for short
+    dorks. Adding and removing entries is incremental.
+    """
+
+    SLOTS = 32
+    MAX_CANDIDATES = 500
+    EMPTY = 0xFFFFFFFF
+
+    def __init__(self):
+        self.signatures = {}
+        self.dorks = {}
+        self.buckets = {}
+
+    def __len__(self):
+        return len(self.signatures)
+
+    @staticmethod
+    def features(dork):
+        features = set()
+        for term in tokenize_dork(dork.lower()):
+            if not isinstance(term, DorkTerm) or not term.value:
+                continue
+            value = term.value
+            prefix = '-' if term.negated else ''
+            if term.op:
+                features.add(f"{prefix}{term.op}:{value}")
+            features.update(f"w:{word}" for word in value.split())
+            features.update(f"g:{value[i:i + 3]}" for i in range(max(1, len(value) - 2)))
+        return features
+
+    def signature(self, dork):
+        """One-permutation MinHash of dork's features (None if it has none)"""
+        slots = self.SLOTS
+        sig = [self.EMPTY] * slots
+        for h in map(zlib.crc32, map(str.encode, self.features(dork))):
+            slot, value = h % slots, h // slots
+            if value < sig[slot]:
+                sig[slot] = value
+        empty = self.EMPTY
+        if empty in sig:
+            if sig.count(empty) == slots:
+                return None
+            # Densify: an empty slot borrows the next filled one, tagged by distance
+            source = sig[:]
+            for i in range(slots):
+                if source[i] == empty:
+                    step = 1
+                    while source[(i + step) % slots] == empty:
+                        step += 1
+                    sig[i] = (source[(i + step) % slots] + step * 0x9E3779B1) & 0x7FFFFFFF
+        return array('I', sig)
+
+    def _bands(self, sig):
+        return list(map(hash, zip(range(self.SLOTS // 2), sig[0::2], sig[1::2])))
+
+    def add(self, key, dork):
+        self.insert(key, dork, self.signature(dork))
+
+    def insert(self, key, dork, sig):
+        """Add dork under key with a signature computed beforehand"""
+        self.remove(key)
+        if sig is None:
+            return
+        self.signatures[key] = sig
+        self.dorks[key] = dork
+        for band in self._bands(sig):
+            bucket = self.buckets.get(band)
+            if bucket is None:
+                self.buckets[band] = [key]
+            else:
+                bucket.append(key)
+
+    def remove(self, key):
+        sig = self.signatures.pop(key, None)
+        if sig is None:
+            return
+        del self.dorks[key]
+        for band in self._bands(sig):
+            bucket = self.buckets[band]
+            bucket.remove(key)
+            if not bucket:
+                del self.buckets[band]
+
+    def clear(self):
+        self.signatures = {}
+        self.dorks = {}
+        self.buckets = {}
+
+    def similar(self, dork, k=10, min_score=0.2, exclude=()):
+        """Top-k (score, key) pairs for entries similar to dork, best first"""
+        features = self.features(dork)
+        sig = self.signature(dork)
+        if sig is None:
+            return []
+        hits = Counter()
+        for band in self._bands(sig):
+            bucket = self.buckets.get(band)
+            if bucket:
+                hits.update(bucket)
+        for key in exclude:
+            hits.pop(key, None)
+
+        estimates = []
+        for key, _ in hits.most_common(self.MAX_CANDIDATES):
+            estimates.append((sum(a == b for a, b in zip(sig, self.signatures[key])), key))
+        estimates.sort(key=lambda r: r[0], reverse=True)
+
+        results = []
+        for _, key in estimates[:k * 4]:
+            other = self.features(self.dorks[key])
+            score = len(features & other) / len(features | other)
+            if score >= min_score:
+                results.append((score, key))
+        results.sort(key=lambda r: r[0], reverse=True)
+        return results[:k]
+
+
+class VaultStore:
+    """In-memory vault: an insertion-ordered id -> record map plus a content-hash index
+
+    Lookup, update and delete by id are O(1); iterating the store yields
+    records newest first. `hashes` maps each canonical dork hash to the
+    oldest record with that content. While the vault is being paged in,
+    older records collect in `older` (newest first) and are merged into
+    `items` once by finish_loading().
+    """
+
+    def __init__(self):
+        self.items = {}
+        self.older = {}
+        self.hashes = {}
+        self._hash_of = {}
+        self._ids_by_hash = {}
+        self.search_index = VaultSearchIndex()
+        self.similarity = SimilarityIndex()
+        # Local changes not yet merged into a shared vault file (see SharedVault)
+        self.journal = False
+        self.dirty = {}
+        self.deleted = set()
+        self._journal_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.items) + len(self.older)
+
+    def __contains__(self, item_id):
+        return item_id in self.items or item_id in self.older
+
+    def __iter__(self):
+        yield from reversed(self.items.values())
+        yield from self.older.values()
+
+    def get(self, item_id):
+        item = self.items.get(item_id)
+        return self.older.get(item_id) if item is None else item
+
+    def find_duplicate(self, dork):
+        """Return the stored record equivalent to dork, if any"""
+        return self.hashes.get(dork_hash(dork))
+
+    def add(self, item):
+        """Insert item, or merge it into an equivalent record; returns (record, merged)"""
+        existing = self.find_duplicate(item.dork)
+        if existing is not None:
+            self.merge(existing, item)
+            return existing, True
+        self.items[item.id] = item
+        self._index(item)
+        self.search_index.add(item)
+        self.similarity.add(item.id, item.dork)
+        self._journal(item)
+        return item, False
+
+    def import_record(self, item):
+        """Add an imported record; a clashing id on different content gets a fresh id"""
+        if item.id in self and self.find_duplicate(item.dork) is not self.get(item.id):
+            item.id = new_ulid()
+        return self.add(item)
+
+    def merge(self, target, duplicate):
+        """Fold a duplicate's tags and notes into target"""
+        target.tags = merge_tags(target.tags, duplicate.tags)
+        target.notes = merge_notes(target.notes, duplicate.notes)
+        self.search_index.update(target)
+        self._journal(target)
+
+    def search(self, query, limit=None):
+        """Records matching query, newest first; returns (records, total matches)"""
+        results, total = self.iter_search(query)
+        return list(itertools.islice(results, limit)), total
+
+    def iter_search(self, query):
+        """Records matching query, lazily and newest first; returns (iterator, total matches)
+
+        Large result sets are produced by walking a snapshot of the store
+        newest first, so a page of a broad query never sorts the whole match
+        set; small ones are sorted up front. An empty query matches every
+        record. Records removed after the call are skipped.
+        """
+        if query.strip():
+            ids = self.search_index.search(query)
+            total = len(ids)
+        else:
+            ids = None
+            total = len(self)
+        if ids is None or total * 8 > len(self):
+            snapshot = list(reversed(self.items.values()))
+            snapshot += self.older.values()
+            if ids is None:
+                results = (item for item in snapshot if item.id in self)
+            else:
+                results = (item for item in snapshot if item.id in ids and item.id in self)
+        else:
+            results = filter(None, map(self.get, self.search_index.newest_first(ids)))
+        return results, total
+
+    def update(self, item_id, **fields):
+        """Change fields of a record in place, keeping the hash index current"""
+        item = self.get(item_id)
+        if 'dork' in fields:
+            self._unindex(item_id)
+        for name, value in fields.items():
+            setattr(item, name, value)
+        if 'dork' in fields:
+            self._index(item)
+            self.similarity.add(item.id, item.dork)
+        self.search_index.update(item)
+        self._journal(item)
+        return item
+
+    def remove(self, item_id, journal=True):
+        """Delete a record by id; returns it (or None)"""
+        item = self.items.pop(item_id, None)
+        if item is None:
+            item = self.older.pop(item_id, None)
+        if item is not None:
+            self._unindex(item_id)
+            self.search_index.remove(item_id)
+            self.similarity.remove(item_id)
+            if journal:
+                self._journal(item, deleted=True)
+        return item
+
+    def take_changes(self):
+        """Hand over the journal of local changes: ({id: record}, {deleted ids})"""
+        with self._journal_lock:
+            dirty, deleted = self.dirty, self.deleted
+            self.dirty, self.deleted = {}, set()
+        return dirty, deleted
+
+    def restore_changes(self, dirty, deleted):
+        """Put back changes whose write failed, under any made since"""
+        with self._journal_lock:
+            for item_id in deleted:
+                if item_id not in self.dirty:
+                    self.deleted.add(item_id)
+            for item_id, item in dirty.items():
+                if item_id not in self.deleted:
+                    self.dirty.setdefault(item_id, item)
+
+    def apply_external(self, raws, deleted):
+        """Apply another writer's changes without journaling them
+
+        raws are records in the JSON shape. Records with unsaved local
+        changes are left alone; the next save writes the local version.
+        Returns (added, updated, removed) records.
+        """
+        added, updated, removed = [], [], []
+        with self._journal_lock:
+            pending = set(self.dirty) | self.deleted
+        for raw in raws:
+            record = VaultRecord.from_dict(raw)
+            if record.id in pending or not record.dork:
+                continue
+            existing = self.get(record.id)
+            if existing is None:
+                self.items[record.id] = record
+                self._index(record)
+                self.search_index.add(record)
+                self.similarity.add(record.id, record.dork)
+                added.append(record)
+            elif existing.to_dict() != record.to_dict():
+                if existing.dork != record.dork:
+                    self._unindex(record.id)
+                    existing.dork = record.dork
+                    self._index(existing)
+                    self.similarity.add(existing.id, existing.dork)
+                existing.tags = record.tags
+                existing.notes = record.notes
+                existing.copy_timestamp(record)
+                self.search_index.update(existing)
+                updated.append(existing)
+        for item_id in deleted:
+            if item_id not in pending:
+                item = self.remove(item_id, journal=False)
+                if item is not None:
+                    removed.append(item)
+        return added, updated, removed
+
+    def remove_many(self, item_ids):
+        return [item for item in map(self.remove, list(item_ids)) if item is not None]
+
+    def load(self, records):
+        """Replace the contents with records (oldest first); duplicates are kept"""
+        self.items = {}
+        self.older = {}
+        self.hashes = {}
+        self._hash_of = {}
+        self._ids_by_hash = {}
+        self.search_index.clear()
+        self.similarity.clear()
+        for item in records:
+            self.items[item.id] = item
+            self._index(item)
+            self.search_index.add(item, bulk=True)
+            self.similarity.add(item.id, item.dork)
+            item.release_notes()
+
+    def prepare_page(self, records):
+        """Parse and hash records (newest first) into a page for load_older
+
+        Only reads the indexes' settings, so a loader thread can do this
+        while the Tk thread keeps running.
+        """
+        return [
+            (item, dork_hash(item.dork), self.search_index.record_tokens(item),
+             self.similarity.signature(item.dork))
+            for item in records
+        ]
+
+    def load_older(self, page):
+        """Put a page from prepare_page behind everything already loaded
+
+        Used by paged loading, which reads the vault file from the end.
+        """
+        older = self.older
+        for item, key, tokens, sig in page:
+            if item.id in self.items or item.id in older:
+                continue
+            older[item.id] = item
+            self._hash_of[item.id] = key
+            ids = self._ids_by_hash.get(key)
+            self._ids_by_hash[key] = {item.id: None, **ids} if ids else {item.id: None}
+            self.hashes[key] = item
+            self.search_index.add(item, bulk=True, older=True, tokens=tokens)
+            self.similarity.insert(item.id, item.dork, sig)
+            item.release_notes()
+
+    def finish_loading(self):
+        """Move the paged-in older records into `items`, in one pass"""
+        if self.older:
+            items = dict(reversed(self.older.items()))
+            items.update(self.items)
+            self.items = items
+            self.older = {}
+
+    def to_list(self):
+        """Records oldest first"""
+        return list(reversed(self.older.values())) + list(self.items.values())
+
+    def dedupe(self):
+        """Merge every set of equivalent records into the oldest; returns removed ids"""
+        removed = []
+        for key, ids in list(self._ids_by_hash.items()):
+            if len(ids) < 2:
+                continue
+            keep, *duplicates = ids
+            for item_id in duplicates:
+                self.merge(self.get(keep), self.get(item_id))
+                removed.append(item_id)
+        self.remove_many(removed)
+        return removed
+
+    def _journal(self, item, deleted=False):
+        if not self.journal:
+            return
+        with self._journal_lock:
+            if deleted:
+                self.dirty.pop(item.id, None)
+                self.deleted.add(item.id)
+            else:
+                self.dirty[item.id] = item
+                self.deleted.discard(item.id)
+
+    def _index(self, item):
+        key = dork_hash(item.dork)
+        self._hash_of[item.id] = key
+        ids = self._ids_by_hash.setdefault(key, {})
+        ids[item.id] = None
+        self.hashes.setdefault(key, item)
+
+    def _unindex(self, item_id):
+        key = self._hash_of.pop(item_id, None)
+        if key is None:
+            return
+        ids = self._ids_by_hash[key]
+        del ids[item_id]
+        if not ids:
+            del self._ids_by_hash[key]
+            del self.hashes[key]
+        elif self.hashes[key].id == item_id:
+            self.hashes[key] = self.get(next(iter(ids)))
+
+
+def vault_format(path):
+    """Exchange format for a vault file, from its extension"""
+    suffix = Path(path).suffix.lower()
+    return {'.jsonl': 'jsonl', '.ndjson': 'jsonl', '.csv': 'csv'}.get(suffix, 'json')
+
+
+def iter_json_array(stream, chunk_size=64 * 1024):
+    """Yield the elements of a top-level JSON array without loading the whole file"""
+    decoder = json.JSONDecoder()
+    separator = re.compile(r'[\s,]*')
+    buffer = ''
+    pos = 0
+    eof = False
+    started = False
+    while True:
+        pos = separator.match(buffer, pos).end()
+        if pos < len(buffer):
+            if not started:
+                if buffer[pos] != '[':
+                    raise ValueError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                value, pos = decoder.raw_decode(buffer, pos)
+                yield value
+                continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+        elif eof:
+            if started:
+                raise ValueError("Unterminated JSON array")
+            return
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+def iter_vault_file(path, progress=None):
+    """Stream raw records from a JSON, JSONL or CSV vault file
+
+    progress, if given, is called with the fraction of the file read so far.
+    """
+    size = max(1, os.path.getsize(path))
+    fmt = vault_format(path)
+    with open(path, 'rb') as raw:
+        text = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+        if fmt == 'jsonl':
+            records = (json.loads(line) for line in text if line.strip())
+        elif fmt == 'csv':
+            records = csv.DictReader(text)
+        else:
+            records = iter_json_array(text)
+        for record in records:
+            yield record
+            if progress:
+                progress(min(1.0, raw.tell() / size))
+
+
+def normalize_vault_record(raw):
+    """Coerce an imported record to a VaultRecord; None if it has no dork"""
+    if not isinstance(raw, dict) or not str(raw.get('dork') or '').strip():
+        return None
+    return VaultRecord.from_dict(raw)
+
+
+def read_vault_file(path, lazy_notes=False):
+    """Load the vault's JSON array into VaultRecords, oldest first
+
+    With lazy_notes, each record remembers where its notes string sits in
+    the file so VaultStore.load can drop the text once it is indexed. Files
+    that are not plain ASCII load eagerly.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        text = data.decode('ascii')
+        source = NotesSource(path) if lazy_notes else None
+    except UnicodeDecodeError:
+        text = data.decode('utf-8-sig')
+        source = None
+
+    decoder = json.JSONDecoder()
+    separator = re.compile(r'[\s,]*')
+    pos = separator.match(text).end()
+    if text[pos:pos + 1] != '[':
+        raise ValueError("Expected a JSON array")
+    records = []
+    pos += 1
+    while True:
+        pos = separator.match(text, pos).end()
+        if text[pos:pos + 1] in (']', ''):
+            break
+        start = pos
+        raw, pos = decoder.raw_decode(text, pos)
+        record = VaultRecord.from_dict(raw)
+        if source is not None and record.notes:
+            at = text.find('"notes": "', start, pos)
+            if at >= 0:
+                record.locate_notes(source, at + 9)
+        records.append(record)
+    return records
+
+
+def iter_vault_pages(path, page_size, lazy_notes=False, block_size=64 * 1024):
+    """Yield pages of VaultRecords newest first by reading the vault file backwards
+
+    Only works on the one-record-per-line layout written by save_vault_file;
+    raises ValueError before yielding anything if the file looks different.
+    """
+    with open(path, 'rb') as f:
+        first = f.readline().strip()
+        if first not in (b'[', b'[]'):
+            raise ValueError("Expected a JSON array")
+        if first == b'[':
+            try:
+                json.loads(f.readline().strip().rstrip(b','))
+            except ValueError:
+                raise ValueError("Vault file is not one record per line")
+
+        source = NotesSource(path) if lazy_notes else None
+        end = f.seek(0, os.SEEK_END)
+        carry = b''
+        page = []
+        while end > 0:
+            start = max(0, end - block_size)
+            f.seek(start)
+            lines = (f.read(end - start) + carry).split(b'\n')
+            carry = lines.pop(0) if start else b''
+            offsets = []
+            offset = start + len(carry) + 1 if start else 0
+            for line in lines:
+                offsets.append(offset)
+                offset += len(line) + 1
+            for line, offset in zip(reversed(lines), reversed(offsets)):
+                text = line.strip().rstrip(b',')
+                if not text or text in (b'[', b']', b'[]'):
+                    continue
+                record = VaultRecord.from_dict(json.loads(text))
+                if source is not None and record.notes and line.isascii():
+                    at = line.find(b'"notes": "')
+                    if at >= 0:
+                        record.locate_notes(source, offset + at + 9)
+                page.append(record)
+                if len(page) >= page_size:
+                    yield page
+                    page = []
+            end = start
+        if page:
+            yield page
+
+
+def iter_legacy_vault_pages(path, page_size, lazy_notes=False):
+    """Yield pages of VaultRecords newest first from a vault in any JSON array layout
+
+    The whole file is read for the first page; used for files that
+    iter_vault_pages cannot read backwards.
+    """
+    records = read_vault_file(path, lazy_notes=lazy_notes)
+    for end in range(len(records), 0, -page_size):
+        yield records[max(0, end - page_size):end][::-1]
+
+
+# Mode for newly created files; the umask can only be read by setting it,
+# so do that once here before any writer thread starts
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+NEW_FILE_MODE = 0o666 & ~_UMASK
+
+
+def atomic_write(path, write, commit=None, encoding='utf-8', binary=False):
+    """Write a file so that a crash leaves either the old or the new version
+
+    write(stream) fills a temporary file in the same directory, which is
+    fsynced and renamed over path. commit(tmp_path, result), if given,
+    performs the rename instead (result is write's return value). The new
+    file keeps the permissions of the one it replaces.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = NEW_FILE_MODE
+        # mkstemp creates the file 0600
+        os.chmod(tmp_path, mode)
+        with (os.fdopen(fd, 'wb') if binary else os.fdopen(fd, 'w', encoding=encoding, newline='')) as f:
+            result = write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        if commit:
+            commit(tmp_path, result)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if hasattr(os, 'O_DIRECTORY'):
+        # Make the rename itself durable
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    return result
+
+
+def write_vault_lines(stream, records):
+    """Write records as a JSON array with one record per line
+
+    Returns (record, offset) for every record whose notes are deferred, with
+    the offset of its notes in the new file.
+    """
+    deferred = []
+    pos = 0
+    for i, record in enumerate(records):
+        line = (',\n  ' if i else '[\n  ') + json.dumps(record.to_dict())
+        if record.notes_deferred:
+            deferred.append((record, pos + line.index('"notes": "') + 9))
+        stream.write(line)
+        pos += len(line)
+    stream.write('\n]\n' if pos else '[]\n')
+    return deferred
+
+
+def save_vault_file(path, records):
+    """Atomically write the vault file
+
+    Deferred notes are read from the old file while the new one is written;
+    the swap and re-pointing them at the new file happen under
+    NotesSource.lock.
+    """
+    def commit(tmp_path, deferred):
+        with NotesSource.lock:
+            os.replace(tmp_path, path)
+            source = NotesSource(path)
+            for record, offset in deferred:
+                if record.notes_deferred:
+                    record.defer_notes(source, offset)
+
+    atomic_write(path, lambda f: write_vault_lines(f, records), commit=commit, encoding='ascii')
+
+
+class SharedVault:
+    """Read-merge-write access to a vault file that several instances share
+
+    Writers hold an advisory lock on <vault>.lock (fcntl, or msvcrt on
+    Windows) while they merge their journal into the file on disk. Each
+    instance remembers a hash per record line it last saw, so picking up
+    other writers' changes only parses the lines that differ. Conflicting
+    edits to the same record resolve to the last writer.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self._lines = {}
+        self._stamp = None
+        self._mutex = threading.Lock()
+
+    @contextlib.contextmanager
+    def locked(self):
+        with open(self.lock_path, 'a+b') as f:
+            if fcntl is not None:
+                fcntl.lockf(f, fcntl.LOCK_EX)
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.lockf(f, fcntl.LOCK_UN)
+                elif msvcrt is not None:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def changed(self):
+        """Whether the file differs from the version last read or written"""
+        return self._file_stamp() != self._stamp
+
+    def sync(self):
+        """Pick up other writers' changes: (records in JSON shape, deleted ids)"""
+        with self._mutex:
+            lines, raws, deleted = self._scan()
+        return raws, deleted
+
+    def save(self, dirty, deleted):
+        """Merge local changes into the file under the lock
+
+        Returns the other writers' changes found on disk, as sync() does.
+        """
+        with self._mutex, self.locked():
+            lines, raws, external_deleted = self._scan()
+            for item_id in deleted:
+                lines.pop(item_id, None)
+            for item_id, record in dirty.items():
+                lines[item_id] = json.dumps(record.to_dict()).encode('ascii')
+
+            def write(stream):
+                stream.write(b'[\n  ' + b',\n  '.join(lines.values()) + b'\n]\n' if lines else b'[]\n')
+
+            atomic_write(self.path, write, binary=True)
+            self._lines = {hash(text): item_id for item_id, text in lines.items()}
+            self._stamp = self._file_stamp()
+        return raws, external_deleted
+
+    def _scan(self):
+        """Read the file: ({id: line} in order, changed records, deleted ids)"""
+        lines, seen, raws = {}, {}, []
+        stamp = self._file_stamp()
+        if stamp is not None:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            if data.lstrip().startswith(b'[\n') or data.strip() == b'[]':
+                texts = (line.strip().rstrip(b',') for line in data.split(b'\n'))
+                texts = [t for t in texts if t and t not in (b'[', b']', b'[]')]
+            else:
+                # Another layout (e.g. hand-edited); re-encode record by record
+                texts = [json.dumps(raw).encode('ascii') for raw in json.loads(data)]
+            for text in texts:
+                key = hash(text)
+                item_id = self._lines.get(key)
+                if item_id is None:
+                    raw = json.loads(text)
+                    item_id = str(raw.get('id'))
+                    raws.append(raw)
+                seen[key] = item_id
+                lines[item_id] = text
+        deleted = set(self._lines.values()) - set(lines)
+        self._lines = seen
+        self._stamp = stamp
+        return lines, raws, deleted
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+class PersistenceWriter:
+    """Write-behind saving on a background thread
+
+    save(path, write) queues a write for path; further saves to the same
+    path within `delay` seconds replace it, so bursts of changes cost one
+    write. Writes go through atomic_write (or the given `save` function),
+    off the Tk thread. flush() blocks until everything queued is on disk.
+    """
+
+    def __init__(self, delay=0.5):
+        self.delay = delay
+        self.writes = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.last_write_ms = 0.0
+        self._pending = {}
+        self._due = {}
+        self._busy = False
+        self._flushing = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='persistence', daemon=True)
+        self._thread.start()
+
+    def save(self, path, write=None, save=None):
+        """Queue write(stream) via atomic_write, or save(path) for custom writers"""
+        with self._cond:
+            if path in self._pending:
+                self.coalesced += 1
+            else:
+                self._due[path] = time.monotonic() + self.delay
+            self._pending[path] = save or (lambda p: atomic_write(p, write))
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Write everything queued now and wait for it to finish"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flushing = True
+            self._cond.notify_all()
+            while self._pending or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            self._flushing = False
+
+    def close(self, timeout=10):
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                'writes': self.writes,
+                'coalesced': self.coalesced,
+                'errors': self.errors,
+                'pending': len(self._pending),
+                'last_write_ms': round(self.last_write_ms, 1)
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._pending:
+                        path = min(self._due, key=self._due.get)
+                        wait = self._due[path] - time.monotonic()
+                        if wait <= 0 or self._flushing:
+                            break
+                        self._cond.wait(wait)
+                    elif self._closed:
+                        return
+                    else:
+                        self._cond.wait()
+                save = self._pending.pop(path)
+                del self._due[path]
+                self._busy = True
+
+            started = time.perf_counter()
+            try:
+                save(path)
+                failed = False
+            except Exception as e:
+                print(f"Error saving {path}: {e}")
+                failed = True
+
+            with self._cond:
+                self._busy = False
+                self.writes += 1
+                self.errors += failed
+                self.last_write_ms = (time.perf_counter() - started) * 1000
+                self._cond.notify_all()
+
+
+def write_vault_file(stream, records, fmt, progress=None):
+    """Write records one at a time as JSON (array), JSONL or CSV"""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=VAULT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+    elif fmt == 'json':
+        stream.write('[')
+    for record in records:
+        if fmt == 'csv':
+            writer.writerow(record)
+        elif fmt == 'jsonl':
+            stream.write(json.dumps(record) + '\n')
+        else:
+            stream.write((',\n  ' if count else '\n  ') + json.dumps(record))
+        count += 1
+        if progress and count % 1000 == 0:
+            progress(count)
+    if fmt == 'json':
+        stream.write('\n]\n' if count else ']\n')
+    return count
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token) for budgeting without a round trip"""
+    return len(text) // 4 + 1
+
+
+def truncate_input(text, max_tokens):
+    """Cut user-supplied text to about max_tokens (0 = no limit); returns (text, truncated)
+
+    Applied to one field (an objective, topic, dork or batch item) before
+    it goes into a prompt, so the instructions around it and any JSON
+    structure survive an oversized paste.
+    """
+    if not max_tokens or estimate_tokens(text) <= max_tokens:
+        return text, False
+    return text[:max_tokens * 4] + " [truncated to fit the token limit]", True
+
+
+def plan_batches(items, prefix_tokens, output_tokens_per_item, input_budget, output_budget, max_items):
+    """Greedily pack item indices into batches that fit the token budgets
+
+    Each batch pays prefix_tokens once (the shared system prompt) plus the
+    size of its items, and is expected to produce output_tokens_per_item
+    per item, so the batch size adapts to how long the items are.
+    """
+    batches = []
+    current = []
+    used = prefix_tokens
+    for index, item in enumerate(items):
+        cost = estimate_tokens(item) + 8
+        full = (
+            len(current) >= max_items
+            or used + cost > input_budget
+            or (len(current) + 1) * output_tokens_per_item > output_budget
+        )
+        if current and full:
+            batches.append(current)
+            current = []
+            used = prefix_tokens
+        current.append(index)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_json_response(text):
+    """Parse a JSON model response, tolerating markdown fences and surrounding prose"""
+    text = text.strip()
+    if text.startswith('```'):
+        text = text.split('\n', 1)[1] if '\n' in text else ''
+        text = text.rsplit('```', 1)[0]
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        for open_char, close_char in (('[', ']'), ('{', '}')):
+            start, end = text.find(open_char), text.rfind(close_char)
+            if start != -1 and end > start:
+                try:
+                    return json.loads(text[start:end + 1])
+                except json.JSONDecodeError:
+                    continue
+        raise
+
+
+@dataclass
+class DorkResult:
+    """Structured result of an AI generate/analyze request"""
+    dork: str = ''
+    explanation: str = ''
+    risk: str = ''
+    score: Optional[int] = None
+    issues: list = field(default_factory=list)
+    suggestions: list = field(default_factory=list)
+    error: str = ''
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a result from parsed JSON, coercing loosely typed fields"""
+        def as_list(value):
+            if not value:
+                return []
+            if isinstance(value, str):
+                return [value]
+            return [str(v) for v in value]
+
+        try:
+            score = max(0, min(100, int(float(data.get('score')))))
+        except (TypeError, ValueError):
+            score = None
+
+        return cls(
+            dork=str(data.get('dork') or '').strip(),
+            explanation=str(data.get('explanation') or '').strip(),
+            risk=str(data.get('risk') or '').strip().capitalize(),
+            score=score,
+            issues=as_list(data.get('issues')),
+            suggestions=as_list(data.get('suggestions')),
+            error=str(data.get('error') or '')
+        )
+
+    def format(self):
+        """Render the result for display"""
+        if self.error:
+            return f"Error: {self.error}"
+        lines = []
+        if self.dork:
+            lines.append(f"Dork: {self.dork}")
+        if self.score is not None:
+            lines.append(f"Score: {self.score}/100")
+        if self.risk:
+            lines.append(f"Risk: {self.risk}")
+        if self.explanation:
+            lines.append(f"\n{self.explanation}")
+        if self.issues:
+            lines.append("\nIssues:")
+            lines.extend(f"  • {issue}" for issue in self.issues)
+        if self.suggestions:
+            lines.append("\nSuggestions:")
+            lines.extend(f"  • {suggestion}" for suggestion in self.suggestions)
+        return '\n'.join(lines)
+
+
+def optimize_result(result):
+    """Run the local optimizer over a generated dork, noting what it changed"""
+    if result.dork:
+        optimized, changes = optimize_dork(result.dork)
+        if optimized and changes:
+            result.dork = optimized
+            note = "Optimized locally: " + '; '.join(changes)
+            result.explanation = f"{result.explanation}\n\n{note}" if result.explanation else note
+    return result
+
+
+def parse_dork_list(text):
+    """Split pasted text into unique dorks, skipping blanks and # comments"""
+    seen = set()
+    dorks = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#') and line not in seen:
+            seen.add(line)
+            dorks.append(line)
+    return dorks
+
+
+def describe_callback(frame):
+    """Name the Tk callback running in frame's stack, plus the innermost app function"""
+    tk_dir = os.path.dirname(tk.__file__)
+    frames = [f for f, _ in traceback.walk_stack(frame)]
+    frames.reverse()
+
+    callback = None
+    inside_tk = False
+    for f in frames:
+        if f.f_code.co_filename.startswith(tk_dir):
+            inside_tk = True
+        elif inside_tk:
+            callback = f
+            break
+
+    innermost = None
+    for f in frames:
+        if f.f_code.co_filename == _SOURCE:
+            innermost = f
+
+    def name(f):
+        return getattr(f.f_code, 'co_qualname', f.f_code.co_name)
+
+    if callback is None:
+        return name(innermost) if innermost else name(frames[-1])
+    if innermost is None or innermost is callback:
+        return name(callback)
+    return f"{name(callback)} → {name(innermost)}"
+
+
 class DorkNexusApp:
     """Main application class"""
 
-    def __init__(self, root):
+    def __init__(self, root, profiler=None, stall_ms=STALL_THRESHOLD_MS, vault_path=None, shared=None):
         self.root = root
         self.root.title(f"{APP_NAME} v{VERSION}")
         self.root.geometry("1200x800")
         self.root.configure(bg=COLORS['bg_dark'])
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Diagnostics
+        self.profiler = profiler or Profiler()
+        self.stall_watchdog = StallWatchdog(
+            root,
+            threshold_ms=stall_ms,
+            log_path=self.profiler.output_dir / "stalls.log"
+        )
+        self.stall_watchdog.log_traces = self.profiler.enabled
+        self.stall_watchdog.start()
 
         # Application state
         self.current_dork = tk.StringVar(value="")
         self.api_key = tk.StringVar(value="")
-        self.vault_items = []
+        self.vault = VaultStore()
+        self.vault_cards = {}
+        self.vault_selection = set()
+        self.vault_view = []
+        self.vault_results = deque()
+        self.vault_matches = 0
+        self.vault_rendered = 0
+        self.vault_more_btn = None
+        self.vault_search_job = None
+        self.vault_pages = None
+        self._vault_save_pending = False
+        self._vault_rewrite = False
+        self._vault_waiting = []
+        self._vault_scroll_job = None
         self.templates = self.load_templates()
+        self.template_similarity = SimilarityIndex()
+        for template in self.templates:
+            self.template_similarity.add(template, template.query)
 
         # Load configuration
         self.load_config()
+        self.persistence = PersistenceWriter(self.config['save_delay_ms'] / 1000)
+        self.usage = UsageLedger(
+            self.config['daily_token_budget'], self.config['session_token_budget'],
+            self.config['usage_history_days']
+        )
+        self.load_usage()
+        self.vault_path = vault_path or self.config['vault_file']
+        if shared is None:
+            shared = self.config['vault_shared']
+        self.shared_vault = SharedVault(self.vault_path) if shared else None
+        self.vault.journal = bool(shared)
+        self._vault_syncing = False
 
         # Initialize Gemini if available
         self.init_gemini()
+        self.rate_limiter = RateLimiter(self.config['ai_requests_per_minute'])
+        self.router = ModelRouter(self.config['model_tiers'], self.config['operation_profiles'])
+        self.context_cache = ContextCache(
+            self.config['context_cache'], self.config['context_cache_ttl'],
+            self.config['context_cache_min_tokens']
+        )
+        # Follow-up context for the AI Constructor and Research Hub
+        self.ai_session = ChatSession(self.config['chat_history_tokens'], self.config['chat_keep_turns'])
+        self.research_session = ChatSession(self.config['chat_history_tokens'], self.config['chat_keep_turns'])
+        self.response_cache = ResponseCache(
+            self.config['response_cache_size'], self.config['response_cache_ttl']
+        )
+        # Second tier for free-text prompts (generate, research)
+        self.prompt_cache = PromptCache(
+            self.config['response_cache_size'], self.config['response_cache_ttl'],
+            self.config['near_match_threshold']
+        ) if self.config['near_match_cache'] else None
+        self._prefetch_job = None
+        self._prefetch_generation = 0
+        self.current_dork.trace_add('write', lambda *args: self.schedule_prefetch())
 
         # Build UI
         self.create_header()
@@ -114,10 +3127,24 @@ class DorkNexusApp:
         )
         title_label.pack(side=tk.LEFT, padx=10)
 
-        # API Key button
+        # API Key and diagnostics buttons
         api_frame = tk.Frame(header, bg=COLORS['bg_darker'])
         api_frame.pack(side=tk.RIGHT, padx=20)
 
+        diag_btn = tk.Button(
+            api_frame,
+            text="🩺 Diagnostics",
+            command=self.show_diagnostics,
+            bg=COLORS['bg_dark'],
+            fg=COLORS['text'],
+            font=('Arial', 10),
+            relief=tk.FLAT,
+            padx=15,
+            pady=8,
+            cursor='hand2'
+        )
+        diag_btn.pack(side=tk.LEFT, padx=(0, 10))
+
         api_btn = tk.Button(
             api_frame,
             text="⚙️ API Settings",
@@ -130,7 +3157,7 @@ class DorkNexusApp:
             pady=8,
             cursor='hand2'
         )
-        api_btn.pack()
+        api_btn.pack(side=tk.LEFT)
 
     def create_dork_preview(self):
         """Create sticky dork preview bar"""
@@ -165,6 +3192,44 @@ class DorkNexusApp:
         btn_frame = tk.Frame(dork_container, bg=COLORS['bg_dark'])
         btn_frame.pack(side=tk.RIGHT, padx=10)
 
+        # Offline lint result, refreshed on every change
+        self.lint_label = tk.Label(
+            dork_container,
+            text="",
+            font=('Arial', 9),
+            bg=COLORS['bg_dark'],
+            fg=COLORS['text_muted']
+        )
+        self.lint_label.pack(side=tk.RIGHT, padx=5)
+        self.current_dork.trace_add('write', lambda *args: self.update_dork_lint())
+
+        self.prefetch_enabled = tk.BooleanVar(value=self.config['speculative_prefetch'])
+        tk.Checkbutton(
+            btn_frame,
+            text="⚡ Prefetch",
+            variable=self.prefetch_enabled,
+            command=self.toggle_prefetch,
+            font=('Arial', 9),
+            bg=COLORS['bg_dark'],
+            fg=COLORS['text_muted'],
+            selectcolor=COLORS['bg_darker'],
+            activebackground=COLORS['bg_dark']
+        ).pack(side=tk.LEFT, padx=5)
+
+        similar_btn = tk.Button(
+            btn_frame,
+            text="🔎 Similar",
+            command=self.show_similar_dorks,
+            bg=COLORS['bg_darker'],
+            fg=COLORS['text'],
+            font=('Arial', 9),
+            relief=tk.FLAT,
+            padx=10,
+            pady=5,
+            cursor='hand2'
+        )
+        similar_btn.pack(side=tk.LEFT, padx=5)
+
         copy_btn = tk.Button(
             btn_frame,
             text="📋 Copy",
@@ -340,6 +3405,20 @@ class DorkNexusApp:
         )
         apply_btn.pack(side=tk.LEFT, padx=10)
 
+        optimize_btn = tk.Button(
+            btn_frame,
+            text="⚡ Optimize",
+            command=self.optimize_current_dork,
+            bg=COLORS['purple'],
+            fg='white',
+            font=('Arial', 11),
+            relief=tk.FLAT,
+            padx=20,
+            pady=10,
+            cursor='hand2'
+        )
+        optimize_btn.pack(side=tk.LEFT, padx=10)
+
         canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
@@ -428,7 +3507,56 @@ class DorkNexusApp:
             pady=12,
             cursor='hand2'
         )
-        self.ai_generate_btn.pack()
+        self.ai_generate_btn.pack(side=tk.LEFT)
+
+        # Shown while the results come from the near-match cache
+        self.ai_regenerate_btn = tk.Button(
+            gen_btn_frame,
+            text="🔄 Regenerate",
+            command=lambda: self.ai_generate(regenerate=True),
+            bg=COLORS['bg_darker'],
+            fg=COLORS['text'],
+            font=('Arial', 10),
+            relief=tk.FLAT,
+            padx=15,
+            pady=12,
+            cursor='hand2'
+        )
+
+        # With Follow-up ticked, Generate refines the session's previous answer
+        tk.Button(
+            gen_btn_frame,
+            text="🆕 New Session",
+            command=self.new_ai_session,
+            bg=COLORS['bg_darker'],
+            fg=COLORS['text'],
+            font=('Arial', 10),
+            relief=tk.FLAT,
+            padx=15,
+            pady=12,
+            cursor='hand2'
+        ).pack(side=tk.RIGHT, padx=(10, 0))
+
+        self.ai_follow_up = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            gen_btn_frame,
+            text="↪ Follow-up",
+            variable=self.ai_follow_up,
+            font=('Arial', 9),
+            bg=COLORS['bg_dark'],
+            fg=COLORS['text_muted'],
+            selectcolor=COLORS['bg_darker'],
+            activebackground=COLORS['bg_dark']
+        ).pack(side=tk.RIGHT, padx=(10, 0))
+
+        self.ai_session_label = tk.Label(
+            frame,
+            text="",
+            font=('Arial', 9),
+            bg=COLORS['bg_dark'],
+            fg=COLORS['text_muted']
+        )
+        self.ai_session_label.pack()
 
         # Results area
         results_label = tk.Label(
@@ -543,6 +3671,43 @@ class DorkNexusApp:
         self.terminal_output.insert('1.0', f"{APP_NAME} Terminal Ready\n")
         self.terminal_output.insert('end', "Type your dork query and press Execute to search...\n\n")
 
+        self.terminal = TerminalBuffer(
+            self.root,
+            self.terminal_output,
+            max_lines=self.config['terminal_max_lines'],
+            log_path=self.config['terminal_log_file'] if self.config['terminal_log_enabled'] else None,
+            log_max_bytes=self.config['terminal_log_max_bytes'],
+            log_backups=self.config['terminal_log_backups']
+        )
+
+        # Batch progress
+        self.terminal_batch = None
+        progress_frame = tk.Frame(frame, bg=COLORS['bg_darker'])
+        progress_frame.pack(fill=tk.X, padx=20, pady=(5, 0))
+
+        self.terminal_progress = tk.Label(
+            progress_frame,
+            text="",
+            font=('Consolas', 9),
+            bg=COLORS['bg_darker'],
+            fg=COLORS['cyan'],
+            anchor='w'
+        )
+        self.terminal_progress.pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+        self.terminal_cancel_btn = tk.Button(
+            progress_frame,
+            text="⏹ Cancel Batch",
+            command=self.cancel_terminal_batch,
+            bg=COLORS['danger'],
+            fg='white',
+            font=('Arial', 8),
+            relief=tk.FLAT,
+            padx=10,
+            pady=2,
+            cursor='hand2'
+        )
+
         # Input area
         input_frame = tk.Frame(frame, bg=COLORS['bg_darker'])
         input_frame.pack(fill=tk.X, padx=20, pady=15)
@@ -579,10 +3744,24 @@ class DorkNexusApp:
         )
         exec_btn.pack(side=tk.LEFT, padx=5)
 
+        batch_btn = tk.Button(
+            input_frame,
+            text="📋 Batch",
+            command=self.show_batch_dialog,
+            bg=COLORS['primary'],
+            fg='white',
+            font=('Arial', 10),
+            relief=tk.FLAT,
+            padx=15,
+            pady=8,
+            cursor='hand2'
+        )
+        batch_btn.pack(side=tk.LEFT, padx=(0, 5))
+
         clear_btn = tk.Button(
             input_frame,
             text="🗑️ Clear",
-            command=lambda: self.terminal_output.delete('1.0', tk.END),
+            command=self.terminal.clear,
             bg=COLORS['danger'],
             fg='white',
             font=('Arial', 10),
@@ -678,7 +3857,7 @@ class DorkNexusApp:
         )
         self.research_input.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10))
 
-        research_btn = tk.Button(
+        self.research_btn = research_btn = tk.Button(
             search_frame,
             text="🔍 Research",
             command=self.do_research,
@@ -692,6 +3871,55 @@ class DorkNexusApp:
         )
         research_btn.pack(side=tk.LEFT)
 
+        # Shown while the results come from the near-match cache
+        self.research_regenerate_btn = tk.Button(
+            search_frame,
+            text="🔄 Regenerate",
+            command=lambda: self.do_research(regenerate=True),
+            bg=COLORS['bg_darker'],
+            fg=COLORS['text'],
+            font=('Arial', 10),
+            relief=tk.FLAT,
+            padx=15,
+            pady=8,
+            cursor='hand2'
+        )
+
+        # With Follow-up ticked, a question continues the previous topic
+        tk.Button(
+            search_frame,
+            text="🆕 New Topic",
+            command=self.new_research_session,
+            bg=COLORS['bg_darker'],
+            fg=COLORS['text'],
+            font=('Arial', 10),
+            relief=tk.FLAT,
+            padx=15,
+            pady=8,
+            cursor='hand2'
+        ).pack(side=tk.RIGHT, padx=(10, 0))
+
+        self.research_follow_up = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            search_frame,
+            text="↪ Follow-up",
+            variable=self.research_follow_up,
+            font=('Arial', 9),
+            bg=COLORS['bg_dark'],
+            fg=COLORS['text_muted'],
+            selectcolor=COLORS['bg_darker'],
+            activebackground=COLORS['bg_dark']
+        ).pack(side=tk.RIGHT, padx=(10, 0))
+
+        self.research_session_label = tk.Label(
+            frame,
+            text="",
+            font=('Arial', 9),
+            bg=COLORS['bg_dark'],
+            fg=COLORS['text_muted']
+        )
+        self.research_session_label.pack(anchor='w', padx=40)
+
         # Results
         self.research_results = scrolledtext.ScrolledText(
             frame,
@@ -790,26 +4018,110 @@ class DorkNexusApp:
         save_btn.pack(pady=10)
 
         # Vault list
+        list_header = tk.Frame(frame, bg=COLORS['bg_dark'])
+        list_header.pack(fill=tk.X, padx=20, pady=(20, 5))
+
         tk.Label(
-            frame,
+            list_header,
             text="Saved Dorks:",
             font=('Arial', 11, 'bold'),
             bg=COLORS['bg_dark'],
             fg=COLORS['text']
-        ).pack(pady=(20, 5), anchor='w', padx=20)
-
-        # Vault items
-        canvas = tk.Canvas(frame, bg=COLORS['bg_dark'], highlightthickness=0)
-        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=canvas.yview)
-        self.vault_list = tk.Frame(canvas, bg=COLORS['bg_dark'])
+        ).pack(side=tk.LEFT)
+
+        self.vault_selection_label = tk.Label(
+            list_header,
+            text="",
+            font=('Arial', 9),
+            bg=COLORS['bg_dark'],
+            fg=COLORS['text_muted']
+        )
+        self.vault_selection_label.pack(side=tk.LEFT, padx=10)
+
+        for text, command in [
+            ("⬆ Export", self.export_vault),
+            ("⬇ Import", self.import_vault),
+            ("🧹 Deduplicate", self.dedupe_vault),
+            ("⚡ Optimize", self.optimize_vault),
+            ("🗑️ Delete Selected", self.delete_selected_vault_items),
+            ("🏷️ Tag Selected", self.tag_selected_vault_items),
+            ("☐ Select None", lambda: self.set_vault_selection(False)),
+            ("☑ Select All", lambda: self.set_vault_selection(True))
+        ]:
+            tk.Button(
+                list_header,
+                text=text,
+                command=command,
+                bg=COLORS['bg_darker'],
+                fg=COLORS['text'],
+                font=('Arial', 9),
+                relief=tk.FLAT,
+                padx=10,
+                pady=3,
+                cursor='hand2'
+            ).pack(side=tk.RIGHT, padx=(5, 0))
+
+        # Search
+        search_frame = tk.Frame(frame, bg=COLORS['bg_dark'])
+        search_frame.pack(fill=tk.X, padx=20, pady=(0, 5))
+
+        tk.Label(
+            search_frame,
+            text="🔍",
+            font=('Arial', 10),
+            bg=COLORS['bg_dark'],
+            fg=COLORS['text_muted']
+        ).pack(side=tk.LEFT)
+
+        self.vault_query = tk.StringVar()
+        self.vault_query.trace_add('write', lambda *args: self.schedule_vault_search())
+        tk.Entry(
+            search_frame,
+            textvariable=self.vault_query,
+            font=('Consolas', 10),
+            bg=COLORS['bg_darker'],
+            fg=COLORS['text'],
+            insertbackground=COLORS['text'],
+            relief=tk.FLAT
+        ).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=10)
+
+        self.vault_count_label = tk.Label(
+            search_frame,
+            text="",
+            font=('Arial', 9),
+            bg=COLORS['bg_dark'],
+            fg=COLORS['text_muted']
+        )
+        self.vault_count_label.pack(side=tk.LEFT)
+
+        self.vault_progress_label = tk.Label(
+            search_frame,
+            text="",
+            font=('Arial', 9),
+            bg=COLORS['bg_dark'],
+            fg=COLORS['cyan']
+        )
+        self.vault_progress_label.pack(side=tk.LEFT, padx=(10, 0))
+
+        # Vault items
+        canvas = tk.Canvas(frame, bg=COLORS['bg_dark'], highlightthickness=0)
+        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=canvas.yview)
+        self.vault_list = tk.Frame(canvas, bg=COLORS['bg_dark'])
 
         self.vault_list.bind(
             "<Configure>",
             lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
         )
 
+        def on_scroll(first, last):
+            scrollbar.set(first, last)
+            # Fetch the next page once the user scrolls to the bottom
+            if float(first) > 0 and float(last) >= 1.0 and self.vault_more_btn is not None \
+                    and self._vault_scroll_job is None:
+                self._vault_scroll_job = self.root.after_idle(self.render_more_vault_cards)
+
         canvas.create_window((0, 0), window=self.vault_list, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
+        canvas.configure(yscrollcommand=on_scroll)
 
         canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=20, pady=10)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
@@ -830,6 +4142,15 @@ class DorkNexusApp:
         )
         warning.pack(fill=tk.X)
 
+        self.footer_status = tk.Label(
+            footer,
+            font=('Consolas', 8),
+            bg=COLORS['bg_darker'],
+            fg=COLORS['text_muted']
+        )
+        self.footer_status.pack(side=tk.RIGHT, padx=15)
+        self.update_footer_status()
+
         copyright_text = tk.Label(
             footer,
             text=f"© 2024 {APP_NAME} | Version {VERSION} | Desktop Edition",
@@ -843,21 +4164,57 @@ class DorkNexusApp:
 
     def load_config(self):
         """Load app configuration"""
+        self.config = dict(DEFAULT_CONFIG)
         if os.path.exists(CONFIG_FILE):
             try:
                 with open(CONFIG_FILE, 'r') as f:
-                    config = json.load(f)
-                    self.api_key.set(config.get('api_key', ''))
+                    self.config.update(json.load(f))
             except:
                 pass
+        self.api_key.set(self.config.get('api_key', ''))
 
     def save_config(self):
-        """Save app configuration"""
-        config = {
-            'api_key': self.api_key.get()
-        }
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(config, f, indent=2)
+        """Save app configuration (written in the background)"""
+        self.config['api_key'] = self.api_key.get()
+        config = dict(self.config)
+        self.persistence.save(CONFIG_FILE, lambda f: json.dump(config, f, indent=2))
+
+    def load_usage(self):
+        """Load the AI token usage history"""
+        if os.path.exists(self.config['usage_file']):
+            try:
+                with open(self.config['usage_file'], 'r') as f:
+                    self.usage.load(json.load(f))
+            except Exception as e:
+                print(f"Error loading usage history: {e}")
+
+    def save_usage(self):
+        """Save the AI token usage history (written in the background)"""
+        usage = self.usage.to_dict()
+        self.persistence.save(self.config['usage_file'], lambda f: json.dump(usage, f, indent=2))
+
+    def record_usage(self, operation, prompt, response, truncated=False, reserved=0):
+        """Account for one response, from usage_metadata or else an estimate
+
+        reserved is what UsageLedger.reserve held for the request.
+        """
+        usage = getattr(response, 'usage_metadata', None)
+        input_tokens = getattr(usage, 'prompt_token_count', 0) or 0
+        output_tokens = getattr(usage, 'candidates_token_count', 0) or 0
+        output_tokens += getattr(usage, 'thoughts_token_count', 0) or 0
+        cached_tokens = getattr(usage, 'cached_content_token_count', 0) or 0
+        estimated = not input_tokens
+        if estimated:
+            input_tokens = estimate_tokens(prompt)
+            try:
+                output_tokens = estimate_tokens(response.text)
+            except Exception:
+                output_tokens = 0
+        self.usage.record(
+            operation, input_tokens, output_tokens,
+            estimated=estimated, truncated=truncated, cached_tokens=cached_tokens, reserved=reserved
+        )
+        self.save_usage()
 
     def show_api_settings(self):
         """Show API settings dialog"""
@@ -913,6 +4270,219 @@ class DorkNexusApp:
             pady=8
         ).pack(pady=20)
 
+    def show_diagnostics(self):
+        """Show profiling controls"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Diagnostics")
+        dialog.geometry("620x540")
+        dialog.configure(bg=COLORS['bg_dark'])
+        dialog.transient(self.root)
+
+        tk.Label(
+            dialog,
+            text="Profiling",
+            font=('Arial', 12, 'bold'),
+            bg=COLORS['bg_dark'],
+            fg=COLORS['text']
+        ).pack(pady=(20, 5))
+
+        status = tk.Label(
+            dialog,
+            font=('Arial', 9),
+            bg=COLORS['bg_dark'],
+            fg=COLORS['text_muted'],
+            wraplength=480,
+            justify=tk.LEFT
+        )
+        status.pack(pady=5, padx=20)
+
+        def refresh_status(message=None):
+            state = "ON" if self.profiler.enabled else "OFF"
+            text = (f"Profiling is {state}. Profiles, memory snapshots and stall traces "
+                    f"(> {self.stall_watchdog.threshold * 1000:.0f} ms) are written to "
+                    f"{self.profiler.output_dir.resolve()}")
+            if message:
+                text += f"\n\n{message}"
+            status.config(text=text)
+            toggle_btn.config(text="⏹ Stop & Dump" if self.profiler.enabled else "▶ Start Profiling")
+            dump_btn.config(state='normal' if self.profiler.enabled else 'disabled')
+
+        def toggle():
+            if self.profiler.enabled:
+                paths = self.profiler.stop()
+                refresh_status(f"Wrote {len(paths)} files.")
+            else:
+                self.profiler.start()
+                refresh_status()
+            self.stall_watchdog.log_traces = self.profiler.enabled
+
+        def dump():
+            paths = self.profiler.dump()
+            refresh_status(f"Wrote {len(paths)} files.")
+
+        btn_frame = tk.Frame(dialog, bg=COLORS['bg_dark'])
+        btn_frame.pack(pady=20)
+
+        toggle_btn = tk.Button(
+            btn_frame,
+            command=toggle,
+            bg=COLORS['primary'],
+            fg='white',
+            font=('Arial', 10),
+            relief=tk.FLAT,
+            padx=20,
+            pady=8,
+            cursor='hand2'
+        )
+        toggle_btn.pack(side=tk.LEFT, padx=5)
+
+        dump_btn = tk.Button(
+            btn_frame,
+            text="💾 Dump Snapshot",
+            command=dump,
+            bg=COLORS['success'],
+            fg='white',
+            font=('Arial', 10),
+            relief=tk.FLAT,
+            padx=20,
+            pady=8,
+            cursor='hand2'
+        )
+        dump_btn.pack(side=tk.LEFT, padx=5)
+
+        def export():
+            path = filedialog.asksaveasfilename(
+                parent=dialog,
+                title="Export Metrics",
+                defaultextension=".json",
+                initialfile=f"dorknexus-metrics-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json",
+                filetypes=[("JSON", "*.json")]
+            )
+            if path:
+                with open(path, 'w') as f:
+                    json.dump(self.collect_metrics(), f, indent=2)
+                refresh_status(f"Metrics exported to {path}")
+
+        tk.Button(
+            btn_frame,
+            text="📊 Export Metrics",
+            command=export,
+            bg=COLORS['purple'],
+            fg='white',
+            font=('Arial', 10),
+            relief=tk.FLAT,
+            padx=20,
+            pady=8,
+            cursor='hand2'
+        ).pack(side=tk.LEFT, padx=5)
+
+        tk.Label(
+            dialog,
+            text="AI Usage",
+            font=('Arial', 12, 'bold'),
+            bg=COLORS['bg_dark'],
+            fg=COLORS['text']
+        ).pack(pady=(10, 5))
+
+        tk.Label(
+            dialog,
+            text=self.usage_summary(),
+            font=('Consolas', 9),
+            bg=COLORS['bg_dark'],
+            fg=COLORS['text_muted'],
+            justify=tk.LEFT
+        ).pack(pady=5, padx=20, anchor='w')
+
+        refresh_status()
+
+    def usage_summary(self):
+        """AI token usage for today and this session, busiest operations first"""
+        snapshot = self.usage.snapshot()
+
+        def spent(tokens, budget):
+            return f"{tokens:,} tokens" + (f" of {budget:,}" if budget else " (no budget)")
+
+        lines = [
+            f"Today:   {spent(snapshot['today_tokens'], snapshot['daily_budget'])}",
+            f"Session: {spent(snapshot['session_tokens'], snapshot['session_budget'])}"
+        ]
+        operations = sorted(
+            snapshot['today'].items(),
+            key=lambda op: op[1]['input_tokens'] + op[1]['output_tokens'],
+            reverse=True
+        )
+        for operation, entry in operations:
+            line = (f"  {operation}: {entry['requests']} requests, "
+                    f"{entry['input_tokens']:,} in / {entry['output_tokens']:,} out")
+            if entry.get('cached_tokens'):
+                line += f" ({entry['cached_tokens']:,} in from context cache)"
+            if entry['estimated']:
+                line += " (estimated)"
+            lines.append(line)
+
+        cache = self.context_cache.snapshot()
+        if cache['created'] or cache['reused']:
+            lines.append(f"Context cache: {cache['created']} created, {cache['reused']} reused, "
+                         f"{cache['inline']} sent inline")
+
+        models = self.router.snapshot()
+        if models:
+            lines.append("Models:")
+        for model, stats in models.items():
+            latency = f"{stats['avg_latency_ms']:,} ms avg" if stats['avg_latency_ms'] is not None else "no successes"
+            line = f"  {model}: {stats['requests']} requests, {latency}, {stats['errors']} errors"
+            if stats['cooling_down']:
+                line += " (backing off)"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def collect_metrics(self):
+        """Gather runtime metrics for export"""
+        return {
+            'app': APP_NAME,
+            'version': VERSION,
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'event_loop': self.stall_watchdog.snapshot(),
+            'persistence': self.persistence.snapshot(),
+            'ai': {
+                'rate_limiter': self.rate_limiter.snapshot(),
+                'response_cache': self.response_cache.snapshot(),
+                'prompt_cache': self.prompt_cache.snapshot() if self.prompt_cache else None,
+                'usage': self.usage.snapshot(),
+                'models': self.router.snapshot(),
+                'context_cache': self.context_cache.snapshot()
+            }
+        }
+
+    def update_footer_status(self):
+        """Refresh the responsiveness readout in the footer"""
+        metrics = self.stall_watchdog.snapshot()
+        text = f"UI lag p95 {metrics['lag_p95_ms']:.0f} ms"
+        if metrics['worst_stalls']:
+            worst = metrics['worst_stalls'][0]
+            text += f" · worst {worst['lag_ms']} ms in {worst['callback']}"
+        slow = metrics['lag_p95_ms'] >= metrics['stall_threshold_ms']
+        self.footer_status.config(text=text, fg=COLORS['warning'] if slow else COLORS['text_muted'])
+        self.root.after(1000, self.update_footer_status)
+
+    def run_in_background(self, target, name):
+        """Run target on a daemon worker thread, profiled when profiling is on"""
+        thread = threading.Thread(target=self.profiler.wrap(target, name), daemon=True, name=name)
+        thread.start()
+        return thread
+
+    def on_close(self):
+        """Flush pending saves, dump any active profile and close the window"""
+        if self._vault_save_pending and not self.ensure_vault_loaded(self.on_close):
+            # Saved (and closed) once the rest of the vault is in
+            return
+        self.stall_watchdog.stop()
+        self.persistence.close()
+        self.terminal.close()
+        if self.profiler.enabled:
+            self.profiler.stop()
+        self.root.destroy()
+
     def update_builder_dork(self):
         """Update dork from builder inputs"""
         parts = []
@@ -934,6 +4504,19 @@ class DorkNexusApp:
 
         self.current_dork.set(' '.join(parts))
 
+    def optimize_current_dork(self):
+        """Rewrite the current dork into its minimal form and explain the changes"""
+        dork = self.current_dork.get()
+        if not dork.strip():
+            messagebox.showwarning("No Dork", "Please build a dork query first!")
+            return
+        optimized, changes = optimize_dork(dork)
+        if not changes or not optimized:
+            messagebox.showinfo("Optimize", "This dork is already in its minimal form.")
+            return
+        self.current_dork.set(optimized)
+        messagebox.showinfo("Optimize", f"{optimized}\n\n" + '\n'.join(f"• {c}" for c in changes))
+
     def clear_builder(self):
         """Clear all builder inputs"""
         for var in self.builder_inputs.values():
@@ -954,78 +4537,401 @@ class DorkNexusApp:
         else:
             messagebox.showwarning("No Query", "Please build a dork query first!")
 
-    def ai_generate(self):
-        """Generate or analyze dork with AI"""
+    def update_dork_lint(self):
+        """Show the offline lint score for the current dork in the preview bar"""
+        dork = self.current_dork.get()
+        if not dork.strip():
+            self.lint_label.config(text="")
+            return
+        result = lint_dork(dork)
+        if not result.issues:
+            self.lint_label.config(text=f"✓ {result.score}", fg=COLORS['success'])
+            return
+        text = f"⚠ {result.score} · {result.issues[0]}"
+        if len(result.issues) > 1:
+            text += f" (+{len(result.issues) - 1})"
+        color = COLORS['warning'] if result.score >= 60 else COLORS['danger']
+        self.lint_label.config(text=text, fg=color)
+
+    def set_ai_results(self, text):
+        """Replace the AI results panel contents"""
+        self.ai_results.config(state='normal')
+        self.ai_results.delete('1.0', tk.END)
+        self.ai_results.insert('1.0', text)
+        self.ai_results.config(state='disabled')
+
+    def cached_prompt_answer(self, kind, prompt, button):
+        """Look up a near-identical earlier prompt; shows button only on a hit
+
+        Returns (note, value) for a hit, else None.
+        """
+        hit = self.prompt_cache.get(kind, prompt) if self.prompt_cache else None
+        if hit is None:
+            button.pack_forget()
+            return None
+        score, earlier, value = hit
+        button.pack(side=tk.LEFT, padx=(10, 0))
+        if earlier.strip() == prompt:
+            note = "♻ Cached answer to the same request (🔄 Regenerate for a fresh one)"
+        else:
+            note = f"♻ Cached answer to a similar request ({score:.0%}): \"{earlier.strip()}\" (🔄 Regenerate for a fresh one)"
+        return note, value
+
+    def ai_generate(self, regenerate=False):
+        """Generate or analyze dork with AI
+
+        Deep Analyzer shows the offline lint at once; the AI adds the
+        narrative analysis underneath when a key is configured. Generate
+        answers a near-identical earlier objective from the prompt cache
+        unless regenerate is set. With Follow-up ticked the objective
+        refines the AI session's previous answer; otherwise it starts a new
+        session.
+        """
+        mode = self.ai_mode.get()
+        prompt = self.ai_input.get('1.0', tk.END).strip()
+        if not prompt and mode == 'analyze':
+            prompt = self.current_dork.get()
+
+        lint = None
+        if mode == 'analyze' and prompt:
+            lint = lint_dork(prompt)
+            if not self.gemini_available:
+                self.set_ai_results(
+                    f"{lint.format()}\n\nConfigure a Gemini API key in settings for the full AI analysis."
+                )
+                return
+            self.set_ai_results(f"{lint.format()}\n\n⏳ Requesting AI analysis...")
+
         if not self.gemini_available:
             messagebox.showerror("API Key Required", "Please configure your Gemini API key in settings!")
             return
-
-        prompt = self.ai_input.get('1.0', tk.END).strip()
         if not prompt:
             messagebox.showwarning("Input Required", "Please enter a prompt or dork to analyze!")
             return
 
+        self.ai_regenerate_btn.pack_forget()
+        session = self.ai_session
+        follow_up = self.ai_follow_up.get() and bool(session) and not regenerate
+        if mode == 'generate' and not follow_up:
+            session.clear()
+            self.update_session_labels()
+        if mode == 'generate' and not regenerate and not follow_up:
+            cached = self.cached_prompt_answer('generate', prompt, self.ai_regenerate_btn)
+            if cached is not None:
+                note, result = cached
+                if result.dork:
+                    self.current_dork.set(result.dork)
+                session.add(generate_request(prompt), json.dumps(asdict(result)))
+                self.update_session_labels()
+                self.set_ai_results(f"{note}\n\n{result.format()}")
+                return
+
         self.ai_generate_btn.config(state='disabled', text='⏳ Processing...')
+        generation = session.generation
 
         def process():
             try:
-                mode = self.ai_mode.get()
-
                 if mode == 'generate':
-                    result = self.gemini_generate_dork(prompt)
+                    result = self.gemini_generate_dork(prompt, session=session, generation=generation)
+                    if self.prompt_cache is not None and not result.error and not follow_up:
+                        self.prompt_cache.put('generate', prompt, result)
+                    self.root.after(0, self.update_session_labels)
+                    self.set_ai_results(result.format())
                 else:
                     result = self.gemini_analyze_dork(prompt)
-
-                self.ai_results.config(state='normal')
-                self.ai_results.delete('1.0', tk.END)
-                self.ai_results.insert('1.0', result)
-                self.ai_results.config(state='disabled')
+                    self.set_ai_results(f"{lint.format()}\n\n── AI analysis ──\n\n{result.format()}")
 
             except Exception as e:
                 messagebox.showerror("AI Error", f"Error: {str(e)}")
             finally:
                 self.ai_generate_btn.config(state='normal', text='✨ Generate with AI')
 
-        threading.Thread(target=process, daemon=True).start()
-
-    def gemini_generate_dork(self, prompt):
-        """Generate dork using Gemini"""
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-
-        system_prompt = """You are an expert Google Dork generator.
-        Generate precise Google Dork queries based on user objectives.
-        Return:
-        1. The dork query
-        2. Explanation
-        3. Risk level (Low/Medium/High)"""
+        self.run_in_background(process, 'ai_generate')
+
+    def limit_input(self, text, operation):
+        """Cut one user-supplied prompt field to max_prompt_tokens; returns (text, truncated)"""
+        text, truncated = truncate_input(text, self.config['max_prompt_tokens'])
+        if truncated:
+            print(f"{operation}: input cut to {self.config['max_prompt_tokens']} tokens")
+        return text, truncated
+
+    def gemini_call(self, prompt, generation_config=None, background=False, operation='AI/request',
+                    history=None, prefix=None, truncated=False):
+        """Send one request through the token budget, rate limiter and model router
+
+        Callers cut user-supplied fields with limit_input and pass on
+        whether they did (truncated), for the usage ledger. Background
+        requests raise PrefetchSkipped instead of waiting when the limiter
+        is down to its reserve or the budget is nearly spent; foreground
+        ones raise BudgetExceeded once it is spent. The operation's profile
+        picks the models and generation settings; a model that errors,
+        exceeds the profile's timeout or answers without text is skipped
+        for the next candidate. Thinking models get THINKING_TOKENS more
+        output room.
+        history (chat contents, see ChatSession) is sent ahead of prompt.
+        prefix is a stable (name, system prompt) pair served through the
+        context cache. Tokens used are recorded under operation.
+        """
+        sent_text = prompt
+        contents = prompt
+        if history:
+            sent_text = "\n".join([part for turn in history for part in turn['parts']] + [prompt])
+            contents = history + [{'role': 'user', 'parts': [prompt]}]
+        if prefix:
+            sent_text = f"{prefix[1]}\n{sent_text}"
+
+        config = {**self.router.generation_config(operation), **(generation_config or {})}
+        timeout = self.router.profile(operation)['timeout']
+        models = self.router.route(operation)
+
+        def model_config(model_name):
+            if 'max_output_tokens' in config and is_thinking_model(model_name):
+                return {**config, 'max_output_tokens': config['max_output_tokens'] + THINKING_TOKENS}
+            return config
+
+        reserved = self.usage.reserve(
+            estimate_tokens(sent_text) + max(model_config(m).get('max_output_tokens', 0) for m in models),
+            background=background
+        )
+        errors = []
+        try:
+            for model_name in models:
+                if background:
+                    if not self.rate_limiter.try_acquire(reserve=self.config['prefetch_reserve']):
+                        raise PrefetchSkipped()
+                else:
+                    self.rate_limiter.acquire()
+                started = time.perf_counter()
+                try:
+                    response = self.generate_content(model_name, contents, model_config(model_name), timeout, prefix)
+                except Exception as e:
+                    self.router.record(model_name, time.perf_counter() - started, ok=False,
+                                       backoff=is_transient_error(e))
+                    print(f"{operation}: {model_name} failed, trying the next model: {e}")
+                    errors.append(f"{model_name}: {e}")
+                    continue
+                self.router.record(model_name, time.perf_counter() - started, ok=True)
+                if response_text(response) is None:
+                    # Blocked or out of output tokens: the tokens are spent, try the next model
+                    self.record_usage(operation, sent_text, response, truncated)
+                    print(f"{operation}: {model_name} returned no text, trying the next model")
+                    errors.append(f"{model_name}: no text in the response")
+                    continue
+                held, reserved = reserved, 0
+                self.record_usage(operation, sent_text, response, truncated, reserved=held)
+                return response
+            raise RuntimeError("All models failed. " + " | ".join(errors))
+        finally:
+            if reserved:
+                self.usage.release(reserved)
+
+    def generate_content(self, model_name, contents, config, timeout, prefix=None):
+        """One generate_content call on model_name, with prefix served by the context cache
+
+        A cache the provider dropped before its TTL is re-created and the
+        request retried once.
+        """
+        options = {'timeout': timeout}
+        if not prefix:
+            return genai.GenerativeModel(model_name).generate_content(
+                contents, generation_config=config, request_options=options
+            )
+        model, cached = self.context_cache.prepare(model_name, prefix)
+        try:
+            return model.generate_content(contents, generation_config=config, request_options=options)
+        except Exception as e:
+            if not cached or 'cache' not in str(e).lower():
+                raise
+            self.context_cache.invalidate(model_name, prefix)
+            model, _ = self.context_cache.prepare(model_name, prefix)
+            return model.generate_content(contents, generation_config=config, request_options=options)
+
+    def gemini_json(self, prompt, schema, background=False, operation='AI/request', history=None,
+                    prefix=None, truncated=False):
+        """Request JSON-mode output matching schema and return it parsed"""
+        response = self.gemini_call(
+            prompt,
+            generation_config={
+                'response_mime_type': 'application/json',
+                'response_schema': schema
+            },
+            background=background,
+            operation=operation,
+            history=history,
+            prefix=prefix,
+            truncated=truncated
+        )
+        return parse_json_response(response.text)
+
+    def generate_prefix(self):
+        """System prompt for dork generation, grounded in the template catalog"""
+        if not self.config['ground_templates']:
+            return ('generate', GENERATE_PROMPT)
+        catalog = "\n".join(f"- {t.name} [{t.category}]: {t.query}" for t in self.templates)
+        return (
+            'generate-templates',
+            f"{GENERATE_PROMPT}\n\nProven templates to draw operators and style from:\n{catalog}"
+        )
 
-        response = model.generate_content(f"{system_prompt}\n\nUser objective: {prompt}")
+    def summarize_history(self, transcript):
+        """Condense old chat turns for ChatSession.compact"""
+        return self.gemini_call(f"{SUMMARIZE_PROMPT}\n\n{transcript}", operation='Chat/summarize').text
+
+    def gemini_generate_dork(self, prompt, session=None, generation=None):
+        """Generate dork using Gemini
+
+        With a session, a follow-up objective refines the previous answer
+        and only the new request is added to the conversation, unless the
+        session was cleared since generation (see ChatSession.add).
+        """
+        prompt, truncated = self.limit_input(prompt, 'AI/generate')
+        if session:
+            text = f"Follow-up request: {prompt}\nReturn the revised result in the same JSON format."
+            session.compact(self.summarize_history)
+        else:
+            text = generate_request(prompt)
+        data = self.gemini_json(
+            text, DORK_RESULT_SCHEMA, operation='AI/generate',
+            history=session.contents() if session else None, prefix=self.generate_prefix(),
+            truncated=truncated
+        )
+        if session is not None:
+            session.add(text, json.dumps(data), generation)
+        result = optimize_result(DorkResult.from_dict(data))
 
         # Update current dork if found
-        text = response.text
-        if 'Query:' in text or 'Dork:' in text:
-            lines = text.split('\n')
-            for line in lines:
-                if line.startswith(('Query:', 'Dork:')):
-                    dork = line.split(':', 1)[1].strip()
-                    self.current_dork.set(dork)
-                    break
-
+        if result.dork:
+            self.root.after(0, self.current_dork.set, result.dork)
+
+        return result
+
+    def gemini_analyze_dork(self, dork, background=False):
+        """Analyze dork using Gemini (served from the response cache when prefetched)"""
+        key = ('analyze', dork)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            return cached
+        text, truncated = self.limit_input(dork, 'AI/analyze')
+        data = self.gemini_json(
+            f"Dork to analyze: {text}", DORK_RESULT_SCHEMA,
+            background=background, operation='AI/analyze', prefix=('analyze', ANALYZE_PROMPT),
+            truncated=truncated
+        )
+        result = DorkResult.from_dict(data)
+        self.response_cache.put(key, result)
+        return result
+
+    def gemini_translate_dork(self, dork, engine, background=False):
+        """Translate dork to another engine's syntax (cached)"""
+        key = ('translate', engine, dork)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            return cached
+        text, truncated = self.limit_input(dork, 'Pivot/translate')
+        response = self.gemini_call(
+            f"Translate this Google Dork to {engine} syntax: {text}",
+            background=background, operation='Pivot/translate', truncated=truncated
+        )
+        self.response_cache.put(key, response.text)
         return response.text
 
-    def gemini_analyze_dork(self, dork):
-        """Analyze dork using Gemini"""
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
+    def toggle_prefetch(self):
+        """Persist the speculative prefetch setting"""
+        self.config['speculative_prefetch'] = self.prefetch_enabled.get()
+        self.save_config()
+        self.schedule_prefetch()
+
+    def schedule_prefetch(self):
+        """Restart the idle timer; any prefetch for the previous dork is cancelled"""
+        self._prefetch_generation += 1
+        if self._prefetch_job:
+            self.root.after_cancel(self._prefetch_job)
+            self._prefetch_job = None
+        if self.config['speculative_prefetch'] and self.gemini_available and self.current_dork.get():
+            self._prefetch_job = self.root.after(
+                self.config['prefetch_idle_ms'], self.start_prefetch, self._prefetch_generation
+            )
 
-        system_prompt = """You are a Google Dork analysis expert.
-        Analyze the given dork for:
-        1. Effectiveness (0-100)
-        2. Potential issues
-        3. Optimization suggestions
-        4. Risk level"""
+    def start_prefetch(self, generation):
+        """Warm the response cache for the current dork at low priority"""
+        self._prefetch_job = None
+        dork = self.current_dork.get()
+        jobs = [(('analyze', dork), lambda: self.gemini_analyze_dork(dork, background=True))]
+        jobs += [
+            (('translate', engine, dork), lambda e=engine: self.gemini_translate_dork(dork, e, background=True))
+            for engine in PIVOT_ENGINES
+        ]
 
-        response = model.generate_content(f"{system_prompt}\n\nDork to analyze: {dork}")
-        return response.text
+        def prefetch():
+            for key, job in jobs:
+                if generation != self._prefetch_generation:
+                    return
+                if key in self.response_cache:
+                    continue
+                try:
+                    job()
+                except PrefetchSkipped:
+                    return
+                except Exception as e:
+                    print(f"Prefetch failed: {e}")
+                    return
+
+        self.run_in_background(prefetch, 'prefetch')
+
+    def plan_gemini_batches(self, kind, items):
+        """Split items into batches sized from the configured token budgets"""
+        spec = BATCH_PROMPTS[kind]
+        return plan_batches(
+            items,
+            prefix_tokens=estimate_tokens(spec['system']),
+            output_tokens_per_item=spec['output_tokens'],
+            input_budget=self.config['batch_input_token_budget'],
+            output_budget=self.config['batch_output_token_budget'],
+            max_items=self.config['batch_max_items']
+        )
+
+    def gemini_batch(self, kind, items, retry=True):
+        """Send several dorks/objectives in one request; returns one DorkResult per item
+
+        Items the model leaves out of its answer are retried once in a
+        smaller request; anything still missing gets an error result.
+        """
+        spec = BATCH_PROMPTS[kind]
+        operation = f'Terminal/batch {kind}'
+        limited = [self.limit_input(item, operation) for item in items]
+        payload = json.dumps([{'index': i, spec['field']: text} for i, (text, _) in enumerate(limited)])
+        parsed = self.gemini_json(
+            payload, DORK_BATCH_SCHEMA, operation=operation, prefix=(f'batch-{kind}', spec['system']),
+            truncated=any(truncated for _, truncated in limited)
+        )
+
+        results = [None] * len(items)
+        if isinstance(parsed, dict):
+            parsed = [parsed]
+        for entry in parsed:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                index = int(entry.get('index'))
+            except (TypeError, ValueError):
+                continue
+            if 0 <= index < len(items) and results[index] is None:
+                results[index] = DorkResult.from_dict(entry)
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing and retry:
+            retried = self.gemini_batch(kind, [items[i] for i in missing], retry=False)
+            for i, result in zip(missing, retried):
+                results[i] = result
+        return [result or DorkResult(error='No result returned for this item') for result in results]
+
+    def gemini_analyze_batch(self, dorks):
+        """Analyze several dorks in one request"""
+        return self.gemini_batch('analyze', dorks)
+
+    def gemini_generate_batch(self, objectives):
+        """Generate one dork per objective in one request"""
+        return [optimize_result(result) for result in self.gemini_batch('generate', objectives)]
 
     def load_templates(self):
         """Load dork templates"""
@@ -1072,7 +4978,7 @@ class DorkNexusApp:
             {'name': 'Pastebin Leaks', 'category': 'osint', 'query': 'site:pastebin.com intext:"password"'},
             {'name': 'Public Documents', 'category': 'osint', 'query': 'site:docs.google.com inurl:edit'}
         ]
-        return templates
+        return [Template.from_dict(t) for t in templates]
 
     def filter_templates(self):
         """Filter and display templates"""
@@ -1082,7 +4988,7 @@ class DorkNexusApp:
 
         category = self.template_category.get()
 
-        filtered = [t for t in self.templates if category == 'all' or t['category'] == category]
+        filtered = [t for t in self.templates if category == 'all' or t.category == category]
 
         for template in filtered:
             card = tk.Frame(self.templates_frame, bg=COLORS['bg_darker'], relief=tk.RAISED, borderwidth=1)
@@ -1091,7 +4997,7 @@ class DorkNexusApp:
             # Name
             tk.Label(
                 card,
-                text=template['name'],
+                text=template.name,
                 font=('Arial', 11, 'bold'),
                 bg=COLORS['bg_darker'],
                 fg=COLORS['emerald'],
@@ -1101,7 +5007,7 @@ class DorkNexusApp:
             # Query
             tk.Label(
                 card,
-                text=template['query'],
+                text=template.query,
                 font=('Consolas', 9),
                 bg=COLORS['bg_darker'],
                 fg=COLORS['text_muted'],
@@ -1113,7 +5019,7 @@ class DorkNexusApp:
             tk.Button(
                 card,
                 text="Use Template",
-                command=lambda q=template['query']: self.use_template(q),
+                command=lambda q=template.query: self.use_template(q),
                 bg=COLORS['success'],
                 fg='white',
                 font=('Arial', 9),
@@ -1123,6 +5029,103 @@ class DorkNexusApp:
                 cursor='hand2'
             ).pack(pady=10, anchor='e', padx=15)
 
+    def similar_dorks(self, dork, k=10):
+        """Templates and vault items most like dork: [(score, label, query)], best first"""
+        matches = []
+        for score, template in self.template_similarity.similar(dork, k):
+            matches.append((score, f"Template · {template.name}", template.query))
+        for score, item_id in self.vault.similarity.similar(dork, k):
+            item = self.vault.get(item_id)
+            label = f"Vault · {item.tag_text}" if item.tags else "Vault"
+            matches.append((score, label, item.dork))
+        matches = [m for m in matches if m[2] != dork]
+        matches.sort(key=lambda m: m[0], reverse=True)
+        return matches[:k]
+
+    def show_similar_dorks(self):
+        """List the templates and vault items closest to the current dork"""
+        dork = self.current_dork.get().strip()
+        if not dork:
+            messagebox.showwarning("Similar Dorks", "Build or load a dork first.")
+            return
+        matches = self.similar_dorks(dork)
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Similar Dorks")
+        dialog.geometry("700x480")
+        dialog.configure(bg=COLORS['bg_dark'])
+        dialog.transient(self.root)
+
+        tk.Label(
+            dialog,
+            text=f"Similar to: {dork}",
+            font=('Consolas', 10, 'bold'),
+            bg=COLORS['bg_dark'],
+            fg=COLORS['cyan'],
+            anchor='w',
+            wraplength=660
+        ).pack(fill=tk.X, padx=20, pady=(15, 10))
+
+        if not matches:
+            tk.Label(
+                dialog,
+                text="No similar templates or vault items.",
+                font=('Arial', 10),
+                bg=COLORS['bg_dark'],
+                fg=COLORS['text_muted']
+            ).pack(pady=20)
+
+        def use(query):
+            self.current_dork.set(query)
+            dialog.destroy()
+
+        for score, label, query in matches:
+            row = tk.Frame(dialog, bg=COLORS['bg_darker'])
+            row.pack(fill=tk.X, padx=20, pady=3)
+
+            tk.Label(
+                row,
+                text=f"{score:.0%}",
+                font=('Arial', 10, 'bold'),
+                width=5,
+                bg=COLORS['bg_darker'],
+                fg=COLORS['emerald']
+            ).pack(side=tk.LEFT, padx=(10, 5), pady=5)
+
+            text = tk.Frame(row, bg=COLORS['bg_darker'])
+            text.pack(side=tk.LEFT, fill=tk.X, expand=True, pady=5)
+            tk.Label(
+                text,
+                text=label,
+                font=('Arial', 8),
+                bg=COLORS['bg_darker'],
+                fg=COLORS['text_muted'],
+                anchor='w'
+            ).pack(fill=tk.X)
+            tk.Label(
+                text,
+                text=query,
+                font=('Consolas', 9),
+                bg=COLORS['bg_darker'],
+                fg=COLORS['text'],
+                anchor='w',
+                wraplength=480,
+                justify=tk.LEFT
+            ).pack(fill=tk.X)
+
+            tk.Button(
+                row,
+                text="Use",
+                command=lambda q=query: use(q),
+                bg=COLORS['success'],
+                fg='white',
+                font=('Arial', 9),
+                relief=tk.FLAT,
+                padx=10,
+                pady=3,
+                cursor='hand2'
+            ).pack(side=tk.RIGHT, padx=10)
+
     def use_template(self, query):
         """Load template into current dork"""
         self.current_dork.set(query)
@@ -1134,26 +5137,287 @@ class DorkNexusApp:
         if not query:
             return
 
-        self.terminal_output.insert('end', f"\n> Executing: {query}\n")
-        self.terminal_output.insert('end', f"[{datetime.now().strftime('%H:%M:%S')}] Searching...\n")
+        self.terminal.write(
+            f"\n> Executing: {query}\n"
+            f"[{datetime.now().strftime('%H:%M:%S')}] Searching...\n"
+        )
 
         if self.gemini_available:
             def search():
                 try:
-                    model = genai.GenerativeModel('gemini-2.0-flash-exp')
-                    response = model.generate_content(
-                        f"Simulate 3 Google search results for this dork query: {query}\n"
-                        f"Format each as: Title | URL | Snippet"
-                    )
-                    self.terminal_output.insert('end', f"\nResults:\n{response.text}\n")
+                    self.terminal.write(f"\nResults:\n{self.terminal_search(query)}\n")
                 except Exception as e:
-                    self.terminal_output.insert('end', f"Error: {str(e)}\n")
+                    self.terminal.write(f"Error: {str(e)}\n")
 
-            threading.Thread(target=search, daemon=True).start()
+            self.run_in_background(search, 'terminal_search')
         else:
-            self.terminal_output.insert('end', "⚠️ Gemini API not configured. Please set API key.\n")
+            self.terminal.write("⚠️ Gemini API not configured. Please set API key.\n")
+
+    def terminal_search(self, query):
+        """Simulate search results for a dork (blocking)"""
+        query, truncated = self.limit_input(query, 'Terminal/search')
+        response = self.gemini_call(
+            f"Simulate 3 Google search results for this dork query: {query}\n"
+            f"Format each as: Title | URL | Snippet",
+            operation='Terminal/search', truncated=truncated
+        )
+        return response.text
 
-        self.terminal_output.see('end')
+    def show_batch_dialog(self):
+        """Collect a list of dorks to run through the terminal"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Batch Terminal Run")
+        dialog.geometry("640x480")
+        dialog.configure(bg=COLORS['bg_dark'])
+        dialog.transient(self.root)
+
+        tk.Label(
+            dialog,
+            text="Dorks to run (one per line, # for comments):",
+            font=('Arial', 10, 'bold'),
+            bg=COLORS['bg_dark'],
+            fg=COLORS['text']
+        ).pack(pady=(15, 5), padx=20, anchor='w')
+
+        queries_text = scrolledtext.ScrolledText(
+            dialog,
+            height=14,
+            font=('Consolas', 9),
+            bg=COLORS['bg_darker'],
+            fg=COLORS['text'],
+            insertbackground=COLORS['text'],
+            relief=tk.FLAT
+        )
+        queries_text.pack(padx=20, fill=tk.BOTH, expand=True)
+
+        def load_file():
+            path = filedialog.askopenfilename(
+                parent=dialog,
+                title="Load Dork List",
+                filetypes=[("Text", "*.txt"), ("All files", "*.*")]
+            )
+            if path:
+                with open(path, 'r', encoding='utf-8') as f:
+                    queries_text.insert('end', f.read().rstrip('\n') + '\n')
+
+        def load_tags():
+            if not dialog.winfo_exists() or not self.ensure_vault_loaded(load_tags):
+                return
+            tags = tag_entry.get()
+            dorks = self.vault_dorks_by_tags(tags)
+            if not dorks:
+                messagebox.showinfo("No Matches", f"No vault items tagged: {tags}", parent=dialog)
+                return
+            queries_text.insert('end', '\n'.join(dorks) + '\n')
+
+        source_frame = tk.Frame(dialog, bg=COLORS['bg_dark'])
+        source_frame.pack(fill=tk.X, padx=20, pady=10)
+
+        tk.Button(
+            source_frame,
+            text="📂 Load File",
+            command=load_file,
+            bg=COLORS['bg_darker'],
+            fg=COLORS['text'],
+            font=('Arial', 9),
+            relief=tk.FLAT,
+            padx=10,
+            pady=4,
+            cursor='hand2'
+        ).pack(side=tk.LEFT)
+
+        tk.Label(
+            source_frame,
+            text="Vault tags:",
+            font=('Arial', 9),
+            bg=COLORS['bg_dark'],
+            fg=COLORS['text_muted']
+        ).pack(side=tk.LEFT, padx=(20, 5))
+
+        tag_entry = tk.Entry(
+            source_frame,
+            font=('Arial', 9),
+            bg=COLORS['bg_darker'],
+            fg=COLORS['text'],
+            insertbackground=COLORS['text'],
+            relief=tk.FLAT,
+            width=25
+        )
+        tag_entry.pack(side=tk.LEFT)
+
+        tk.Button(
+            source_frame,
+            text="➕ Add Tagged",
+            command=load_tags,
+            bg=COLORS['bg_darker'],
+            fg=COLORS['text'],
+            font=('Arial', 9),
+            relief=tk.FLAT,
+            padx=10,
+            pady=4,
+            cursor='hand2'
+        ).pack(side=tk.LEFT, padx=5)
+
+        mode = tk.StringVar(value='search')
+        mode_frame = tk.Frame(dialog, bg=COLORS['bg_dark'])
+        mode_frame.pack(fill=tk.X, padx=20, pady=(0, 10))
+
+        for label, value in [
+            ('Simulate searches', 'search'),
+            ('Analyze (batched)', 'analyze'),
+            ('Generate from objectives (batched)', 'generate')
+        ]:
+            tk.Radiobutton(
+                mode_frame,
+                text=label,
+                variable=mode,
+                value=value,
+                font=('Arial', 9),
+                bg=COLORS['bg_dark'],
+                fg=COLORS['text'],
+                selectcolor=COLORS['bg_darker'],
+                activebackground=COLORS['bg_dark']
+            ).pack(side=tk.LEFT, padx=(0, 15))
+
+        def run():
+            queries = parse_dork_list(queries_text.get('1.0', tk.END))
+            if not queries:
+                messagebox.showwarning("No Queries", "Please add at least one dork!", parent=dialog)
+                return
+            dialog.destroy()
+            self.run_terminal_batch(queries, mode.get())
+
+        tk.Button(
+            dialog,
+            text=f"▶ Run Batch ({self.config['batch_workers']} workers)",
+            command=run,
+            bg=COLORS['success'],
+            fg='white',
+            font=('Arial', 10, 'bold'),
+            relief=tk.FLAT,
+            padx=20,
+            pady=8,
+            cursor='hand2'
+        ).pack(pady=(0, 15))
+
+    def vault_dorks_by_tags(self, tags):
+        """Return vault dorks carrying any of the comma-separated tags"""
+        postings = self.vault.search_index.postings
+        ids = set()
+        for tag in tags.split(','):
+            if tag.strip():
+                ids |= postings.get(f"tag:{tag.strip().lower()}", set())
+        return [item.dork for item in self.vault.to_list() if item.id in ids]
+
+    def run_terminal_batch(self, queries, mode='search'):
+        """Run queries concurrently through a bounded pool, streaming into the terminal
+
+        In 'search' mode every query is its own job. The 'analyze' and
+        'generate' modes pack queries into token-budgeted multi-item
+        requests, so each job covers a whole batch.
+        """
+        if not self.gemini_available:
+            self.terminal.write("⚠️ Gemini API not configured. Please set API key.\n")
+            return
+        if self.terminal_batch:
+            messagebox.showwarning("Batch Running", "A batch is already running!")
+            return
+
+        total = len(queries)
+        workers = max(1, int(self.config['batch_workers']))
+        if mode == 'search':
+            units = [[i] for i in range(total)]
+            search = self.profiler.wrap(self.terminal_search, 'terminal_batch')
+            job = lambda unit: [search(queries[unit[0]])]
+        else:
+            units = self.plan_gemini_batches(mode, queries)
+            batch_call = self.profiler.wrap(self.gemini_batch, f'terminal_{mode}')
+            job = lambda unit: [
+                result.format() for result in batch_call(mode, [queries[i] for i in unit])
+            ]
+
+        batch = {
+            'total': total,
+            'done': 0,
+            'failed': 0,
+            'started': time.perf_counter(),
+            'lock': threading.Lock(),
+            'executor': concurrent.futures.ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix='terminal-batch'
+            )
+        }
+        self.terminal_batch = batch
+        self.terminal.write(
+            f"\n> Batch {mode}: {total} queries in {len(units)} requests, {workers} workers "
+            f"[{datetime.now().strftime('%H:%M:%S')}]\n"
+        )
+        self.terminal_cancel_btn.pack(side=tk.RIGHT)
+        self.update_batch_progress(batch)
+
+        def stop_over_budget():
+            if batch is self.terminal_batch:
+                self.cancel_terminal_batch()
+
+        def finished(future, unit):
+            if future.cancelled():
+                return
+            try:
+                texts = future.result()
+                failed = 0
+            except BudgetExceeded as e:
+                # Don't keep sending the rest of a batch once the budget is spent
+                texts = [f"Error: {str(e)}"] * len(unit)
+                failed = len(unit)
+                self.root.after(0, stop_over_budget)
+            except Exception as e:
+                texts = [f"Error: {str(e)}"] * len(unit)
+                failed = len(unit)
+            with batch['lock']:
+                batch['done'] += len(unit)
+                batch['failed'] += failed
+            self.terminal.write(''.join(
+                f"\n[{i + 1}/{total}] {queries[i]}\n{text}\n" for i, text in zip(unit, texts)
+            ))
+            self.root.after(0, self.update_batch_progress, batch)
+
+        batch['futures'] = []
+        for unit in units:
+            future = batch['executor'].submit(job, unit)
+            future.add_done_callback(lambda f, u=unit: finished(f, u))
+            batch['futures'].append(future)
+        batch['executor'].shutdown(wait=False)
+
+    def update_batch_progress(self, batch):
+        """Show progress and ETA for the running batch"""
+        if batch is not self.terminal_batch:
+            return
+        done, total = batch['done'], batch['total']
+        elapsed = time.perf_counter() - batch['started']
+        text = f"Batch: {done}/{total} ({done * 100 // total}%)"
+        if batch['failed']:
+            text += f" · {batch['failed']} failed"
+        if done:
+            eta = elapsed / done * (total - done)
+            text += f" · {done / elapsed:.1f} q/s · ETA {int(eta // 60)}:{int(eta % 60):02d}"
+        self.terminal_progress.config(text=text)
+
+        if done == total:
+            self.finish_terminal_batch(f"Batch complete: {total} queries in {elapsed:.1f}s")
+
+    def cancel_terminal_batch(self):
+        """Cancel queued batch queries; running ones finish in the background"""
+        batch = self.terminal_batch
+        if not batch:
+            return
+        cancelled = sum(future.cancel() for future in batch['futures'])
+        self.finish_terminal_batch(f"Batch cancelled: {cancelled} queued queries dropped")
+
+    def finish_terminal_batch(self, message):
+        """Clear batch state and report the outcome"""
+        self.terminal_batch = None
+        self.terminal_cancel_btn.pack_forget()
+        self.terminal_progress.config(text=message)
+        self.terminal.write(f"\n> {message}\n")
 
     def translate_dork(self):
         """Translate current dork to other engines"""
@@ -1169,63 +5433,92 @@ class DorkNexusApp:
             messagebox.showerror("API Required", "Gemini API key required for translation!")
             return
 
+        dork = self.current_dork.get()
+
+        def add_card(engine, text):
+            card = tk.Frame(self.pivot_results, bg=COLORS['bg_darker'], relief=tk.RAISED, borderwidth=1)
+            card.pack(fill=tk.X, pady=10, padx=5)
+
+            tk.Label(
+                card,
+                text=f"🔹 {engine}",
+                font=('Arial', 12, 'bold'),
+                bg=COLORS['bg_darker'],
+                fg=COLORS['orange']
+            ).pack(anchor='w', padx=15, pady=10)
+
+            result_text = scrolledtext.ScrolledText(
+                card,
+                height=6,
+                font=('Consolas', 9),
+                bg=COLORS['bg_dark'],
+                fg=COLORS['text'],
+                wrap=tk.WORD
+            )
+            result_text.pack(fill=tk.X, padx=15, pady=(0, 10))
+            result_text.insert('1.0', text)
+            result_text.config(state='disabled')
+
         def translate():
             try:
-                model = genai.GenerativeModel('gemini-2.0-flash-exp')
-                engines = ['Shodan', 'Censys', 'Hunter.io', 'ZoomEye']
-
-                for engine in engines:
-                    prompt = f"Translate this Google Dork to {engine} syntax: {self.current_dork.get()}"
-                    response = model.generate_content(prompt)
-
-                    card = tk.Frame(self.pivot_results, bg=COLORS['bg_darker'], relief=tk.RAISED, borderwidth=1)
-                    card.pack(fill=tk.X, pady=10, padx=5)
-
-                    tk.Label(
-                        card,
-                        text=f"🔹 {engine}",
-                        font=('Arial', 12, 'bold'),
-                        bg=COLORS['bg_darker'],
-                        fg=COLORS['orange']
-                    ).pack(anchor='w', padx=15, pady=10)
-
-                    result_text = scrolledtext.ScrolledText(
-                        card,
-                        height=6,
-                        font=('Consolas', 9),
-                        bg=COLORS['bg_dark'],
-                        fg=COLORS['text'],
-                        wrap=tk.WORD
-                    )
-                    result_text.pack(fill=tk.X, padx=15, pady=(0, 10))
-                    result_text.insert('1.0', response.text)
-                    result_text.config(state='disabled')
+                for engine in PIVOT_ENGINES:
+                    text = self.gemini_translate_dork(dork, engine)
+                    self.root.after(0, add_card, engine, text)
 
             except Exception as e:
                 messagebox.showerror("Translation Error", f"Error: {str(e)}")
 
-        threading.Thread(target=translate, daemon=True).start()
+        self.run_in_background(translate, 'translate')
+
+    def do_research(self, regenerate=False):
+        """Research a topic, or with Follow-up ticked continue the research session
 
-    def do_research(self):
-        """Research a topic"""
+        A new topic close to an earlier one is answered from the prompt
+        cache unless regenerate is set.
+        """
         topic = self.research_input.get().strip()
         if not topic:
             return
 
+        self.research_regenerate_btn.pack_forget()
+        session = self.research_session
+        follow_up = self.research_follow_up.get() and bool(session) and not regenerate
+        if not follow_up:
+            session.clear()
+            self.update_session_labels()
+        if not regenerate and not follow_up:
+            cached = self.cached_prompt_answer('research', topic, self.research_regenerate_btn)
+            if cached is not None:
+                note, text = cached
+                session.add(research_request(topic), text)
+                self.update_session_labels()
+                self.research_results.delete('1.0', tk.END)
+                self.research_results.insert('1.0', f"{note}\n\n{text}")
+                return
+
         if not self.gemini_available:
             messagebox.showerror("API Required", "Gemini API key required for research!")
             return
 
+        generation = session.generation
+        self.research_btn.config(state='disabled')
         self.research_results.delete('1.0', tk.END)
         self.research_results.insert('1.0', "🔍 Researching...\n\n")
 
         def research():
             try:
-                model = genai.GenerativeModel('gemini-2.0-flash-exp')
-                response = model.generate_content(
-                    f"Provide detailed information about: {topic}\n"
-                    f"Focus on security research and OSINT context."
+                text, truncated = self.limit_input(topic, 'Research/research')
+                question = text if follow_up else research_request(text)
+                session.compact(self.summarize_history)
+                response = self.gemini_call(
+                    question,
+                    operation='Research/research',
+                    history=session.contents(),
+                    truncated=truncated
                 )
+                session.add(question, response.text, generation)
+                if self.prompt_cache is not None and not follow_up:
+                    self.prompt_cache.put('research', topic, response.text)
 
                 self.research_results.delete('1.0', tk.END)
                 self.research_results.insert('1.0', response.text)
@@ -1233,136 +5526,740 @@ class DorkNexusApp:
             except Exception as e:
                 self.research_results.delete('1.0', tk.END)
                 self.research_results.insert('1.0', f"Error: {str(e)}")
-
-        threading.Thread(target=research, daemon=True).start()
+            finally:
+                self.root.after(0, lambda: (self.research_btn.config(state='normal'), self.update_session_labels()))
+
+        self.run_in_background(research, 'research')
+
+    def new_research_session(self):
+        """Forget the research conversation; the next question starts a new topic"""
+        self.research_session.clear()
+        self.research_follow_up.set(False)
+        self.research_regenerate_btn.pack_forget()
+        self.update_session_labels()
+
+    def new_ai_session(self):
+        """Forget the AI Constructor conversation"""
+        self.ai_session.clear()
+        self.ai_follow_up.set(False)
+        self.ai_regenerate_btn.pack_forget()
+        self.update_session_labels()
+
+    def update_session_labels(self):
+        """Show how much follow-up context each chat session carries"""
+        for session, label in (
+            (self.ai_session, self.ai_session_label),
+            (self.research_session, self.research_session_label)
+        ):
+            if not session:
+                label.config(text="")
+                continue
+            summary = " + summary" if session.summary else ""
+            label.config(text=f"💬 Follow-up session: {len(session)} turns{summary}, "
+                              f"~{session.tokens():,} tokens of context")
 
     def save_to_vault(self):
-        """Save current dork to vault"""
+        """Save current dork to vault, merging into an existing duplicate"""
         if not self.current_dork.get():
             messagebox.showwarning("No Dork", "Please build a dork query first!")
             return
+        if not self.ensure_vault_loaded(self.save_to_vault):
+            return
 
-        item = {
-            'id': str(datetime.now().timestamp()),
-            'dork': self.current_dork.get(),
-            'tags': self.vault_tags.get(),
-            'notes': self.vault_notes.get(),
-            'timestamp': datetime.now().isoformat()
-        }
+        item = VaultRecord(
+            id=new_ulid(),
+            dork=self.current_dork.get(),
+            tags=self.vault_tags.get(),
+            notes=self.vault_notes.get()
+        )
 
-        self.vault_items.append(item)
+        record, merged = self.vault.add(item)
         self.save_vault()
-        self.refresh_vault_list()
+        if self.vault_query.get().strip():
+            self.refresh_vault_list()
+        elif merged:
+            self.rerender_vault_card(record.id)
+        else:
+            self.vault_view.insert(0, record)
+            self.vault_rendered += 1
+            self.render_vault_card(record, before=self.first_vault_card())
+            self.update_vault_count()
 
         self.vault_tags.delete(0, tk.END)
         self.vault_notes.delete(0, tk.END)
 
-        messagebox.showinfo("Saved", "Dork saved to vault!")
+        if merged:
+            messagebox.showinfo("Already Saved", "This dork is already in the vault - tags and notes were merged.")
+        else:
+            messagebox.showinfo("Saved", "Dork saved to vault!")
+
+    def dedupe_vault(self):
+        """Merge every set of equivalent vault items into the oldest one"""
+        if not self.ensure_vault_loaded(self.dedupe_vault):
+            return
+        removed = self.vault.dedupe()
+        if removed:
+            self.save_vault()
+            self.refresh_vault_list()
+        messagebox.showinfo("Deduplicate", f"Merged {len(removed)} duplicate item(s).")
+
+    def optimize_vault(self):
+        """Optimize the selected vault dorks (or all of them) in the background"""
+        if not self.ensure_vault_loaded(self.optimize_vault):
+            return
+        if self.vault_selection:
+            targets = [self.vault.get(i) for i in self.vault_selection if i in self.vault]
+        else:
+            targets = self.vault.to_list()
+        if not targets:
+            return
+        scope = "selected" if self.vault_selection else "vault"
+        if not messagebox.askyesno("Optimize", f"Rewrite {len(targets)} {scope} dork(s) into optimized form?"):
+            return
+
+        dorks = [(item.id, item.dork) for item in targets]
+        chunks = queue.Queue(maxsize=4)
+        state = {'changed': 0, 'error': None}
+
+        def compute():
+            chunk = []
+            try:
+                for item_id, dork in dorks:
+                    optimized, changes = optimize_dork(dork)
+                    if optimized and changes:
+                        chunk.append((item_id, dork, optimized))
+                    if len(chunk) >= VAULT_IMPORT_CHUNK:
+                        chunks.put(chunk)
+                        chunk = []
+                chunks.put(chunk)
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                chunks.put(None)
+
+        def apply_next():
+            try:
+                chunk = chunks.get_nowait()
+            except queue.Empty:
+                self.root.after(20, apply_next)
+                return
+
+            if isinstance(chunk, Exception):
+                state['error'] = chunk
+                self.root.after(1, apply_next)
+                return
+            if chunk is None:
+                self.vault_progress_label.config(text="")
+                duplicates = len(self.vault) - len(self.vault.hashes)
+                if state['changed']:
+                    self.save_vault()
+                    self.refresh_vault_list()
+                message = f"Optimized {state['changed']} dork(s)."
+                if duplicates:
+                    message += f"\n\n{duplicates} item(s) now duplicate others; use Deduplicate to merge them."
+                if state['error'] is not None:
+                    messagebox.showerror("Optimize Failed", f"{message}\n\nStopped early: {state['error']}")
+                else:
+                    messagebox.showinfo("Optimize", message)
+                return
+
+            for item_id, old, new in chunk:
+                item = self.vault.get(item_id)
+                if item is not None and item.dork == old:
+                    self.vault.update(item_id, dork=new)
+                    state['changed'] += 1
+            self.vault_progress_label.config(text=f"Optimizing… {state['changed']} updated")
+            self.root.after(1, apply_next)
+
+        self.run_in_background(compute, 'vault_optimize')
+        apply_next()
+
+    def import_vault(self):
+        """Stream records from a JSON/JSONL/CSV file into the vault, merging duplicates
+
+        A worker thread parses the file into small chunks on a bounded queue;
+        the Tk thread merges one chunk per tick so the UI stays responsive
+        and memory use does not grow with the size of the file.
+        """
+        if not self.ensure_vault_loaded(self.import_vault):
+            return
+        path = filedialog.askopenfilename(
+            title="Import Vault",
+            filetypes=[("Vault files", "*.json *.jsonl *.ndjson *.csv"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+
+        chunks = queue.Queue(maxsize=4)
+        state = {'fraction': 0.0, 'added': 0, 'merged': 0, 'skipped': 0}
+
+        def set_fraction(fraction):
+            state['fraction'] = fraction
+
+        def read():
+            chunk = []
+            try:
+                for raw in iter_vault_file(path, progress=set_fraction):
+                    chunk.append(raw)
+                    if len(chunk) >= VAULT_IMPORT_CHUNK:
+                        chunks.put(chunk)
+                        chunk = []
+                chunks.put(chunk)
+                chunks.put(None)
+            except Exception as e:
+                chunks.put(e)
+
+        def merge_next():
+            try:
+                chunk = chunks.get_nowait()
+            except queue.Empty:
+                self.root.after(20, merge_next)
+                return
+
+            if isinstance(chunk, Exception):
+                self.vault_progress_label.config(text="")
+                self.save_vault()
+                self.refresh_vault_list()
+                messagebox.showerror("Import Failed", f"Error: {chunk}")
+                return
+            if chunk is None:
+                self.vault_progress_label.config(text="")
+                self.save_vault()
+                self.refresh_vault_list()
+                messagebox.showinfo(
+                    "Import Complete",
+                    f"Added {state['added']}, merged {state['merged']} duplicate(s), "
+                    f"skipped {state['skipped']} invalid record(s)."
+                )
+                return
+
+            for raw in chunk:
+                record = normalize_vault_record(raw)
+                if record is None:
+                    state['skipped'] += 1
+                    continue
+                _, merged = self.vault.import_record(record)
+                state['merged' if merged else 'added'] += 1
+            self.vault_progress_label.config(
+                text=f"Importing… {state['fraction'] * 100:.0f}% "
+                     f"({state['added'] + state['merged']} records)"
+            )
+            self.root.after(1, merge_next)
+
+        self.run_in_background(read, 'vault_import')
+        merge_next()
+
+    def export_vault(self):
+        """Stream the vault to a JSON/JSONL/CSV file on a worker thread"""
+        if not self.ensure_vault_loaded(self.export_vault):
+            return
+        path = filedialog.asksaveasfilename(
+            title="Export Vault",
+            defaultextension=".jsonl",
+            initialfile=f"nexus_vault-{datetime.now().strftime('%Y%m%d')}.jsonl",
+            filetypes=[("JSON Lines", "*.jsonl"), ("JSON", "*.json"), ("CSV", "*.csv")]
+        )
+        if not path:
+            return
+
+        records = self.vault.to_list()
+        total = len(records)
+        dicts = (record.to_dict() for record in records)
+
+        def progress(count):
+            self.root.after(0, lambda: self.vault_progress_label.config(
+                text=f"Exporting… {count * 100 // max(1, total)}%"
+            ))
+
+        def write():
+            try:
+                with open(path, 'w', encoding='utf-8', newline='') as f:
+                    count = write_vault_file(f, dicts, vault_format(path), progress=progress)
+                message = (messagebox.showinfo, "Export Complete", f"Exported {count} records to {path}")
+            except Exception as e:
+                message = (messagebox.showerror, "Export Failed", f"Error: {str(e)}")
+            self.root.after(0, lambda: (self.vault_progress_label.config(text=""), message[0](*message[1:])))
+
+        self.run_in_background(write, 'vault_export')
 
     def load_vault(self):
-        """Load vault from file"""
-        if os.path.exists(VAULT_FILE):
+        """Load the newest page of the vault; older pages follow in the background
+
+        Pages are read from the end of the file, so startup cost does not
+        depend on the size of the vault. A loader thread parses and hashes
+        the older pages and the Tk thread merges one per tick. Files in an
+        older layout are read in full on the loader thread and rewritten in
+        the paged layout once loaded.
+        """
+        self.vault_pages = None
+        records = []
+        pages = None
+        if os.path.exists(self.vault_path):
+            # Other writers rewrite a shared file, which would invalidate note offsets
+            lazy_notes = self.config['vault_lazy_notes'] and self.shared_vault is None
             try:
-                with open(VAULT_FILE, 'r') as f:
-                    self.vault_items = json.load(f)
+                pages = iter_vault_pages(self.vault_path, VAULT_LOAD_PAGE, lazy_notes=lazy_notes)
+                records = list(reversed(next(pages, [])))
+            except ValueError:
+                pages = iter_legacy_vault_pages(self.vault_path, VAULT_LOAD_PAGE, lazy_notes=lazy_notes)
+                self._vault_rewrite = True
             except:
-                self.vault_items = []
+                pages = None
+        self.vault.load(records)
+        if pages is not None:
+            self.start_vault_loader(pages)
         self.refresh_vault_list()
+        if self.shared_vault is not None:
+            self.start_shared_vault()
+
+    def start_vault_loader(self, pages):
+        """Prepare older pages on a worker thread, a few pages ahead of the Tk thread"""
+        self.vault_pages = prepared = queue.Queue(maxsize=VAULT_LOAD_AHEAD)
+        prepare = self.vault.prepare_page
+
+        def read():
+            try:
+                for page in pages:
+                    prepared.put(prepare(page))
+                prepared.put(None)
+            except Exception as e:
+                prepared.put(e)
+
+        self.run_in_background(read, 'vault_load')
+        self.root.after(1, self.load_vault_in_background)
+
+    def load_vault_in_background(self):
+        """Merge one prepared page per tick until the whole vault is in memory"""
+        if self.vault_pages is None:
+            return
+        try:
+            page = self.vault_pages.get_nowait()
+        except queue.Empty:
+            self.root.after(20, self.load_vault_in_background)
+            return
+        if page is None or isinstance(page, Exception):
+            self.finish_vault_load(error=page)
+            return
+
+        self.vault.load_older(page)
+        if not self.vault_query.get().strip():
+            self.vault_results.append(iter([item for item, *_ in page if self.vault.get(item.id) is item]))
+            self.update_more_vault_button()
+        self.update_vault_count()
+        self.root.after(1, self.load_vault_in_background)
+
+    def finish_vault_load(self, error=None):
+        """Wrap up paged loading and run the operations that waited for it"""
+        self.vault_pages = None
+        self.vault.finish_loading()
+        if error is not None:
+            print(f"Error loading vault page: {error}")
+        elif self._vault_rewrite:
+            # Older layout: rewrite once so the next start can page it
+            self._vault_save_pending = True
+        self._vault_rewrite = False
+        if self._vault_save_pending:
+            self.save_vault()
+        if self.vault_query.get().strip():
+            self.refresh_vault_list()
+        else:
+            self.update_vault_count()
+            self.update_more_vault_button()
+
+        waiting, self._vault_waiting = self._vault_waiting, []
+        if waiting:
+            self.vault_progress_label.config(text="")
+        for action in waiting:
+            action()
+
+    def ensure_vault_loaded(self, action):
+        """Whether the whole vault is in memory; if not, run action once it is
+
+        Operations that need every record return when this is False and are
+        called again after paged loading completes, so the Tk thread never
+        waits for the loader.
+        """
+        if self.vault_pages is None:
+            return True
+        if action not in self._vault_waiting:
+            self._vault_waiting.append(action)
+        self.vault_progress_label.config(text="Loading the rest of the vault…")
+        return False
 
     def save_vault(self):
-        """Save vault to file"""
-        with open(VAULT_FILE, 'w') as f:
-            json.dump(self.vault_items, f, indent=2)
+        """Save vault to file (written in the background)"""
+        if self.vault_pages is not None:
+            # Saved once paged loading completes
+            self._vault_save_pending = True
+            return
+        self._vault_save_pending = False
+        if self.shared_vault is not None:
+            self.persistence.save(self.vault_path, save=lambda path: self.save_shared_vault())
+            return
+        records = self.vault.to_list()
+        self.persistence.save(self.vault_path, save=lambda path: save_vault_file(path, records))
+
+    def start_shared_vault(self):
+        """Record what the shared file holds now, then watch it for other writers"""
+        self._vault_syncing = True
+
+        def baseline():
+            try:
+                self.shared_vault.sync()
+            except Exception as e:
+                print(f"Error reading shared vault: {e}")
+            self._vault_syncing = False
+
+        self.run_in_background(baseline, 'vault_baseline')
+        self.root.after(self.config['vault_poll_ms'], self.poll_shared_vault)
+
+    def poll_shared_vault(self):
+        """Check the shared vault file for changes made by other instances"""
+        if self.vault_pages is None and not self._vault_syncing and self.shared_vault.changed():
+            self._vault_syncing = True
+
+            def sync():
+                try:
+                    raws, deleted = self.shared_vault.sync()
+                except Exception as e:
+                    print(f"Error reading shared vault: {e}")
+                    raws, deleted = [], set()
+                self.root.after(0, lambda: self.apply_vault_changes(raws, deleted, syncing=False))
+
+            self.run_in_background(sync, 'vault_sync')
+        self.root.after(self.config['vault_poll_ms'], self.poll_shared_vault)
+
+    def save_shared_vault(self):
+        """Merge local vault changes into the shared file (persistence thread)"""
+        dirty, deleted = self.vault.take_changes()
+        try:
+            raws, removed = self.shared_vault.save(dirty, deleted)
+        except Exception:
+            self.vault.restore_changes(dirty, deleted)
+            raise
+        if raws or removed:
+            self.root.after(0, lambda: self.apply_vault_changes(raws, removed))
+
+    def apply_vault_changes(self, raws, deleted, syncing=None):
+        """Fold other writers' changes into the vault and patch the visible cards"""
+        if syncing is not None:
+            self._vault_syncing = syncing
+        added, updated, removed = self.vault.apply_external(raws, deleted)
+        if not (added or updated or removed):
+            return
+
+        if self.vault_query.get().strip():
+            self.refresh_vault_list()
+        else:
+            for item in removed:
+                self.vault_selection.discard(item.id)
+                card = self.vault_cards.pop(item.id, None)
+                if card is not None:
+                    card.destroy()
+            for item in updated:
+                self.rerender_vault_card(item.id)
+            for item in added:
+                self.vault_view.insert(0, item)
+                self.vault_rendered += 1
+                self.render_vault_card(item, before=self.first_vault_card())
+            self.update_vault_count()
+            self.update_vault_selection_label()
+
+        count = len(added) + len(updated) + len(removed)
+        self.vault_progress_label.config(text=f"↻ {count} change(s) from other users")
+        self.root.after(5000, lambda: self.vault_progress_label.config(text=""))
+
+    def schedule_vault_search(self):
+        """Filter the vault shortly after the last keystroke"""
+        if self.vault_search_job:
+            self.root.after_cancel(self.vault_search_job)
+        self.vault_search_job = self.root.after(50, self.refresh_vault_list)
 
     def refresh_vault_list(self):
-        """Refresh vault display"""
+        """Refresh vault display with the items matching the search box"""
+        self.vault_search_job = None
         for widget in self.vault_list.winfo_children():
             widget.destroy()
-
-        for item in reversed(self.vault_items):
-            card = tk.Frame(self.vault_list, bg=COLORS['bg_darker'], relief=tk.RAISED, borderwidth=1)
+        self.vault_cards = {}
+        self.vault_rendered = 0
+        self.vault_more_btn = None
+        self.vault_selection = {i for i in self.vault_selection if i in self.vault}
+
+        results, self.vault_matches = self.vault.iter_search(self.vault_query.get().strip())
+        self.vault_view = []
+        self.vault_results = deque([results])
+        self.update_vault_count()
+        self.render_more_vault_cards()
+
+    def pull_vault_results(self, count):
+        """Move up to count more records from the lazy results into vault_view
+
+        vault_results holds iterators, consumed in order: the search results,
+        then any older pages that paged loading adds behind them.
+        """
+        while count > 0 and self.vault_results:
+            batch = list(itertools.islice(self.vault_results[0], count))
+            if len(batch) < count:
+                self.vault_results.popleft()
+            self.vault_view.extend(batch)
+            count -= len(batch)
+
+    def update_vault_count(self):
+        """Show how many items the vault (and the current search) holds"""
+        loading = " (loading…)" if self.vault_pages is not None else ""
+        if self.vault_query.get().strip():
+            text = f"{self.vault_matches} of {len(self.vault)}{loading}"
+        else:
+            text = f"{len(self.vault)} items{loading}"
+        self.vault_count_label.config(text=text)
+
+    def render_more_vault_cards(self):
+        """Render the next page of the current vault view"""
+        self._vault_scroll_job = None
+        self.pull_vault_results(self.vault_rendered + VAULT_PAGE_SIZE - len(self.vault_view))
+        page = self.vault_view[self.vault_rendered:self.vault_rendered + VAULT_PAGE_SIZE]
+        self.vault_rendered += len(page)
+        for item in page:
+            if item.id in self.vault:
+                self.render_vault_card(item)
+        self.update_more_vault_button()
+
+    def update_more_vault_button(self):
+        """Keep the "Show more" button at the bottom of the list, if anything is left"""
+        if self.vault_more_btn is not None:
+            self.vault_more_btn.destroy()
+            self.vault_more_btn = None
+
+        if len(self.vault_view) <= self.vault_rendered:
+            # Look one record ahead so the button only shows if there is more
+            self.pull_vault_results(1)
+        query = self.vault_query.get().strip()
+        total = self.vault_matches if query else len(self.vault)
+        remaining = max(len(self.vault_view), total) - self.vault_rendered
+        loading = self.vault_pages is not None and not query
+        if len(self.vault_view) > self.vault_rendered or loading:
+            more = f"{remaining}+" if loading else f"{remaining}"
+            self.vault_more_btn = tk.Button(
+                self.vault_list,
+                text=f"Show more ({more} remaining)",
+                command=self.render_more_vault_cards,
+                bg=COLORS['bg_darker'],
+                fg=COLORS['text'],
+                font=('Arial', 9),
+                relief=tk.FLAT,
+                pady=5,
+                cursor='hand2'
+            )
+            self.vault_more_btn.pack(fill=tk.X, pady=8, padx=5)
+
+    def first_vault_card(self):
+        """The top card widget, if any"""
+        children = self.vault_list.pack_slaves()
+        return children[0] if children else None
+
+    def render_vault_card(self, item, before=None):
+        """Create the card for one vault item"""
+        card = tk.Frame(self.vault_list, bg=COLORS['bg_darker'], relief=tk.RAISED, borderwidth=1)
+        if before is not None:
+            card.pack(fill=tk.X, pady=8, padx=5, before=before)
+        else:
             card.pack(fill=tk.X, pady=8, padx=5)
+        self.vault_cards[item.id] = card
+
+        # Dork
+        header = tk.Frame(card, bg=COLORS['bg_darker'])
+        header.pack(fill=tk.X, padx=15, pady=(10, 5))
+
+        selected = tk.BooleanVar(value=item.id in self.vault_selection)
+        tk.Checkbutton(
+            header,
+            variable=selected,
+            command=lambda i=item.id, v=selected: self.toggle_vault_selection(i, v.get()),
+            bg=COLORS['bg_darker'],
+            selectcolor=COLORS['bg_dark'],
+            activebackground=COLORS['bg_darker']
+        ).pack(side=tk.LEFT)
+        card.selected = selected
 
-            # Dork
+        tk.Label(
+            header,
+            text=item.dork,
+            font=('Consolas', 10, 'bold'),
+            bg=COLORS['bg_darker'],
+            fg=COLORS['amber'],
+            anchor='w'
+        ).pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+        # Notes
+        notes = item.notes
+        if notes:
             tk.Label(
                 card,
-                text=item['dork'],
-                font=('Consolas', 10, 'bold'),
+                text=f"📝 {notes}",
+                font=('Arial', 9),
                 bg=COLORS['bg_darker'],
-                fg=COLORS['amber'],
+                fg=COLORS['text_muted'],
                 anchor='w'
-            ).pack(fill=tk.X, padx=15, pady=(10, 5))
+            ).pack(fill=tk.X, padx=15, pady=2)
 
-            # Notes
-            if item.get('notes'):
-                tk.Label(
-                    card,
-                    text=f"📝 {item['notes']}",
-                    font=('Arial', 9),
-                    bg=COLORS['bg_darker'],
-                    fg=COLORS['text_muted'],
-                    anchor='w'
-                ).pack(fill=tk.X, padx=15, pady=2)
-
-            # Tags
-            if item.get('tags'):
-                tk.Label(
-                    card,
-                    text=f"🏷️ {item['tags']}",
-                    font=('Arial', 9),
-                    bg=COLORS['bg_darker'],
-                    fg=COLORS['text_muted'],
-                    anchor='w'
-                ).pack(fill=tk.X, padx=15, pady=2)
-
-            # Timestamp
+        # Tags
+        if item.tags:
             tk.Label(
                 card,
-                text=f"⏰ {item['timestamp'][:19]}",
-                font=('Arial', 8),
+                text=f"🏷️ {item.tag_text}",
+                font=('Arial', 9),
                 bg=COLORS['bg_darker'],
                 fg=COLORS['text_muted'],
                 anchor='w'
             ).pack(fill=tk.X, padx=15, pady=2)
 
-            # Buttons
-            btn_frame = tk.Frame(card, bg=COLORS['bg_darker'])
-            btn_frame.pack(pady=10, padx=15, anchor='e')
+        # Timestamp
+        tk.Label(
+            card,
+            text=f"⏰ {item.timestamp_text[:19]}",
+            font=('Arial', 8),
+            bg=COLORS['bg_darker'],
+            fg=COLORS['text_muted'],
+            anchor='w'
+        ).pack(fill=tk.X, padx=15, pady=2)
 
-            tk.Button(
-                btn_frame,
-                text="Load",
-                command=lambda d=item['dork']: self.current_dork.set(d),
-                bg=COLORS['primary'],
-                fg='white',
-                font=('Arial', 8),
-                relief=tk.FLAT,
-                padx=10,
-                pady=3
-            ).pack(side=tk.LEFT, padx=3)
+        # Buttons
+        btn_frame = tk.Frame(card, bg=COLORS['bg_darker'])
+        btn_frame.pack(pady=10, padx=15, anchor='e')
 
-            tk.Button(
-                btn_frame,
-                text="Delete",
-                command=lambda i=item: self.delete_vault_item(i),
-                bg=COLORS['danger'],
-                fg='white',
-                font=('Arial', 8),
-                relief=tk.FLAT,
-                padx=10,
-                pady=3
-            ).pack(side=tk.LEFT, padx=3)
+        tk.Button(
+            btn_frame,
+            text="Load",
+            command=lambda d=item.dork: self.current_dork.set(d),
+            bg=COLORS['primary'],
+            fg='white',
+            font=('Arial', 8),
+            relief=tk.FLAT,
+            padx=10,
+            pady=3
+        ).pack(side=tk.LEFT, padx=3)
+
+        tk.Button(
+            btn_frame,
+            text="Delete",
+            command=lambda i=item.id: self.delete_vault_item(i),
+            bg=COLORS['danger'],
+            fg='white',
+            font=('Arial', 8),
+            relief=tk.FLAT,
+            padx=10,
+            pady=3
+        ).pack(side=tk.LEFT, padx=3)
+        return card
+
+    def rerender_vault_card(self, item_id):
+        """Rebuild one card in place after its record changed"""
+        old = self.vault_cards.get(item_id)
+        if old is None:
+            return
+        self.render_vault_card(self.vault.get(item_id), before=old)
+        old.destroy()
 
-    def delete_vault_item(self, item):
+    def toggle_vault_selection(self, item_id, selected):
+        if selected:
+            self.vault_selection.add(item_id)
+        else:
+            self.vault_selection.discard(item_id)
+        self.update_vault_selection_label()
+
+    def set_vault_selection(self, selected):
+        """Select or clear every rendered card"""
+        self.vault_selection = set(self.vault_cards) if selected else set()
+        for card in self.vault_cards.values():
+            card.selected.set(selected)
+        self.update_vault_selection_label()
+
+    def update_vault_selection_label(self):
+        count = len(self.vault_selection)
+        self.vault_selection_label.config(text=f"{count} selected" if count else "")
+
+    def delete_vault_item(self, item_id):
         """Delete item from vault"""
-        self.vault_items = [i for i in self.vault_items if i['id'] != item['id']]
+        if self.vault.remove(item_id) is None:
+            return
+        self.save_vault()
+        self.vault_selection.discard(item_id)
+        card = self.vault_cards.pop(item_id, None)
+        if card is not None:
+            card.destroy()
+        self.update_vault_selection_label()
+
+    def delete_selected_vault_items(self):
+        """Delete every selected vault item"""
+        if not self.vault_selection:
+            return
+        if not messagebox.askyesno("Delete", f"Delete {len(self.vault_selection)} selected item(s)?"):
+            return
+        removed = self.vault.remove_many(self.vault_selection)
+        self.save_vault()
+        for item in removed:
+            card = self.vault_cards.pop(item.id, None)
+            if card is not None:
+                card.destroy()
+        self.vault_selection = set()
+        self.update_vault_selection_label()
+
+    def tag_selected_vault_items(self):
+        """Add (+tag) or remove (-tag) tags on every selected vault item"""
+        if not self.vault_selection:
+            return
+        spec = simpledialog.askstring(
+            "Edit Tags",
+            "Tags to add or remove, comma separated (e.g. +sql, -old):",
+            parent=self.root
+        )
+        if not spec:
+            return
+        add = [t.strip().lstrip('+') for t in spec.split(',') if t.strip() and not t.strip().startswith('-')]
+        drop = {t.strip()[1:].strip().lower() for t in spec.split(',') if t.strip().startswith('-')}
+
+        for item_id in self.vault_selection:
+            item = self.vault.get(item_id)
+            if item is None:
+                continue
+            tags = merge_tags(item.tags, add)
+            tags = [t for t in split_tags(tags) if t.lower() not in drop]
+            self.vault.update(item_id, tags=tags)
+            self.rerender_vault_card(item_id)
         self.save_vault()
-        self.refresh_vault_list()
 
-def main():
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description=f"{APP_NAME} desktop application")
+    parser.add_argument('--profile', action='store_true',
+                        help="profile the main loop and worker jobs from startup")
+    parser.add_argument('--profile-dir', default=PROFILE_DIR,
+                        help=f"directory for profile dumps (default: {PROFILE_DIR})")
+    parser.add_argument('--stall-ms', type=int, default=STALL_THRESHOLD_MS,
+                        help=f"log main-thread stalls longer than this (default: {STALL_THRESHOLD_MS})")
+    parser.add_argument('--vault', metavar='PATH',
+                        help=f"vault file to use (default: vault_file in {CONFIG_FILE})")
+    parser.add_argument('--shared', action='store_true', default=None,
+                        help="share the vault file with other instances (locking and live updates)")
+    parser.add_argument('--self-test', action='store_true',
+                        help="open the window, print how long startup took and exit")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Main entry point"""
+    args = parse_args(argv)
+    profiler = Profiler(args.profile_dir)
+    if args.profile:
+        profiler.start()
+
     root = tk.Tk()
-    app = DorkNexusApp(root)
+    app = DorkNexusApp(root, profiler=profiler, stall_ms=args.stall_ms,
+                       vault_path=args.vault, shared=args.shared)
+    if args.self_test:
+        root.update()
+        print(f"{APP_NAME} self-test: window ready {(time.perf_counter() - STARTED) * 1000:.0f} ms after import")
+        app.on_close()
+        return
     root.mainloop()
 
 if __name__ == "__main__":
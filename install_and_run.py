@@ -5,12 +5,76 @@ Automatically sets up and runs DorkNexus Desktop Application
 Works on Windows, macOS, and Linux
 """
 
+import argparse
+import compileall
+import hashlib
+import importlib.util
+import json
 import os
+import py_compile
+import re
+import runpy
 import sys
 import subprocess
 import platform
+import tempfile
+import time
+import zipapp
+import zipfile
 from pathlib import Path
 
+try:
+    from importlib import metadata
+except ImportError:
+    metadata = None
+
+# Written after a successful install; lets later launches skip pip
+FINGERPRINT_FILE = '.install_fingerprint'
+
+# Single-file launcher: precompiled dorknexus_app run in-process
+BUNDLE_FILE = 'DorkNexus.pyz'
+
+BUNDLE_MAIN = '''\
+import os
+import sys
+
+# (mtime_ns, size) of dorknexus_app.py when this bundle was built
+SOURCE_STAMP = {stamp!r}
+
+app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+try:
+    stat = os.stat(os.path.join(app_dir, 'dorknexus_app.py'))
+    if (stat.st_mtime_ns, stat.st_size) != SOURCE_STAMP:
+        # The source changed after the bundle was built: run the source instead
+        sys.path.insert(0, app_dir)
+except OSError:
+    pass
+try:
+    import dorknexus_app
+except ImportError:
+    # Bytecode from another Python version
+    sys.path.insert(0, app_dir)
+    import dorknexus_app
+dorknexus_app.main()
+'''
+
+# Cross-platform launcher; runs the app in this interpreter
+PYTHON_LAUNCHER = '''\
+#!/usr/bin/env python3
+import runpy
+import sys
+from pathlib import Path
+
+app_dir = Path(__file__).parent
+bundle = app_dir / "DorkNexus.pyz"
+if bundle.exists():
+    runpy.run_path(str(bundle), run_name="__main__")
+else:
+    sys.path.insert(0, str(app_dir))
+    import dorknexus_app
+    dorknexus_app.main()
+'''
+
 # Colors for terminal output
 class Colors:
     HEADER = '\033[95m'
@@ -73,11 +137,124 @@ def check_pip():
         print("  https://pip.pypa.io/en/stable/installation/")
         sys.exit(1)
 
+def requirements_path():
+    return Path(__file__).parent / 'requirements.txt'
+
+def release_parts(version):
+    """Numeric release parts of a version string, e.g. '0.8.3rc1' -> (0, 8, 3)"""
+    match = re.match(r'\d+(?:\.\d+)*', version)
+    if not match:
+        raise ValueError(version)
+    return tuple(int(part) for part in match.group().split('.'))
+
+def version_key(version):
+    """release_parts without trailing zeros, so '1.0' and '1' compare equal"""
+    parts = list(release_parts(version))
+    while len(parts) > 1 and parts[-1] == 0:
+        parts.pop()
+    return tuple(parts)
+
+def has_prefix(installed, prefix):
+    """Whether installed's release starts with prefix, padding it with zeros"""
+    have = release_parts(installed)
+    have += (0,) * (len(prefix) - len(have))
+    return have[:len(prefix)] == prefix
+
+def version_matches(installed, op, wanted):
+    """Check one specifier clause against a plain release (see installed_requirements)"""
+    if wanted.endswith('.*'):
+        equal = has_prefix(installed, release_parts(wanted[:-2]))
+        return equal if op == '==' else not equal
+    have, want = version_key(installed), version_key(wanted)
+    if op == '~=':
+        # ~=1.4.2 means >=1.4.2 and ==1.4.*; the prefix keeps written zeros
+        release = release_parts(wanted)
+        if len(release) < 2:
+            raise ValueError(wanted)
+        return have >= want and has_prefix(installed, release[:-1])
+    return {
+        '==': have == want, '!=': have != want,
+        '>=': have >= want, '<=': have <= want,
+        '>': have > want, '<': have < want
+    }[op]
+
+def installed_requirements(requirements_file):
+    """Installed versions of everything requirements.txt asks for
+
+    Returns {name: version}, or None when anything is missing, too old,
+    installed as anything but a plain release (0.8.0rc1, 1.2+local), or
+    written in a form this check does not understand (pip then decides).
+    """
+    if metadata is None or not requirements_file.exists():
+        return None
+    installed = {}
+    try:
+        for line in requirements_file.read_text(encoding='utf-8').splitlines():
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            match = re.match(r'^([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[[^\]]*\])?\s*(.*)$', line)
+            if not match or line.startswith('-') or ';' in line or '@' in line:
+                return None
+            name, specs = match.groups()
+            version = metadata.version(name)
+            if not re.fullmatch(r'\d+(?:\.\d+)*', version):
+                return None
+            for clause in filter(None, (part.strip() for part in specs.split(','))):
+                spec = re.match(r'^(~=|==|!=|<=|>=|<|>)\s*([0-9][0-9A-Za-z.*+!-]*)$', clause)
+                if not spec or not version_matches(version, *spec.groups()):
+                    return None
+            installed[name] = version
+    except (metadata.PackageNotFoundError, ValueError, OSError):
+        return None
+    return installed
+
+def dependency_fingerprint(requirements_file):
+    """Hash of requirements.txt plus the interpreter it was installed into"""
+    digest = hashlib.sha256()
+    digest.update(requirements_file.read_bytes() if requirements_file.exists() else b'')
+    digest.update(sys.executable.encode('utf-8'))
+    digest.update(sys.version.encode('utf-8'))
+    return digest.hexdigest()
+
+def read_fingerprint():
+    try:
+        with open(Path(__file__).parent / FINGERPRINT_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f).get('fingerprint')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def write_fingerprint(requirements_file, installed):
+    try:
+        with open(Path(__file__).parent / FINGERPRINT_FILE, 'w', encoding='utf-8') as f:
+            json.dump({
+                'fingerprint': dependency_fingerprint(requirements_file),
+                'python': sys.executable,
+                'installed': installed or {}
+            }, f, indent=2)
+    except OSError as e:
+        print_warning(f"Could not record install fingerprint: {e}")
+
+def skip_dependencies():
+    """Steps 2-3 when everything is already installed: no pip, no network"""
+    requirements_file = requirements_path()
+    installed = installed_requirements(requirements_file)
+    print_step(2, 5, "Checking pip... skipped")
+    print_step(3, 5, "Checking dependencies...")
+    if read_fingerprint() == dependency_fingerprint(requirements_file):
+        print_success("Dependencies up to date (pip skipped)")
+    else:
+        write_fingerprint(requirements_file, installed)
+        print_success("Dependencies already installed (pip skipped)")
+    for name, version in installed.items():
+        print(f"  • {name} {version}")
+    return True
+
 def install_dependencies():
     """Install required dependencies"""
     print_step(3, 5, "Installing dependencies...")
 
-    requirements_file = Path(__file__).parent / 'requirements.txt'
+    requirements_file = requirements_path()
 
     if not requirements_file.exists():
         print_warning("requirements.txt not found, creating minimal requirements...")
@@ -99,6 +276,7 @@ def install_dependencies():
         )
 
         if result.returncode == 0:
+            write_fingerprint(requirements_file, installed_requirements(requirements_file))
             print_success("Dependencies installed successfully")
             return True
         else:
@@ -110,18 +288,71 @@ def install_dependencies():
         print_error(f"Installation failed: {e}")
         return False
 
+def bundle_info(bundle):
+    """Build info stored in a bundle, or None if it is missing or unreadable"""
+    try:
+        with zipfile.ZipFile(bundle) as zf:
+            return json.loads(zf.read('bundle.json'))
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        return None
+
+def build_bundle():
+    """Build DorkNexus.pyz unless it is current; returns (path, rebuilt)
+
+    The bundle holds dorknexus_app compiled ahead of time (optimize=1) for
+    this interpreter, so launches skip compiling the source. It falls back
+    to the source when that changes or the interpreter differs.
+    """
+    app_dir = Path(__file__).parent
+    source = app_dir / 'dorknexus_app.py'
+    bundle = app_dir / BUNDLE_FILE
+    stat = source.stat()
+    info = {
+        'source': [stat.st_mtime_ns, stat.st_size],
+        'magic': importlib.util.MAGIC_NUMBER.hex(),
+        'python': sys.executable
+    }
+    # Cache bytecode for imports of the source too
+    compileall.compile_file(str(source), quiet=1)
+    if bundle_info(bundle) == info:
+        return bundle, False
+
+    with tempfile.TemporaryDirectory(dir=app_dir) as staging:
+        staging = Path(staging)
+        contents = staging / 'contents'
+        contents.mkdir()
+        py_compile.compile(
+            str(source), cfile=str(contents / 'dorknexus_app.pyc'), dfile=str(source), doraise=True,
+            optimize=1, invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH
+        )
+        (contents / '__main__.py').write_text(
+            BUNDLE_MAIN.format(stamp=(stat.st_mtime_ns, stat.st_size)), encoding='utf-8'
+        )
+        (contents / 'bundle.json').write_text(json.dumps(info), encoding='utf-8')
+        target = staging / BUNDLE_FILE
+        zipapp.create_archive(contents, target, interpreter=sys.executable)
+        os.replace(target, bundle)
+    return bundle, True
+
 def create_launcher_scripts():
     """Create platform-specific launcher scripts"""
     print_step(4, 5, "Creating launcher scripts...")
 
     app_dir = Path(__file__).parent
+    target = app_dir / 'dorknexus_app.py'
+    try:
+        bundle, rebuilt = build_bundle()
+        target = bundle
+        print_success(f"Precompiled bundle {'built' if rebuilt else 'up to date'}: {bundle.name}")
+    except Exception as e:
+        print_warning(f"Could not build {BUNDLE_FILE}, launchers will run the source: {e}")
 
     # Windows batch file
     windows_launcher = app_dir / 'DorkNexus.bat'
     with open(windows_launcher, 'w') as f:
         f.write('@echo off\n')
         f.write('echo Starting DorkNexus...\n')
-        f.write(f'"{sys.executable}" "{app_dir / "dorknexus_app.py"}"\n')
+        f.write(f'"{sys.executable}" "{target}"\n')
         f.write('pause\n')
 
     # Unix shell script (macOS/Linux)
@@ -129,7 +360,7 @@ def create_launcher_scripts():
     with open(unix_launcher, 'w') as f:
         f.write('#!/bin/bash\n')
         f.write('echo "Starting DorkNexus..."\n')
-        f.write(f'"{sys.executable}" "{app_dir / "dorknexus_app.py"}"\n')
+        f.write(f'"{sys.executable}" "{target}"\n')
 
     # Make shell script executable on Unix systems
     if platform.system() != 'Windows':
@@ -138,12 +369,7 @@ def create_launcher_scripts():
     # Python launcher (cross-platform)
     python_launcher = app_dir / 'run_dorknexus.py'
     with open(python_launcher, 'w') as f:
-        f.write('#!/usr/bin/env python3\n')
-        f.write('import subprocess\n')
-        f.write('import sys\n')
-        f.write('from pathlib import Path\n\n')
-        f.write('app_path = Path(__file__).parent / "dorknexus_app.py"\n')
-        f.write('subprocess.run([sys.executable, str(app_path)])\n')
+        f.write(PYTHON_LAUNCHER)
 
     print_success("Launcher scripts created")
     print(f"  • Windows: {windows_launcher.name}")
@@ -179,16 +405,46 @@ def launch_app():
 
     print("Launching DorkNexus...\n")
 
-    app_path = Path(__file__).parent / 'dorknexus_app.py'
+    # Run in this interpreter rather than starting a second one
+    app_dir = Path(__file__).parent
+    bundle = app_dir / BUNDLE_FILE
 
     try:
-        subprocess.run([sys.executable, str(app_path)])
+        if bundle.exists():
+            sys.argv = [str(bundle)]
+            runpy.run_path(str(bundle), run_name='__main__')
+        else:
+            sys.argv = [str(app_dir / 'dorknexus_app.py')]
+            sys.path.insert(0, str(app_dir))
+            import dorknexus_app
+            dorknexus_app.main()
     except KeyboardInterrupt:
         print("\n\nApplication closed.")
     except Exception as e:
         print_error(f"Failed to launch application: {e}")
         sys.exit(1)
 
+def run_self_test():
+    """Time launch-to-window for the source and the bundle"""
+    print(f"{Colors.BOLD}Startup self-test{Colors.ENDC}")
+    app_dir = Path(__file__).parent
+    targets = [('source', app_dir / 'dorknexus_app.py'), ('bundle', app_dir / BUNDLE_FILE)]
+    for label, target in targets:
+        if not target.exists():
+            print_warning(f"{label}: {target.name} not found")
+            continue
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, str(target), '--self-test'], capture_output=True, text=True, timeout=120
+        )
+        elapsed = (time.perf_counter() - start) * 1000
+        if result.returncode != 0:
+            lines = result.stderr.strip().splitlines()
+            print_warning(f"{label}: self-test failed ({lines[-1] if lines else result.returncode})")
+            continue
+        print_success(f"{label}: window ready in {elapsed:.0f} ms ({target.name})")
+    return True
+
 def show_manual_instructions():
     """Show manual launch instructions"""
     print(f"\n{Colors.CYAN}{'='*60}{Colors.ENDC}")
@@ -207,20 +463,28 @@ def show_manual_instructions():
 
     print()
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Install DorkNexus dependencies and launch the app")
+    parser.add_argument('--force-install', action='store_true',
+                        help="run pip even when the installed packages already satisfy requirements.txt")
+    parser.add_argument('--self-test', action='store_true',
+                        help="after installing, time startup of the source and the bundle instead of launching")
+    return parser.parse_args()
+
 def main():
     """Main installation flow"""
+    args = parse_args()
     print_header()
 
     print(f"Detected OS: {Colors.BOLD}{platform.system()} {platform.release()}{Colors.ENDC}\n")
 
-    # Installation steps
-    steps = [
-        check_python_version,
-        check_pip,
-        install_dependencies,
-        create_launcher_scripts,
-        verify_installation
-    ]
+    # Installation steps; pip only runs when something is missing (or forced)
+    steps = [check_python_version]
+    if not args.force_install and installed_requirements(requirements_path()) is not None:
+        steps.append(skip_dependencies)
+    else:
+        steps += [check_pip, install_dependencies]
+    steps += [create_launcher_scripts, verify_installation]
 
     for step in steps:
         if not step():
@@ -228,6 +492,10 @@ def main():
             sys.exit(1)
         print()
 
+    if args.self_test:
+        run_self_test()
+        return
+
     # Launch the app
     try:
         launch_app()
@@ -0,0 +1,286 @@
+"""Tests for the AI request plumbing that runs without a provider"""
+import json
+import os
+import sys
+import threading
+import types
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dorknexus_app as app  # noqa: E402
+
+
+class UsageLedgerTest(unittest.TestCase):
+    """Budgets hold in-flight requests at their worst case"""
+
+    def test_reservations_count_against_budget(self):
+        ledger = app.UsageLedger(session_budget=10000)
+        held = ledger.reserve(100 + 8192)
+        with self.assertRaises(app.BudgetExceeded):
+            ledger.reserve(100 + 8192)
+        ledger.record('Terminal/batch analyze', 120, 900, reserved=held)
+        self.assertEqual(ledger.reserved, 0)
+        self.assertEqual(ledger.snapshot()['session_tokens'], 1020)
+        ledger.release(ledger.reserve(8000))
+        self.assertEqual(ledger.reserved, 0)
+
+    def test_background_share(self):
+        ledger = app.UsageLedger(daily_budget=1000)
+        ledger.reserve(700)
+        with self.assertRaises(app.PrefetchSkipped):
+            ledger.reserve(200, background=True)
+        ledger.reserve(200)
+
+    def test_concurrent_workers_stay_within_budget(self):
+        ledger = app.UsageLedger(session_budget=5000)
+        admitted = []
+        start = threading.Barrier(16)
+
+        def worker():
+            start.wait()
+            try:
+                admitted.append(ledger.reserve(1000))
+            except app.BudgetExceeded:
+                pass
+
+        threads = [threading.Thread(target=worker) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(admitted), 5)
+        self.assertEqual(ledger.reserved, 5000)
+
+
+class InputLimitTest(unittest.TestCase):
+    """Oversized user input is cut before it goes into the prompt"""
+
+    def setUp(self):
+        self.sent = {}
+        self.app = types.SimpleNamespace(config={'max_prompt_tokens': 50})
+        for name in ('limit_input', 'gemini_batch', 'terminal_search'):
+            setattr(self.app, name, types.MethodType(getattr(app.DorkNexusApp, name), self.app))
+
+        def send(prompt, *args, **kwargs):
+            self.sent.update(kwargs, prompt=prompt)
+            return [] if args else types.SimpleNamespace(text='ok')
+
+        self.app.gemini_json = self.app.gemini_call = send
+
+    def test_batch_payload_stays_json(self):
+        self.app.gemini_batch('analyze', ['site:example.com', 'x' * 1000], retry=False)
+        payload = json.loads(self.sent['prompt'])
+        self.assertEqual(payload[0]['dork'], 'site:example.com')
+        self.assertLess(len(payload[1]['dork']), 300)
+        self.assertTrue(self.sent['truncated'])
+
+    def test_search_keeps_format_instruction(self):
+        self.app.terminal_search('inurl:' + 'a' * 1000)
+        self.assertTrue(self.sent['prompt'].endswith('Format each as: Title | URL | Snippet'))
+        self.assertTrue(self.sent['truncated'])
+
+
+class ServerError(Exception):
+    code = 503
+
+
+class BadRequest(Exception):
+    code = 400
+
+
+class ModelFallbackTest(unittest.TestCase):
+    """gemini_call moves to the next model, backing off only unhealthy ones"""
+
+    def setUp(self):
+        self.calls = []
+        self.outcomes = {}
+        self.app = types.SimpleNamespace(
+            config={'prefetch_reserve': 0}, usage=app.UsageLedger(), router=app.ModelRouter(),
+            rate_limiter=types.SimpleNamespace(acquire=lambda: None), save_usage=lambda: None
+        )
+        for name in ('gemini_call', 'record_usage'):
+            setattr(self.app, name, types.MethodType(getattr(app.DorkNexusApp, name), self.app))
+
+        def generate_content(model_name, contents, config, timeout, prefix=None):
+            self.calls.append((model_name, config.get('max_output_tokens')))
+            outcome = self.outcomes.get(model_name, types.SimpleNamespace(text='ok'))
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        self.app.generate_content = generate_content
+
+    def cooling(self, model):
+        return self.app.router.stats[model]['cooldown_until'] > 0
+
+    def test_thinking_model_gets_room(self):
+        self.app.gemini_call('topic', operation='Research/research')
+        self.assertEqual(self.calls, [('gemini-2.5-pro', 2048 + app.THINKING_TOKENS)])
+        self.assertEqual(self.app.usage.reserved, 0)
+
+    def test_empty_response_falls_back(self):
+        self.outcomes['gemini-2.5-pro'] = types.SimpleNamespace(text='')
+        self.assertEqual(self.app.gemini_call('topic', operation='Research/research').text, 'ok')
+        self.assertEqual([model for model, _ in self.calls], ['gemini-2.5-pro', 'gemini-2.0-flash'])
+        self.assertFalse(self.cooling('gemini-2.5-pro'))
+
+    def test_only_transient_errors_back_off(self):
+        self.outcomes['gemini-2.5-pro'] = BadRequest('invalid argument')
+        self.app.gemini_call('topic', operation='Research/research')
+        self.assertFalse(self.cooling('gemini-2.5-pro'))
+        self.assertEqual(self.app.router.stats['gemini-2.5-pro']['errors'], 1)
+
+        self.outcomes['gemini-2.5-pro'] = ServerError('unavailable')
+        self.app.gemini_call('topic', operation='Research/research')
+        self.assertTrue(self.cooling('gemini-2.5-pro'))
+
+    def test_transient_errors(self):
+        self.assertTrue(app.is_transient_error(TimeoutError()))
+        self.assertTrue(app.is_transient_error(type('ResourceExhausted', (Exception,), {})()))
+        self.assertFalse(app.is_transient_error(ValueError('bad schema')))
+
+
+class ContextCacheTest(unittest.TestCase):
+    """Prefix caches are created once, reused until their TTL and re-created after"""
+
+    PREFIX = ('generate', 'system prompt')
+
+    def setUp(self):
+        self.now = 1000.0
+        self.uploads = []
+        self.fail = False
+        self.cache = app.ContextCache(ttl=3600, min_tokens=1, create=self.create)
+        self.cache.local_model = lambda model_name, text: ('inline', model_name)
+        patcher = mock.patch.object(app.time, 'monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create(self, model_name, name, text):
+        if self.fail:
+            raise RuntimeError('caching unavailable')
+        self.uploads.append(name)
+        return ('cached', len(self.uploads))
+
+    def prepare(self):
+        return self.cache.prepare('gemini-2.0-flash', self.PREFIX)
+
+    def test_reuse_within_ttl(self):
+        self.assertEqual(self.prepare(), (('cached', 1), True))
+        self.now += 3600 - app.ContextCache.MARGIN - 1
+        self.assertEqual(self.prepare(), (('cached', 1), True))
+        self.assertEqual(self.cache.snapshot()['reused'], 1)
+
+    def test_recreated_after_margin(self):
+        self.prepare()
+        self.now += 3600 - app.ContextCache.MARGIN + 1
+        self.assertEqual(self.prepare(), (('cached', 2), True))
+        self.assertEqual(self.cache.created, 2)
+
+    def test_small_prefix_inline(self):
+        self.cache.min_tokens = 4096
+        self.assertEqual(self.prepare(), (('inline', 'gemini-2.0-flash'), False))
+        self.assertEqual(self.uploads, [])
+
+    def test_failure_backs_off(self):
+        self.fail = True
+        self.assertFalse(self.prepare()[1])
+        self.fail = False
+        self.now += app.ContextCache.RETRY_AFTER - 1
+        self.assertFalse(self.prepare()[1])
+        self.assertEqual(self.uploads, [])
+        self.now += 2
+        self.assertEqual(self.prepare(), (('cached', 1), True))
+        self.assertEqual(self.cache.snapshot()['errors'], 1)
+
+    def test_one_upload_in_flight(self):
+        started, release = threading.Event(), threading.Event()
+        create = self.create
+
+        def slow_create(*args):
+            started.set()
+            release.wait(5)
+            return create(*args)
+
+        self.cache.create = slow_create
+        results = []
+        thread = threading.Thread(target=lambda: results.append(self.prepare()))
+        thread.start()
+        self.assertTrue(started.wait(5))
+        self.assertEqual(self.prepare(), (('inline', 'gemini-2.0-flash'), False))
+        release.set()
+        thread.join()
+        self.assertEqual(results, [(('cached', 1), True)])
+        self.assertEqual(self.uploads, ['generate'])
+        self.assertEqual(self.prepare(), (('cached', 1), True))
+
+    def test_dropped_cache_retried(self):
+        calls = []
+
+        class Model:
+            def __init__(self, tag):
+                self.tag = tag
+
+            def generate_content(self, contents, **kwargs):
+                calls.append(self.tag)
+                if self.tag == ('cached', 1):
+                    raise RuntimeError('403 CachedContent not found')
+                return types.SimpleNamespace(text='ok')
+
+        self.cache.create = lambda *args: Model(self.create(*args))
+        stub = types.SimpleNamespace(context_cache=self.cache)
+        generate = types.MethodType(app.DorkNexusApp.generate_content, stub)
+        response = generate('gemini-2.0-flash', 'contents', {}, 30, self.PREFIX)
+        self.assertEqual(response.text, 'ok')
+        self.assertEqual(calls, [('cached', 1), ('cached', 2)])
+        self.assertEqual(generate('gemini-2.0-flash', 'contents', {}, 30, self.PREFIX).text, 'ok')
+        self.assertEqual(self.cache.created, 2)
+
+
+class ChatSessionTest(unittest.TestCase):
+    """History is folded into a summary past max_tokens and dropped on clear"""
+
+    def setUp(self):
+        self.session = app.ChatSession(max_tokens=100, keep_turns=2)
+        for i in range(4):
+            self.session.add(f'question {i} ' + 'q' * 80, f'answer {i} ' + 'a' * 80)
+
+    def test_compact_keeps_recent_turns(self):
+        transcripts = []
+        self.assertTrue(self.session.compact(lambda text: transcripts.append(text) or 'short summary'))
+        self.assertEqual([q.split()[1] for q, _ in self.session.turns], ['2', '3'])
+        self.assertEqual(self.session.summary, 'short summary')
+        self.assertIn('question 1', transcripts[0])
+        self.assertNotIn('question 2', transcripts[0])
+        self.assertEqual(self.session.contents()[0]['parts'][0],
+                         'Summary of our conversation so far:\nshort summary')
+
+    def test_compact_under_limit(self):
+        session = app.ChatSession(max_tokens=4000)
+        session.add('q', 'a')
+        self.assertFalse(session.compact(lambda text: 'unused'))
+        self.assertEqual(session.summary, '')
+
+    def test_local_summary_when_summarize_fails(self):
+        def fail(text):
+            raise RuntimeError('offline')
+
+        self.session.compact(fail)
+        self.assertIn('Assistant: answer 1', self.session.summary)
+        self.assertLessEqual(len(self.session.summary), 200)
+
+    def test_clear_during_compact(self):
+        self.session.compact(lambda text: self.session.clear() or 'stale summary')
+        self.assertFalse(self.session)
+
+    def test_stale_add_dropped(self):
+        generation = self.session.generation
+        self.session.clear()
+        self.assertFalse(self.session.add('old', 'answer', generation))
+        self.assertTrue(self.session.add('new', 'answer', self.session.generation))
+        self.assertEqual(len(self.session), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
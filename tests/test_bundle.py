@@ -0,0 +1,51 @@
+"""Tests for the precompiled DorkNexus.pyz bundle"""
+import importlib.util
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run inside the bundle: the innermost app frame of a stack must be found
+PROBE = '''
+import sys
+sys.path.insert(0, sys.argv[1])
+import dorknexus_app as app
+assert app.__file__.startswith(sys.argv[1]), app.__file__
+names = []
+app.atomic_write(sys.argv[2], lambda stream: names.append(app.describe_callback(sys._getframe())))
+print(names[0])
+'''
+
+
+class BundleImportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        for name in ('install_and_run.py', 'dorknexus_app.py'):
+            shutil.copy(os.path.join(ROOT, name), self.tmp.name)
+        spec = importlib.util.spec_from_file_location(
+            'bundle_installer', os.path.join(self.tmp.name, 'install_and_run.py')
+        )
+        self.installer = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.installer)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_describe_callback_from_bundle(self):
+        bundle, rebuilt = self.installer.build_bundle()
+        self.assertTrue(rebuilt)
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE, str(bundle), os.path.join(self.tmp.name, 'probe.txt')],
+            capture_output=True, text=True, timeout=60
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), 'atomic_write')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+"""Regression tests for the dork parser, canonicalizer and optimizer"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dorknexus_app as app  # noqa: E402
+
+
+class OperatorNamedOrTest(unittest.TestCase):
+    """A term like or:x is a DorkTerm, not an ('or', [...]) chain"""
+
+    QUERIES = ('or:x | y', 'x or:y OR z', '(or:x)', 'or:a OR or:b', '(or:x) OR (or:y) | z')
+
+    def test_parse(self):
+        units = app.parse_dork('or:x | y')
+        self.assertEqual(len(units), 1)
+        kind, children = units[0]
+        self.assertEqual(kind, 'or')
+        self.assertEqual([c.op for c in children], ['or', None])
+
+        units = app.parse_dork('x or:y OR z')
+        self.assertEqual(units[0], app.DorkTerm(None, 'x', False, False))
+        self.assertEqual(units[1][0], 'or')
+        self.assertEqual(len(units[1][1]), 2)
+
+    def test_optimize(self):
+        self.assertEqual(app.optimize_dork('(or:x)')[0], 'or:x')
+        self.assertEqual(app.optimize_dork('or:x | y')[0], 'or:x OR y')
+        self.assertEqual(app.optimize_dork('x or:y OR z')[0], '(or:y OR z) x')
+
+    def test_hash_and_lint(self):
+        for query in self.QUERIES:
+            with self.subTest(query=query):
+                app.dork_hash(query)
+                app.lint_dork(query)
+                optimized, _ = app.optimize_dork(query)
+                self.assertEqual(app.optimize_dork(optimized)[0], optimized)
+
+
+class QuotedTermTest(unittest.TestCase):
+    """A quoted word is an exact match, stricter than the bare word"""
+
+    def test_quoted_form_kept(self):
+        self.assertEqual(app.optimize_dork('admin "admin" site:x')[0], 'site:x "admin"')
+        self.assertEqual(app.optimize_dork('"password" password')[0], '"password"')
+        self.assertEqual(app.optimize_dork('password "password"')[0], '"password"')
+
+    def test_exclusion_keeps_bare_form(self):
+        self.assertEqual(app.optimize_dork('-"admin" -admin')[0], '-admin')
+        self.assertEqual(app.optimize_dork('-admin -"admin"')[0], '-admin')
+
+    def test_or_alternatives_stay_distinct(self):
+        self.assertEqual(app.optimize_dork('admin OR "admin"')[0], 'admin OR "admin"')
+        self.assertEqual(app.optimize_dork('admin ("admin" OR x)')[0], 'admin ("admin" OR x)')
+        self.assertEqual(app.optimize_dork('"admin" (admin OR x)')[0], '"admin"')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+"""Tests for the installer's offline dependency check"""
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import install_and_run as installer  # noqa: E402
+
+
+@unittest.skipIf(installer.metadata is None, "importlib.metadata unavailable")
+class InstalledRequirementsTest(unittest.TestCase):
+    """Only plain releases that satisfy requirements.txt skip pip"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.requirements = Path(self.tmp.name) / 'requirements.txt'
+        self.requirements.write_text('google-generativeai>=0.8.0\n', encoding='utf-8')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def check(self, version):
+        with mock.patch.object(installer.metadata, 'version', lambda name: version):
+            return installer.installed_requirements(self.requirements)
+
+    def test_release_satisfies(self):
+        self.assertEqual(self.check('0.8.3'), {'google-generativeai': '0.8.3'})
+        self.assertIsNone(self.check('0.7.9'))
+
+    def test_pre_release_and_local_defer_to_pip(self):
+        for version in ('0.8.0rc1', '0.8.1a2', '0.8.0.dev3', '0.8.1+local', '0.8.1.post1', '1!0.8.1'):
+            with self.subTest(version=version):
+                self.assertIsNone(self.check(version))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+"""Tests for vault persistence"""
+import itertools
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dorknexus_app as app  # noqa: E402
+
+
+@unittest.skipIf(os.name == 'nt', "POSIX permission bits")
+class FileModeTest(unittest.TestCase):
+    """Saving replaces the file atomically but keeps its permissions"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'dork_vault.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def mode(self):
+        return os.stat(self.path).st_mode & 0o777
+
+    def test_shared_vault_save_keeps_mode(self):
+        vault = app.SharedVault(self.path)
+        record = app.VaultRecord('a', 'site:example.com')
+        vault.save({'a': record}, set())
+        self.assertEqual(self.mode(), app.NEW_FILE_MODE)
+
+        os.chmod(self.path, 0o640)
+        vault.save({'b': app.VaultRecord('b', 'inurl:admin')}, {'a'})
+        self.assertEqual(self.mode(), 0o640)
+        self.assertEqual([raw['id'] for raw in app.SharedVault(self.path).sync()[0]], ['b'])
+
+    def test_atomic_write_keeps_mode(self):
+        with open(self.path, 'w') as f:
+            f.write('[]\n')
+        os.chmod(self.path, 0o604)
+        app.atomic_write(self.path, lambda stream: stream.write('[]\n'))
+        self.assertEqual(self.mode(), 0o604)
+
+
+class PagedLoadTest(unittest.TestCase):
+    """Loading page by page from the end gives the same store as a full load"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'dork_vault.json')
+        self.records = [
+            app.VaultRecord(f'{i:04d}', f'inurl:admin{i % 40} filetype:sql', tags='sql', notes=f'n{i}')
+            for i in range(1000)
+        ]
+        app.save_vault_file(self.path, self.records)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def load_paged(self, pages):
+        store = app.VaultStore()
+        store.load(list(reversed(next(pages))))
+        for page in pages:
+            store.load_older(store.prepare_page(page))
+            self.assertEqual(len(store.older) + len(store.items), len(store))
+        store.finish_loading()
+        return store
+
+    def assert_same(self, store):
+        full = app.VaultStore()
+        full.load(self.records)
+        self.assertEqual([r.id for r in store.to_list()], [r.id for r in full.to_list()])
+        self.assertEqual({k: r.id for k, r in store.hashes.items()}, {k: r.id for k, r in full.hashes.items()})
+        self.assertEqual([r.id for r in store.search('admin3', limit=20)[0]],
+                         [r.id for r in full.search('admin3', limit=20)[0]])
+
+    def test_paged(self):
+        self.assert_same(self.load_paged(app.iter_vault_pages(self.path, 64)))
+
+    def test_legacy_layout(self):
+        with open(self.path, 'w') as f:
+            json.dump([r.to_dict() for r in self.records], f, indent=2)
+        with self.assertRaises(ValueError):
+            next(app.iter_vault_pages(self.path, 64))
+        self.assert_same(self.load_paged(app.iter_legacy_vault_pages(self.path, 64)))
+
+    def test_remove_while_loading(self):
+        store = app.VaultStore()
+        pages = app.iter_vault_pages(self.path, 300)
+        store.load(list(reversed(next(pages))))
+        store.load_older(store.prepare_page(next(pages)))
+        self.assertIsNotNone(store.remove('0500'))
+        self.assertNotIn('0500', store)
+        for page in pages:
+            store.load_older(store.prepare_page(page))
+        store.finish_loading()
+        self.assertEqual(len(store), 999)
+
+
+class LazySearchTest(unittest.TestCase):
+    """iter_search pages through matches newest first, skipping removed records"""
+
+    def setUp(self):
+        self.store = app.VaultStore()
+        self.store.load([
+            app.VaultRecord(f'{i:04d}', f'inurl:admin{i % 3} intext:n{i}', tags='sql')
+            for i in range(300)
+        ])
+
+    def check(self, query, matches):
+        expected = [r.id for r in self.store if matches(r)]
+        results, total = self.store.iter_search(query)
+        self.assertEqual(total, len(expected))
+        first = [r.id for r in itertools.islice(results, 3)]
+        removed = self.store.remove(expected[5]).id
+        rest = [r.id for r in results]
+        self.assertEqual(first + rest, [i for i in expected if i != removed])
+
+    def test_everything(self):
+        self.check('', lambda r: True)
+
+    def test_broad(self):
+        self.check('tag:sql', lambda r: True)
+        self.check('-admin2', lambda r: not r.dork.startswith('inurl:admin2'))
+
+    def test_narrow(self):
+        # intext: matches by prefix, so this is n25 and n250-n259
+        self.check('intext:n25', lambda r: r.dork.split('intext:')[1].startswith('n25'))
+
+    def test_half_typed_terms_ignored(self):
+        admin2 = self.store.search_index.search('admin2')
+        for query in ('admin2 -', 'admin2 - ', 'admin2 inurl:', 'admin2 -intext:', 'admin2 "'):
+            with self.subTest(query=query):
+                self.assertEqual(set(self.store.search_index.search(query)), set(admin2))
+
+
+class TimestampTest(unittest.TestCase):
+    """Timestamps the float can't reproduce are written back as read"""
+
+    def round_trip(self, timestamp):
+        return app.VaultRecord.from_dict({'id': 'a', 'dork': 'x', 'timestamp': timestamp}).to_dict()['timestamp']
+
+    def test_kept_as_read(self):
+        for text in ('2024-01-02T03:04:05', '2024-01-02T03:04:05.250000', '2024-01-02T03:04:05+05:00',
+                     '2024-01-02T03:04:05Z', '2024-01-02', '01/02/2024'):
+            with self.subTest(text=text):
+                self.assertEqual(self.round_trip(text), text)
+
+    def test_aware_timestamp_value(self):
+        record = app.VaultRecord.from_dict({'id': 'a', 'dork': 'x', 'timestamp': '2024-01-02T03:04:05+05:00'})
+        self.assertEqual(record.timestamp, 1704146645.0)
+
+    def test_new_timestamp_replaces_text(self):
+        record = app.VaultRecord.from_dict({'id': 'a', 'dork': 'x', 'timestamp': '01/02/2024'})
+        record.timestamp = 0.0
+        self.assertEqual(record.timestamp_text, app.datetime.fromtimestamp(0.0).isoformat())
+
+
+if __name__ == '__main__':
+    unittest.main()